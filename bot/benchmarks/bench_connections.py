@@ -0,0 +1,105 @@
+"""Per-command database overhead: a fresh connection per call vs the pooled connections.
+
+Run from the bot directory:
+    python benchmarks/bench_connections.py --guilds 50 --commands 5000
+"""
+
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+BOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(BOT_DIR)
+sys.path.append(os.path.join(os.path.dirname(BOT_DIR), "databases"))
+
+from consolidate import create_consolidated  # noqa: E402
+from generate import GuildConfig, fill_guild  # noqa: E402
+from services.connection_service import close_all_connections, connection  # noqa: E402
+from utils.database import connect  # noqa: E402
+
+# The `!tracker get` query
+QUERY = (
+    "select ID, IGN, LINK, COORDINATES, datetime(TIMESTAMP), NOTES "
+    "from hammers where guild_id = ? and lower(ign) = ? order by timestamp limit ?"
+)
+PLAYERS = [f"player{i}" for i in range(200)]
+
+
+def create_guild_db(path: str, guild_id: int, reports: int) -> None:
+    conn = sqlite3.connect(path)
+    create_consolidated(conn)
+    fill_guild(
+        conn,
+        guild_id,
+        GuildConfig(hammers=reports, defense_calls=0, raid_hours=0),
+        players=PLAYERS,
+    )
+    conn.commit()
+    conn.close()
+
+
+def fresh_connection(path: str, guild_id: int, ign: str) -> list:
+    """The previous funcs.py behaviour, kept here as the baseline"""
+    conn = sqlite3.connect(path)
+    rows = conn.execute(QUERY, (guild_id, ign, 5)).fetchall()
+    conn.close()
+    return rows
+
+
+def fresh_profiled_connection(path: str, guild_id: int, ign: str) -> list:
+    conn = connect(path)
+    rows = conn.execute(QUERY, (guild_id, ign, 5)).fetchall()
+    conn.close()
+    return rows
+
+
+def pooled_connection(path: str, guild_id: int, ign: str) -> list:
+    with connection(path) as conn:
+        return conn.execute(QUERY, (guild_id, ign, 5)).fetchall()
+
+
+def run(label, command, paths, commands):
+    rng = random.Random(1)
+    guild_ids = list(paths)
+    start = time.perf_counter()
+    for _ in range(commands):
+        guild_id = rng.choice(guild_ids)
+        command(paths[guild_id], guild_id, rng.choice(PLAYERS))
+    elapsed = time.perf_counter() - start
+    per_command = elapsed / commands * 1e6
+    print(f"{label:<28} {commands:>7} commands {per_command:>9.1f} us/command")
+    return per_command
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--guilds", type=int, default=50)
+    parser.add_argument("--commands", type=int, default=5000)
+    parser.add_argument(
+        "--reports", type=int, default=2000, help="Hammer reports per guild"
+    )
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = {
+            guild_id: os.path.join(tmp, f"{guild_id}.db")
+            for guild_id in range(1, args.guilds + 1)
+        }
+        for guild_id, path in paths.items():
+            create_guild_db(path, guild_id, args.reports)
+
+        before = run("connect per call", fresh_connection, paths, args.commands)
+        run(
+            "connect per call (profile)",
+            fresh_profiled_connection,
+            paths,
+            args.commands,
+        )
+        after = run("pooled connections", pooled_connection, paths, args.commands)
+        close_all_connections()
+
+    print(f"\nPer-command overhead: {before / after:.1f}x lower")
@@ -0,0 +1,131 @@
+"""Bot database storage modes: one file per guild vs every guild in the consolidated
+database, at several guild counts.
+
+Run from the bot directory:
+    python benchmarks/bench_consolidated.py --guilds 10 100 1000 --commands 5000
+"""
+
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+BOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(BOT_DIR)
+sys.path.append(os.path.join(os.path.dirname(BOT_DIR), "databases"))
+
+from consolidate import create_consolidated  # noqa: E402
+from funcs import get_reports, list_open_cfds  # noqa: E402
+from generate import GuildConfig, fill_guild, guild_ids  # noqa: E402
+from services.connection_service import close_all_connections, connection  # noqa: E402
+
+GAME_SERVER = "https://ts2.x1.america.travian.com"
+PLAYERS = [f"player{i}" for i in range(50)]
+# The thread clean-up loop's query, run once per guild
+THREAD_QUERY = """
+    select dc.land_time
+    from defense_threads dt
+    join defense_calls dc
+        on dt.defense_call_id = dc.id
+    where dt.id = ?
+    and dt.guild_id = ?
+"""
+
+
+def build(tmp: str, guilds: int, reports: int, calls: int):
+    """Both layouts for the same data; returns the database path of each guild in each mode"""
+    config = GuildConfig(hammers=reports, defense_calls=calls)
+    os.makedirs(os.path.join(tmp, "per_guild"))
+    consolidated_path = os.path.join(tmp, "consolidated.db")
+    consolidated = sqlite3.connect(consolidated_path)
+    create_consolidated(consolidated)
+    per_guild = {}
+    for guild_id in guild_ids(guilds):
+        path = os.path.join(tmp, "per_guild", f"{guild_id}.db")
+        conn = sqlite3.connect(path)
+        create_consolidated(conn)
+        fill_guild(conn, guild_id, config, players=PLAYERS)
+        conn.commit()
+        conn.close()
+        fill_guild(consolidated, guild_id, config, players=PLAYERS)
+        per_guild[guild_id] = path
+    consolidated.commit()
+    consolidated.close()
+    return per_guild, {guild_id: consolidated_path for guild_id in per_guild}
+
+
+def commands(paths: dict, count: int) -> float:
+    """Random guilds running `!tracker get` and `!def list`; microseconds per command"""
+    rng = random.Random(1)
+    guild_ids = list(paths)
+    start = time.perf_counter()
+    for i in range(count):
+        guild_id = rng.choice(guild_ids)
+        if i % 2:
+            get_reports(paths[guild_id], guild_id, rng.choice(PLAYERS), GAME_SERVER, 5)
+        else:
+            list_open_cfds(paths[guild_id], guild_id, GAME_SERVER)
+    return (time.perf_counter() - start) / count * 1e6
+
+
+def thread_ids(paths: dict) -> dict:
+    threads = {}
+    for guild_id, path in paths.items():
+        with connection(path) as conn:
+            query = conn.execute(
+                "select id from defense_threads where guild_id = ?", (guild_id,)
+            )
+            threads[guild_id] = [thread_id for (thread_id,) in query]
+    return threads
+
+
+def sweep(paths: dict) -> float:
+    """Every guild's thread lookups, as the clean-up loop does; milliseconds per sweep"""
+    threads = thread_ids(paths)
+    start = time.perf_counter()
+    for guild_id, path in paths.items():
+        with connection(path) as conn:
+            for thread_id in threads[guild_id]:
+                conn.execute(THREAD_QUERY, (thread_id, guild_id)).fetchall()
+    return (time.perf_counter() - start) * 1e3
+
+
+def disk_usage(paths: dict) -> tuple:
+    files = set(paths.values())
+    return len(files), sum(os.path.getsize(path) for path in files)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--guilds", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--commands", type=int, default=5000)
+    parser.add_argument(
+        "--reports", type=int, default=200, help="Hammer reports per guild"
+    )
+    parser.add_argument("--calls", type=int, default=4, help="Defense calls per guild")
+    args = parser.parse_args()
+
+    print(
+        f"{'Guilds':>6} {'Mode':<13} {'Files':>6} {'Size (MB)':>10} "
+        f"{'Command (us)':>13} {'Sweep (ms)':>11}"
+    )
+    for guilds in args.guilds:
+        with tempfile.TemporaryDirectory() as tmp:
+            modes = dict(
+                zip(
+                    ("per guild", "consolidated"),
+                    build(tmp, guilds, args.reports, args.calls),
+                )
+            )
+            for mode, paths in modes.items():
+                files, size = disk_usage(paths)
+                per_command = commands(paths, args.commands)
+                per_sweep = sweep(paths)
+                close_all_connections()
+                print(
+                    f"{guilds:>6} {mode:<13} {files:>6} {size / 1e6:>10.1f} "
+                    f"{per_command:>13.1f} {per_sweep:>11.1f}"
+                )
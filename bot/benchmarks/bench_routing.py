@@ -0,0 +1,147 @@
+"""on_message throughput: reading the config for every message vs the routing table.
+
+Most messages are chatter in channels where nothing applies; some end with
+coordinates, some are in a forwarded channel.
+
+Run from the bot directory:
+    python benchmarks/bench_routing.py --guilds 50 --messages 100000
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+from types import SimpleNamespace
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import discord  # noqa: E402
+from core import Core  # noqa: E402
+from services.config_service import read_config_bool, read_config_str  # noqa: E402
+from services.routing_service import RoutingService  # noqa: E402
+from utils.constants import Colors, ConfigKeys  # noqa: E402
+from utils.factory import get_app  # noqa: E402
+from utils.validators import coordinates_are_valid, preprocess_coordinates  # noqa: E402
+
+CHATTER = [
+    "gm",
+    "anyone online?",
+    "sending res to the wonder now",
+    "who can snipe the hero and/or cats",
+    "hammer is out, lands in 3h",
+    "ok",
+]
+
+
+async def send(*args, **kwargs):
+    pass
+
+
+class Channel:
+    def __init__(self, channel_id: int):
+        self.id = channel_id
+        self.send = send
+
+    def get_channel(self, channel_id: int) -> "Channel":
+        return self
+
+
+def build_messages(guilds: int, count: int, forwarded: tuple) -> list:
+    rng = random.Random(1)
+    guild_list = [
+        SimpleNamespace(id=guild_id, name=f"Guild {guild_id}")
+        for guild_id in range(1, guilds + 1)
+    ]
+    channels = [Channel(channel_id) for channel_id in range(1, 11)]
+    author = SimpleNamespace(id=1, bot=False, display_name="player")
+    messages = []
+    for _ in range(count):
+        guild, channel = rng.choice(guild_list), rng.choice(channels)
+        roll = rng.random()
+        if roll < 0.01:
+            guild = SimpleNamespace(id=forwarded[0], name="Forwarded")
+            channel = Channel(forwarded[1])
+            content = rng.choice(CHATTER)
+        elif roll < 0.1:
+            content = f"{rng.choice(CHATTER)} {rng.randint(-200, 200)}|{rng.randint(-200, 200)}"
+        else:
+            content = rng.choice(CHATTER)
+        messages.append(
+            SimpleNamespace(
+                guild=guild,
+                channel=channel,
+                author=author,
+                content=content,
+                embeds=[],
+                webhook_id=None,
+            )
+        )
+    return messages
+
+
+async def config_per_message(core: Core, message) -> None:
+    """The previous Core.on_message, kept here as the baseline"""
+    key = f"{message.guild.id}#{message.channel.id}"
+    if key in core.forwarding_map:
+        guild_id, channel_id = core.forwarding_map[key].split("#")
+        guild = core.get_guild(int(guild_id))
+        channel = guild.get_channel(int(channel_id))
+        await channel.send(message.content)
+
+    app = get_app(message)
+    if app is not None:
+        return
+
+    last_item = message.content.split(" ")[-1].replace("?", "")
+    last_item = preprocess_coordinates(last_item)
+    ignore_24_7 = read_config_bool(message.guild.id, "ignore_24_7", False)
+
+    if coordinates_are_valid(last_item, ignore_24_7):
+        xy = last_item.split("|")
+        game_server = read_config_str(message.guild.id, ConfigKeys.GAME_SERVER, "")
+        embed = discord.Embed(color=Colors.SUCCESS)
+        value = f"{game_server}/position_details.php?x={xy[0]}&y={xy[1]}"
+        embed.add_field(name="", value=value)
+        await message.channel.send(embed=embed)
+
+    raid_channel = read_config_str(str(message.guild.id), ConfigKeys.RAID_CHANNEL, "")
+    if raid_channel and str(message.channel.id) == raid_channel:
+        pass
+
+
+async def routed(core: Core, message) -> None:
+    await core.on_message(message)
+
+
+async def run(label: str, handler, core: Core, messages: list) -> float:
+    start = time.perf_counter()
+    for message in messages:
+        await handler(core, message)
+    per_second = len(messages) / (time.perf_counter() - start)
+    print(f"{label:<22} {len(messages):>8} messages {per_second:>12,.0f} messages/sec")
+    return per_second
+
+
+async def main(args) -> None:
+    forwarded = (10**6, 10**6 + 1)
+    forwarding_map = {
+        f"{forwarded[0]}#{forwarded[1]}": f"{forwarded[0]}#{forwarded[1]}"
+    }
+    core = Core(intents=discord.Intents.all())
+    core.routes = RoutingService(forwarding_map)
+    core.forwarding_map = forwarding_map
+    core.get_guild = lambda guild_id: Channel(forwarded[1])
+    messages = build_messages(args.guilds, args.messages, forwarded)
+
+    before = await run("config per message", config_per_message, core, messages)
+    after = await run("routing table", routed, core, messages)
+    print(f"\nThroughput: {after / before:.1f}x higher")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--guilds", type=int, default=50)
+    parser.add_argument("--messages", type=int, default=100_000)
+    asyncio.run(main(parser.parse_args()))
@@ -1,8 +1,10 @@
 import discord
 from discord import app_commands
 from interactions.cfd import Cfd
+from services.timing_service import timed_app_command
 
 
 @app_commands.command(description="Submit a new CFD")
+@timed_app_command
 async def cfd(interaction: discord.Interaction):
     await interaction.response.send_modal(Cfd())
@@ -1,5 +1,6 @@
 import discord
 from discord import app_commands
+from services.timing_service import timed_app_command
 from utils.constants import Colors, crop_production
 
 
@@ -70,6 +71,7 @@ from utils.constants import Colors, crop_production
     flour_mill_bakery="Crop bonus from flour mill and bakery. Default: 50%",
     gold_bonus="Does the defender have the gold bonus activated? Default: Yes",
 )
+@timed_app_command
 async def scout(
     interaction: discord.Interaction,
     crop_1: int,
@@ -1,35 +1,60 @@
 import argparse
 import datetime
-import sqlite3
-from typing import Any
+from typing import Any, List, Tuple
 
 import discord
 from discord import app_commands
 from discord.ext import tasks
+from services.connection_service import query_db, run_db
 from utils.factory import PREFIX, get_app
 from funcs import (
     cancel_cfd,
     create_cfd,
+    get_bot_db_path,
     get_channel_from_id,
     insert_defense_thread,
+    outdated_bot_databases,
 )
 from services.analytics_service import AnalyticsService
-from utils.constants import ALLOW_FORWARDING, BOT_SERVERS_DB_PATH, Colors, ConfigKeys
+from utils.constants import Colors, ConfigKeys
 from utils.logger import logger, periodic_log_check, add_logging_args
-from utils.validators import (
-    coordinates_are_valid,
-    should_forward,
-    preprocess_coordinates,
-)
+from utils.validators import find_coordinates
 from zoneinfo import ZoneInfo
 from services.config_service import read_config_str, read_config_bool, read_config_int
 from commands import COMMAND_LIST
 from services.notification_service import NotificationService
+from services.metrics_service import increment, timer
 from services.raid_tracking_service import RaidTrackingService
+from services.routing_service import RoutingService, is_command, may_have_coordinates
+from services.timing_service import discord_trace_config, run_timed
 
 intents = discord.Intents.all()
 intents.message_content = True
 
+# Discord's limits on the characters in an embed field's value and in a whole embed
+FIELD_VALUE_LIMIT = 1024
+EMBED_LIMIT = 6000
+
+
+def map_links_embed(
+    game_server: str, coordinates: List[Tuple[int, int]]
+) -> discord.Embed:
+    """One embed linking every coordinate, as many links per field as fit"""
+    embed = discord.Embed(color=Colors.SUCCESS)
+    value = ""
+    total = 0
+    for x, y in coordinates:
+        link = f"{game_server}/position_details.php?x={x}&y={y}"
+        if total + len(link) + 1 > EMBED_LIMIT:
+            break
+        if value and len(value) + len(link) + 1 > FIELD_VALUE_LIMIT:
+            embed.add_field(name="", value=value)
+            value = ""
+        value = f"{value}\n{link}" if value else link
+        total += len(link) + 1
+    embed.add_field(name="", value=value)
+    return embed
+
 
 class Core(discord.Client):
     def __init__(
@@ -38,14 +63,25 @@ class Core(discord.Client):
         intents: discord.Intents,
         **options: Any,
     ) -> None:
+        # Times the Discord API requests each command makes
+        options.setdefault("http_trace", discord_trace_config())
         super().__init__(intents=intents, **options)
         self.tree = app_commands.CommandTree(self)
         self.token = read_config_str(ConfigKeys.DEFAULT, ConfigKeys.TOKEN, "")
         self.analytics = AnalyticsService()
         self.notifications = NotificationService()
         self.raid_tracker = RaidTrackingService()
+        self.routes = RoutingService()
 
     async def setup_hook(self):
+        # Bot queries filter on guild_id, which older databases do not have yet
+        outdated = outdated_bot_databases()
+        if outdated:
+            raise RuntimeError(
+                "Run `python manage.py migrate` in databases/ before starting the bot. "
+                f"Not migrated: {', '.join(outdated)}"
+            )
+
         # Add the commands directly
         for command in COMMAND_LIST:
             self.tree.add_command(command)
@@ -53,81 +89,59 @@ class Core(discord.Client):
         # Start tasks
         self.close_threads.start()
         self.run_server_database_alerts.start()
+        self.flush_analytics.start()
 
         # Sync commands with Discord
         await self.tree.sync()
 
     async def on_message(self, message: discord.Message):
-        if ALLOW_FORWARDING:
-            result = should_forward(message)
-            if result:
-                guild_id, channel_id = result.split("#")
-                guild = self.get_guild(int(guild_id))
-                channel = guild.get_channel(int(channel_id))
-                if message.content:
-                    await channel.send(message.content)
-                else:
-                    await channel.send(embeds=message.embeds)
+        route = self.routes.route(message.guild.id, message.channel.id)
+        if route.forward_to:
+            guild_id, channel_id = route.forward_to
+            guild = self.get_guild(guild_id)
+            channel = guild.get_channel(channel_id)
+            if message.content:
+                await channel.send(message.content)
+            else:
+                await channel.send(embeds=message.embeds)
 
         # if message.author.bot:
         #     return
 
-        app = get_app(message)
-        logger.debug(f"App: {app}")
-        if app is not None:
-            self.analytics.record_command(
-                app=message.content.split()[0].strip(PREFIX),
-                full_command=message.content,
-                discord_user_id=message.author.id,
-                discord_user_name=message.author.display_name,
-                discord_server_id=message.guild.id,
-                discord_server_name=message.guild.name,
-                travian_server_code=read_config_str(
-                    message.guild.id, ConfigKeys.GAME_SERVER, ""
-                ),
-            )
-            await app.run()
-            return
-
-        last_item = message.content.split(" ")[-1].replace("?", "")
-        last_item = preprocess_coordinates(last_item)
-        ignore_24_7 = read_config_bool(message.guild.id, "ignore_24_7", False)
-
-        if coordinates_are_valid(last_item, ignore_24_7):
-            slash = "/" in last_item
-            pipe = "|" in last_item
-
-            if slash:
-                xy = last_item.split("/")
-            elif pipe:
-                xy = last_item.split("|")
-            x = xy[0].strip()
-            y = xy[1].strip()
-            game_server = read_config_str(message.guild.id, ConfigKeys.GAME_SERVER, "")
-            embed = discord.Embed(color=Colors.SUCCESS)
-            embed.add_field(
-                name="",
-                value=f"{game_server}/position_details.php?x={x}&y={y}",
-            )
-            await message.channel.send(embed=embed)
+        if is_command(message.content):
+            app = get_app(message)
+            logger.debug(f"App: {app}")
+            if app is not None:
+                app_name = message.content.split()[0].strip(PREFIX)
+                await run_timed(
+                    self.analytics.record_command,
+                    app.run,
+                    f"{app_name} {app.keyword}",
+                    app=app_name,
+                    full_command=message.content,
+                    discord_user_id=message.author.id,
+                    discord_user_name=message.author.display_name,
+                    discord_server_id=message.guild.id,
+                    discord_server_name=message.guild.name,
+                    travian_server_code=route.game_server,
+                )
+                return
+
+        if may_have_coordinates(message.content):
+            coordinates = find_coordinates(message.content, route.ignore_24_7)
+            if coordinates:
+                await message.channel.send(
+                    embed=map_links_embed(route.game_server, coordinates)
+                )
 
         # Check if message looks like a raid leaderboard and is in the correct channel
-        raid_channel = read_config_str(
-            str(message.guild.id), ConfigKeys.RAID_CHANNEL, ""
-        )
-        if raid_channel and str(message.channel.id) == raid_channel:
+        if route.raid_leaderboard:
             if any(
                 line.strip().startswith("1.") for line in message.content.split("\n")
             ):
                 try:
-                    db_path = read_config_str(
-                        str(message.guild.id), ConfigKeys.DATABASE, ""
-                    )
-                    if not db_path:
-                        return
-
                     table = await self.raid_tracker.process_leaderboard(
-                        message, db_path
+                        message, get_bot_db_path(message.guild.id)
                     )
                     if table:
                         await message.channel.send(table)
@@ -141,8 +155,10 @@ class Core(discord.Client):
 
         x, y = event.location.replace("/", "|").split("|")
 
-        cfd_id = create_cfd(
-            db_name=f"{BOT_SERVERS_DB_PATH}{guild_id}.db",
+        cfd_id = await run_db(
+            create_cfd,
+            db_name=get_bot_db_path(guild_id),
+            guild_id=guild_id,
             created_by_id=event.creator.id,
             event_id=event.id,
             created_by_name=event.creator.display_name,
@@ -167,8 +183,10 @@ class Core(discord.Client):
         cfd_message = await channel.send(embed=embed)
         thread = await channel.create_thread(name=event.name, message=cfd_message)
 
-        insert_defense_thread(
-            db_name=f"{BOT_SERVERS_DB_PATH}{guild_id}.db",
+        await run_db(
+            insert_defense_thread,
+            db_name=get_bot_db_path(guild_id),
+            guild_id=guild_id,
             defense_thread_id=thread.id,
             cfd_id=cfd_id,
             name=thread.name,
@@ -181,7 +199,7 @@ class Core(discord.Client):
 
     async def on_scheduled_event_delete(self, event):
         guild_id = str(event.guild.id)
-        cancel_cfd(f"{BOT_SERVERS_DB_PATH}{guild_id}.db", event.id)
+        await run_db(cancel_cfd, get_bot_db_path(guild_id), guild_id, event.id)
 
     async def on_scheduled_event_update(self, before, after):
         """
@@ -192,69 +210,85 @@ class Core(discord.Client):
         if after.status == discord.EventStatus.active:
             await after.end()
 
+    async def close(self):
+        # Commands recorded since the last flush would otherwise be lost
+        self.flush_analytics.cancel()
+        await run_db(self.analytics.flush)
+        await super().close()
+
+    @tasks.loop(seconds=1.0)
+    async def flush_analytics(self):
+        if self.analytics.flush_due():
+            await run_db(self.analytics.flush)
+
     @tasks.loop(minutes=10.0)
     async def close_threads(self):
         # Get defense discord.Channel from config channel
         # Get threads in Channel
         # For each thread, get associated cfd
         # If cfd land_time is in the past, archive the thread
-        for guild in self.guilds:
-            try:
-                clean_up_threads = read_config_bool(
-                    guild.id, ConfigKeys.CLEAN_UP_THREADS, False
-                )
-                if clean_up_threads:
-                    defense_channel = read_config_str(
-                        guild.id, ConfigKeys.DEFENSE_CHANNEL, ""
+        with timer("loop.close_threads"):
+            for guild in self.guilds:
+                try:
+                    clean_up_threads = read_config_bool(
+                        guild.id, ConfigKeys.CLEAN_UP_THREADS, False
                     )
-                    channel = get_channel_from_id(guild, defense_channel)
-
-                    if len(channel.threads) == 0:
-                        continue
-
-                    logger.info(f"Cleaning up threads for {guild}")
-                    conn = sqlite3.connect(f"{BOT_SERVERS_DB_PATH}{guild.id}.db")
-                    for thread in channel.threads:
-                        query = """
-                        select
-                            dc.land_time
-                        from defense_threads dt
-                        join defense_calls dc
-                            on dt.defense_call_id = dc.id
-                        where dt.id = ?;"""
-                        # fmt: off
-                        data = (str(thread.id),)
-                        # fmt: on
-                        rows = conn.execute(query, data)
-                        cfd_thread = rows.fetchone()
-                        if cfd_thread is None:
-                            continue
-
-                        land_time = datetime.datetime.strptime(
-                            cfd_thread[0].replace("+", ".").split(".")[0],
-                            "%Y-%m-%d %H:%M:%S",
+                    if clean_up_threads:
+                        defense_channel = read_config_str(
+                            guild.id, ConfigKeys.DEFENSE_CHANNEL, ""
                         )
+                        channel = get_channel_from_id(guild, defense_channel)
 
-                        if land_time < datetime.datetime.utcnow():
-                            logger.info(f"Archiving thread {thread.name}")
-                            await thread.edit(archived=True)
-            except KeyError as e:
-                logger.error(f"Failed to clean up threads for {guild}")
-                logger.error(e)
+                        if len(channel.threads) == 0:
+                            continue
+
+                        logger.info(f"Cleaning up threads for {guild}")
+                        db_path = get_bot_db_path(guild.id)
+                        for thread in channel.threads:
+                            query = """
+                            select
+                                dc.land_time
+                            from defense_threads dt
+                            join defense_calls dc
+                                on dt.defense_call_id = dc.id
+                            where dt.id = ?
+                            and dt.guild_id = ?;"""
+                            # fmt: off
+                            data = (str(thread.id), guild.id)
+                            # fmt: on
+                            rows = await query_db(db_path, query, data)
+                            if not rows:
+                                continue
+                            cfd_thread = rows[0]
+
+                            land_time = datetime.datetime.strptime(
+                                cfd_thread[0].replace("+", ".").split(".")[0],
+                                "%Y-%m-%d %H:%M:%S",
+                            )
+
+                            if land_time < datetime.datetime.utcnow():
+                                logger.info(f"Archiving thread {thread.name}")
+                                await thread.edit(archived=True)
+                except KeyError as e:
+                    increment("loop.close_threads.errors")
+                    logger.error(f"Failed to clean up threads for {guild}")
+                    logger.error(e)
 
     @tasks.loop(hours=24)
     async def run_server_database_alerts(self):
         await self.wait_until_ready()
         logger.info("Running server database alerts")
 
-        for guild in self.guilds:
-            try:
-                await self.notifications.work(
-                    guild, read_config_int(guild.id, ConfigKeys.ALERTS, 0)
-                )
-            except KeyError as e:
-                logger.error(f"Failed to check alerts for {guild}")
-                logger.error(e)
+        with timer("loop.run_server_database_alerts"):
+            for guild in self.guilds:
+                try:
+                    await self.notifications.work(
+                        guild, read_config_int(guild.id, ConfigKeys.ALERTS, 0)
+                    )
+                except KeyError as e:
+                    increment("loop.run_server_database_alerts.errors")
+                    logger.error(f"Failed to check alerts for {guild}")
+                    logger.error(e)
 
 
 if __name__ == "__main__":
@@ -1,14 +1,24 @@
+import os
 import sqlite3
+from typing import List
 
 import discord
 from utils.constants import (
+    BOT_SCHEMA_VERSION,
     BOT_SERVERS_DB_PATH,
+    CONSOLIDATED_DB_PATH,
     GAME_SERVERS_DB_PATH,
     Colors,
     ConfigKeys,
 )
+from services.connection_service import connection
 from utils.logger import logger
-from services.config_service import read_config_str, update_config
+from services.config_service import (
+    config_service,
+    read_config_bool,
+    read_config_str,
+    update_config,
+)
 
 
 def init(message):
@@ -20,7 +30,7 @@ def init(message):
         update_config(guild_id, ConfigKeys.INIT_USER, message_author)
 
     # `database` and `server` should be able to be updated. `init_user` above should not.
-    update_config(guild_id, ConfigKeys.DATABASE, f"{BOT_SERVERS_DB_PATH}{guild_id}.db")
+    update_config(guild_id, ConfigKeys.DATABASE, get_bot_db_path(guild_id))
     update_config(guild_id, ConfigKeys.SERVER, guild_name)
 
     embed = discord.Embed(color=Colors.SUCCESS)
@@ -29,6 +39,40 @@ def init(message):
     return embed
 
 
+def get_bot_db_path(guild_id) -> str:
+    """The guild's own database, or the shared one when bot databases are consolidated"""
+    if read_config_bool(ConfigKeys.DEFAULT, ConfigKeys.CONSOLIDATED_DB, False):
+        return CONSOLIDATED_DB_PATH
+    return f"{BOT_SERVERS_DB_PATH}{guild_id}.db"
+
+
+def schema_version(db_name) -> int:
+    """The latest migration applied to a bot database; 0 if it was never migrated"""
+    with connection(db_name, read_only=True) as conn:
+        exists = conn.execute(
+            "select 1 from sqlite_master where type = 'table' and lower(name) = 'schema_version'"
+        ).fetchone()
+        if exists is None:
+            return 0
+        return conn.execute(
+            "select coalesce(max(version), 0) from schema_version"
+        ).fetchone()[0]
+
+
+def outdated_bot_databases() -> List[str]:
+    """Existing bot databases that `manage.py migrate` has not brought up to BOT_SCHEMA_VERSION"""
+    db_paths = {
+        get_bot_db_path(section)
+        for section in config_service.config.sections()
+        if read_config_str(section, ConfigKeys.DATABASE, "")
+    }
+    return sorted(
+        db_path
+        for db_path in db_paths
+        if os.path.exists(db_path) and schema_version(db_path) < BOT_SCHEMA_VERSION
+    )
+
+
 def get_sql_by_path(path):
     with open(path, "r") as sql_file:
         sql = sql_file.read()
@@ -37,158 +81,170 @@ def get_sql_by_path(path):
 
 
 def execute_sql(db_name, sql):
-    conn = sqlite3.connect(db_name)
-    logger.info(f"Running sql:\n{sql}")
-    conn.execute(sql)
-    conn.commit()
-    conn.close()
-
-
-def get_reports(db_name, ign, game_server, count="1"):
-    conn = sqlite3.connect(db_name)
-    query = conn.execute(
-        """select ID, IGN, LINK, COORDINATES, datetime(TIMESTAMP), NOTES from hammers where lower(ign) = ? order by timestamp limit ?;""",
-        (ign.lower(), count),
-    )
+    with connection(db_name) as conn:
+        logger.info(f"Running sql:\n{sql}")
+        conn.executescript(sql)
+        conn.commit()
 
-    response = ""
-    for row in query:
-        id = row[0]
-        ign = row[1]
-        link = row[2]
-        coordinates = row[3]
-        try:
-            split_coordinates = coordinates.split("|")
-            x, y = split_coordinates[0], split_coordinates[1]
-        except:
-            split_coordinates = coordinates.split("/")
-            x, y = split_coordinates[0], split_coordinates[1]
-
-        map_link = f"[{x}|{y}]({game_server}/position_details.php?x={x}&y={y})"
-        timestamp = row[4]
-        notes = row[5] if len(row) > 5 else ""
-
-        response += "\nID: {} \nReport: {} \nCoordinates: {} \nTimestamp: {}".format(
-            id, link, map_link, timestamp
-        )
-        if notes:
-            response += f"\nNote: {notes}"
-
-    if response != "":
-        embed = discord.Embed(
-            title="Reports for player {}".format(ign),
-            description="Most recent reports at the bottom",
-            color=Colors.SUCCESS,
-        )
-        embed.add_field(name="Reports", value=response)
-    else:
-        embed = discord.Embed(color=Colors.ERROR)
-        embed.add_field(
-            name="Error",
-            value="No entries for the player {} in the database".format(ign),
+
+def get_reports(db_name, guild_id, ign, game_server, count="1"):
+    with connection(db_name) as conn:
+        query = conn.execute(
+            """select ID, IGN, LINK, COORDINATES, datetime(TIMESTAMP), NOTES from hammers where guild_id = ? and lower(ign) = ? order by timestamp limit ?;""",
+            (guild_id, ign.lower(), count),
         )
 
-    conn.close()
+        response = ""
+        for row in query:
+            id = row[0]
+            ign = row[1]
+            link = row[2]
+            coordinates = row[3]
+            try:
+                split_coordinates = coordinates.split("|")
+                x, y = split_coordinates[0], split_coordinates[1]
+            except:
+                split_coordinates = coordinates.split("/")
+                x, y = split_coordinates[0], split_coordinates[1]
+
+            map_link = f"[{x}|{y}]({game_server}/position_details.php?x={x}&y={y})"
+            timestamp = row[4]
+            notes = row[5] if len(row) > 5 else ""
+
+            response += (
+                "\nID: {} \nReport: {} \nCoordinates: {} \nTimestamp: {}".format(
+                    id, link, map_link, timestamp
+                )
+            )
+            if notes:
+                response += f"\nNote: {notes}"
+
+        if response != "":
+            embed = discord.Embed(
+                title="Reports for player {}".format(ign),
+                description="Most recent reports at the bottom",
+                color=Colors.SUCCESS,
+            )
+            embed.add_field(name="Reports", value=response)
+        else:
+            embed = discord.Embed(color=Colors.ERROR)
+            embed.add_field(
+                name="Error",
+                value="No entries for the player {} in the database".format(ign),
+            )
 
     return embed
 
 
-def get_one_report(db_name, ign, game_server):
-    conn = sqlite3.connect(db_name)
-    query = conn.execute(
-        """select ID, IGN, LINK, COORDINATES, datetime(TIMESTAMP), NOTES from hammers where lower(ign) = ? order by timestamp desc limit 1;""",
-        (ign.lower(),),
-    )
-    logger.debug(f"Query: {query}")
-
-    response = ""
-    for row in query:
-        id = row[0]
-        ign = row[1]
-        link = row[2]
-        coordinates = row[3]
-        try:
-            split_coordinates = coordinates.split("|")
-            x, y = split_coordinates[0], split_coordinates[1]
-        except:
-            split_coordinates = coordinates.split("/")
-            x, y = split_coordinates[0], split_coordinates[1]
-        map_link = f"[{x}|{y}]({game_server}/position_details.php?x={x}&y={y})"
-        timestamp = row[4]
-        notes = row[5] if len(row) > 5 else ""
-
-        response += "ID: {} \nReport: {} \nCoordinates: {} \nTimestamp: {}".format(
-            id, link, map_link, timestamp
+def get_one_report(db_name, guild_id, ign, game_server):
+    with connection(db_name) as conn:
+        query = conn.execute(
+            """select ID, IGN, LINK, COORDINATES, datetime(TIMESTAMP), NOTES from hammers where guild_id = ? and lower(ign) = ? order by timestamp desc limit 1;""",
+            (guild_id, ign.lower()),
         )
-        if notes:
-            response += f"\nNote: {notes}"
+        logger.debug(f"Query: {query}")
+
+        response = ""
+        for row in query:
+            id = row[0]
+            ign = row[1]
+            link = row[2]
+            coordinates = row[3]
+            try:
+                split_coordinates = coordinates.split("|")
+                x, y = split_coordinates[0], split_coordinates[1]
+            except:
+                split_coordinates = coordinates.split("/")
+                x, y = split_coordinates[0], split_coordinates[1]
+            map_link = f"[{x}|{y}]({game_server}/position_details.php?x={x}&y={y})"
+            timestamp = row[4]
+            notes = row[5] if len(row) > 5 else ""
+
+            response += "ID: {} \nReport: {} \nCoordinates: {} \nTimestamp: {}".format(
+                id, link, map_link, timestamp
+            )
+            if notes:
+                response += f"\nNote: {notes}"
+
+        logger.debug(f"Final Response: {response}")
+        if response != "":
+            embed = discord.Embed(
+                title="Latest report for player {}".format(ign), color=Colors.SUCCESS
+            )
+            embed.add_field(name="Report", value=response)
+        else:
+            embed = discord.Embed(color=Colors.ERROR)
+            embed.add_field(
+                name="Error",
+                value="No entry for the player {} in the database".format(ign),
+            )
 
-    logger.debug(f"Final Response: {response}")
-    if response != "":
-        embed = discord.Embed(
-            title="Latest report for player {}".format(ign), color=Colors.SUCCESS
-        )
-        embed.add_field(name="Report", value=response)
-    else:
-        embed = discord.Embed(color=Colors.ERROR)
-        embed.add_field(
-            name="Error", value="No entry for the player {} in the database".format(ign)
-        )
+    return embed
 
-    conn.close()
 
-    return embed
+def add_report(db_name, guild_id, ign, link, coordinates, notes=None):
+    with connection(db_name) as conn:
+        query = """
+            INSERT INTO HAMMERS (GUILD_ID, IGN, LINK, TIMESTAMP, COORDINATES, NOTES)
+            VALUES (?, ?, ?, CURRENT_TIMESTAMP, ?, ?);
+            """
+        data = (guild_id, ign, link, coordinates, notes or None)
+        logger.info(f"Query: {query}, Data: {data}")
 
+        conn.execute(query, data)
+        conn.commit()
 
-def delete_report(db_name, ign, id):
-    conn = sqlite3.connect(db_name)
-    query = """
-        delete from hammers where ID = ? and IGN = ? returning *;
-        """
-    logger.info(f"Executing query: {query}")
-    deleted_rows = conn.execute(
-        query,
-        (
-            id,
-            ign.lower(),
-        ),
-    )
 
-    for row in deleted_rows:
-        logger.info(row)
+def delete_report(db_name, guild_id, ign, id):
+    with connection(db_name) as conn:
+        query = """
+            delete from hammers where ID = ? and GUILD_ID = ? and IGN = ? returning *;
+            """
+        logger.info(f"Executing query: {query}")
+        deleted_rows = conn.execute(
+            query,
+            (
+                id,
+                guild_id,
+                ign.lower(),
+            ),
+        )
 
-    conn.commit()
+        for row in deleted_rows:
+            logger.info(row)
 
-    embed = discord.Embed(color=Colors.WARNING)
-    embed.add_field(
-        name="Confirmed", value=f"Deleted report for player {ign} with ID {id}"
-    )
+        conn.commit()
 
-    conn.close()
+        embed = discord.Embed(color=Colors.WARNING)
+        embed.add_field(
+            name="Confirmed", value=f"Deleted report for player {ign} with ID {id}"
+        )
 
     return embed
 
 
-def list_all_names(db_name):
-    conn = sqlite3.connect(db_name)
-    query = conn.execute(
-        """select IGN, COORDINATES, datetime(max(timestamp), '-4 hours') from hammers group by 1,2 order by 1,3"""
-    )
+def list_all_names(db_name, guild_id):
+    with connection(db_name) as conn:
+        query = conn.execute(
+            """select IGN, COORDINATES, datetime(max(timestamp), '-4 hours') from hammers where guild_id = ? group by 1,2 order by 1,3""",
+            (guild_id,),
+        )
 
-    response = ""
-    for row in query:
-        ign = row[0]
-        coordinates = row[1]
-        timestamp = row[2]
-        response += "\n{} | {} | {}".format(ign, coordinates, timestamp)
-
-    if response != "":
-        embed = discord.Embed(title="Recorded Hammers", color=Colors.SUCCESS)
-        embed.add_field(name="Player   |   Coordinates   |   Last Seen", value=response)
-    else:
-        embed = discord.Embed(color=Colors.ERROR)
-        embed.add_field(name="Error", value="No entries found in the database")
-    conn.close()
+        response = ""
+        for row in query:
+            ign = row[0]
+            coordinates = row[1]
+            timestamp = row[2]
+            response += "\n{} | {} | {}".format(ign, coordinates, timestamp)
+
+        if response != "":
+            embed = discord.Embed(title="Recorded Hammers", color=Colors.SUCCESS)
+            embed.add_field(
+                name="Player   |   Coordinates   |   Last Seen", value=response
+            )
+        else:
+            embed = discord.Embed(color=Colors.ERROR)
+            embed.add_field(name="Error", value="No entries found in the database")
 
     return embed
 
@@ -235,6 +291,7 @@ def get_thread_from_id(guild: discord.Guild, thread_id: str):
 
 def create_cfd(
     db_name,
+    guild_id,
     created_by_id,
     event_id,
     created_by_name,
@@ -243,225 +300,221 @@ def create_cfd(
     y_coordinate,
     amount_requested,
 ):
-    conn = sqlite3.connect(db_name)
-
-    query = """
-    INSERT INTO DEFENSE_CALLS (
-        created_by_id,
-        event_id,
-        created_by_name,
-        land_time,
-        x_coordinate,
-        y_coordinate,
-        amount_requested,
-        created_at
-        ) VALUES (?,?,?,?,?,?,?,CURRENT_TIMESTAMP) RETURNING *;
-    """
-    data = (
-        created_by_id,
-        event_id,
-        created_by_name,
-        land_time,
-        x_coordinate,
-        y_coordinate,
-        amount_requested.replace(",", ""),
-    )
+    with connection(db_name) as conn:
+        query = """
+        INSERT INTO DEFENSE_CALLS (
+            guild_id,
+            created_by_id,
+            event_id,
+            created_by_name,
+            land_time,
+            x_coordinate,
+            y_coordinate,
+            amount_requested,
+            created_at
+            ) VALUES (?,?,?,?,?,?,?,?,CURRENT_TIMESTAMP) RETURNING *;
+        """
+        data = (
+            guild_id,
+            created_by_id,
+            event_id,
+            created_by_name,
+            land_time,
+            x_coordinate,
+            y_coordinate,
+            amount_requested.replace(",", ""),
+        )
 
-    cfd = conn.execute(query, data)
-    id = cfd.fetchone()[0]
-    conn.commit()
-    conn.close()
+        cfd = conn.execute(query, data)
+        id = cfd.fetchone()[0]
+        conn.commit()
 
     return id
 
 
-def cancel_cfd(db_name, event_id):
-    conn = sqlite3.connect(db_name)
+def cancel_cfd(db_name, guild_id, event_id):
+    with connection(db_name) as conn:
 
-    query = """
-    UPDATE DEFENSE_CALLS
-    SET CANCELLED = TRUE
-    WHERE event_id = ? RETURNING *;
-    """
-    data = (event_id,)
+        query = """
+        UPDATE DEFENSE_CALLS
+        SET CANCELLED = TRUE
+        WHERE guild_id = ? AND event_id = ? RETURNING *;
+        """
+        data = (guild_id, event_id)
 
-    conn.execute(query, data)
-    conn.commit()
-    conn.close()
+        conn.execute(query, data)
+        conn.commit()
 
 
-def insert_defense_thread(db_name, defense_thread_id, cfd_id, name, jump_url):
-    conn = sqlite3.connect(db_name)
+def insert_defense_thread(db_name, guild_id, defense_thread_id, cfd_id, name, jump_url):
+    with connection(db_name) as conn:
 
-    query = "INSERT INTO DEFENSE_THREADS (id,defense_call_id,name,jump_url) VALUES (?,?,?,?);"
-    data = (defense_thread_id, cfd_id, name, jump_url)
+        query = "INSERT INTO DEFENSE_THREADS (id,guild_id,defense_call_id,name,jump_url) VALUES (?,?,?,?,?);"
+        data = (defense_thread_id, guild_id, cfd_id, name, jump_url)
 
-    conn.execute(query, data)
-    conn.commit()
-    logger.info(
-        f"Inserted record into DEFENSE_THREADS:\n{defense_thread_id}\n({cfd_id}\n{name}\n{jump_url})"
-    )
-    conn.close()
+        conn.execute(query, data)
+        conn.commit()
+        logger.info(
+            f"Inserted record into DEFENSE_THREADS:\n{defense_thread_id}\n({cfd_id}\n{name}\n{jump_url})"
+        )
 
 
-def list_open_cfds(db_name, game_server):
-    conn = sqlite3.connect(db_name)
-    query = conn.execute(
-        """
-        select
-            dc.id,
-            datetime(dc.land_time, 'localtime'),
-            dc.x_coordinate,
-            dc.y_coordinate,
-            dc.amount_requested,
-            dc.amount_submitted,
-            dt.jump_url
-        from defense_calls dc
-        join defense_threads dt
-            on dc.id = dt.defense_call_id
-        where current_timestamp < land_time
-        and not cancelled;
-        """
-    )
+def list_open_cfds(db_name, guild_id, game_server):
+    with connection(db_name) as conn:
+        query = conn.execute(
+            """
+            select
+                dc.id,
+                datetime(dc.land_time, 'localtime'),
+                dc.x_coordinate,
+                dc.y_coordinate,
+                dc.amount_requested,
+                dc.amount_submitted,
+                dt.jump_url
+            from defense_calls dc
+            join defense_threads dt
+                on dt.guild_id = dc.guild_id
+                and dc.id = dt.defense_call_id
+            where dc.guild_id = ?
+            and current_timestamp < land_time
+            and not cancelled;
+            """,
+            (guild_id,),
+        )
 
-    response = []
-    for row in query:
-        id = row[0]
-        land_time = row[1]
-        x_coordinate = row[2]
-        y_coordinate = row[3]
-        amount_requested = row[4]
-        amount_submitted = row[5]
-        jump_url = row[6]
-        values = f"""
-        **ID: {id}**
-        Land Time:\n{str(land_time).split(".")[0]}
-        Thread: {jump_url}
-        Location: [{x_coordinate}|{y_coordinate}]({game_server}/position_details.php?x={x_coordinate}&y={y_coordinate})
-        Requested: {amount_requested:,}
-        Submitted: {amount_submitted:,}
-        Remaining: __{amount_requested - amount_submitted:,}__
-        """
-        response.append(values)
-
-    if len(response) > 0:
-        embed = discord.Embed(title="Open Defense Calls", color=Colors.SUCCESS)
-
-        max_size = 6000
-        cumulative_size = len(embed.title)
-
-        for index, cfd in enumerate(response):
-            logger.info(f"Cumulative size: {cumulative_size}")
-            cumulative_size += len(cfd)
-            if cumulative_size < max_size:
-                embed.add_field(
-                    name="\u200b",  # You can't have an empty name
-                    value=response[index],
-                    inline=True,
-                )
-            else:
-                logger.warn(
-                    f"Error: Embed total size would be {cumulative_size} characters"
-                )
-    else:
-        embed = discord.Embed(color=Colors.SUCCESS)
-        embed.add_field(name="All Clear", value="No open CFDs")
-    conn.close()
+        response = []
+        for row in query:
+            id = row[0]
+            land_time = row[1]
+            x_coordinate = row[2]
+            y_coordinate = row[3]
+            amount_requested = row[4]
+            amount_submitted = row[5]
+            jump_url = row[6]
+            values = f"""
+            **ID: {id}**
+            Land Time:\n{str(land_time).split(".")[0]}
+            Thread: {jump_url}
+            Location: [{x_coordinate}|{y_coordinate}]({game_server}/position_details.php?x={x_coordinate}&y={y_coordinate})
+            Requested: {amount_requested:,}
+            Submitted: {amount_submitted:,}
+            Remaining: __{amount_requested - amount_submitted:,}__
+            """
+            response.append(values)
+
+        if len(response) > 0:
+            embed = discord.Embed(title="Open Defense Calls", color=Colors.SUCCESS)
+
+            max_size = 6000
+            cumulative_size = len(embed.title)
+
+            for index, cfd in enumerate(response):
+                logger.info(f"Cumulative size: {cumulative_size}")
+                cumulative_size += len(cfd)
+                if cumulative_size < max_size:
+                    embed.add_field(
+                        name="\u200b",  # You can't have an empty name
+                        value=response[index],
+                        inline=True,
+                    )
+                else:
+                    logger.warn(
+                        f"Error: Embed total size would be {cumulative_size} characters"
+                    )
+        else:
+            embed = discord.Embed(color=Colors.SUCCESS)
+            embed.add_field(name="All Clear", value="No open CFDs")
 
     return embed
 
 
-def send_defense(db_name, cfd_id: int, amount_sent: int, message: discord.Message):
-    conn = sqlite3.connect(db_name)
-    query = """
-        UPDATE DEFENSE_CALLS
-        SET amount_submitted = amount_submitted + ?
-        WHERE id = ? returning amount_requested, amount_submitted;
-        """
-    logger.info(f"Executing query: {query}")
-    try:
-        sent_def = conn.execute(
+def send_defense(
+    db_name, guild_id, cfd_id: int, amount_sent: int, message: discord.Message
+):
+    with connection(db_name) as conn:
+        query = """
+            UPDATE DEFENSE_CALLS
+            SET amount_submitted = amount_submitted + ?
+            WHERE id = ? AND guild_id = ? returning amount_requested, amount_submitted;
+            """
+        logger.info(f"Executing query: {query}")
+        try:
+            sent_def = conn.execute(
+                query,
+                (amount_sent, cfd_id, guild_id),
+            )
+
+            sent_def = sent_def.fetchone()
+            amount_requested = sent_def[0]
+            amount_submitted = sent_def[1]
+            logger.info(amount_requested, amount_submitted)
+        except TypeError:
+            """TypeError if the provided CFD ID doesn't exist, as sent_def is then None,
+            which is not subscriptable. The error is on: amount_requested = sent_def[0]"""
+
+            embed = discord.Embed(color=Colors.ERROR)
+            embed.add_field(
+                name="Invalid CFD",
+                value=f"The CFD with ID {cfd_id} does not exist. Try `!def list` to see open CFDs.",
+            )
+
+            return embed
+
+        query = """
+            INSERT INTO SUBMITTED_DEFENSE (
+            guild_id,
+            defense_call_id,
+            submitted_by_id,
+            submitted_by_name,
+            amount_submitted
+            ) VALUES (?,?,?,?,?);
+            """
+        logger.info(f"Executing query: {query}")
+        conn.execute(
             query,
-            (amount_sent, cfd_id),
+            (guild_id, cfd_id, message.author.id, message.author.name, amount_sent),
         )
 
-        sent_def = sent_def.fetchone()
-        amount_requested = sent_def[0]
-        amount_submitted = sent_def[1]
-        logger.info(amount_requested, amount_submitted)
-
         conn.commit()
-    except TypeError:
-        """TypeError if the provided CFD ID doesn't exist, as sent_def is then None,
-        which is not subscriptable. The error is on: amount_requested = sent_def[0]"""
-        conn.close()
 
-        embed = discord.Embed(color=Colors.ERROR)
+        embed = discord.Embed(color=Colors.WARNING)
         embed.add_field(
-            name="Invalid CFD",
-            value=f"The CFD with ID {cfd_id} does not exist. Try `!def list` to see open CFDs.",
+            name="Confirmed",
+            value=f"{amount_sent:,} defense registered for CFD with ID {cfd_id}.\n**{amount_requested - amount_submitted:,} remaining**",
         )
 
-        return embed
-
-    conn = sqlite3.connect(db_name)
-    query = """
-        INSERT INTO SUBMITTED_DEFENSE (
-        defense_call_id,
-        submitted_by_id,
-        submitted_by_name,
-        amount_submitted
-        ) VALUES (?,?,?,?);
-        """
-    logger.info(f"Executing query: {query}")
-    conn.execute(
-        query,
-        (cfd_id, message.author.id, message.author.name, amount_sent),
-    )
-
-    conn.commit()
-
-    embed = discord.Embed(color=Colors.WARNING)
-    embed.add_field(
-        name="Confirmed",
-        value=f"{amount_sent:,} defense registered for CFD with ID {cfd_id}.\n**{amount_requested-amount_submitted:,} remaining**",
-    )
-
-    conn.close()
-
     return embed
 
 
-def get_leaderboard(db_name):
-    conn = sqlite3.connect(db_name)
-    query = """
-        select
-            submitted_by_id,
-            sum(amount_submitted)
-        from SUBMITTED_DEFENSE
-        group by 1
-        order by 2 desc
-        limit 10;
-        """
-    logger.info(f"Executing query: {query}")
-    rows = conn.execute(
-        query,
-        # (amount_sent, cfd_id),
-    )
+def get_leaderboard(db_name, guild_id):
+    with connection(db_name) as conn:
+        query = """
+            select
+                submitted_by_id,
+                sum(amount_submitted)
+            from SUBMITTED_DEFENSE
+            where guild_id = ?
+            group by 1
+            order by 2 desc
+            limit 10;
+            """
+        logger.info(f"Executing query: {query}")
+        rows = conn.execute(
+            query,
+            (guild_id,),
+        )
 
-    conn.commit()
+        conn.commit()
 
-    result = ""
+        result = ""
 
-    for index, row in enumerate(rows):
-        result += f"{index}. <@{row[0]}> ({row[1]:,})\n"
-    embed = discord.Embed(color=Colors.SUCCESS)
-    embed.add_field(
-        name="Leaderboard",
-        value=result,
-    )
-
-    conn.close()
+        for index, row in enumerate(rows):
+            result += f"{index}. <@{row[0]}> ({row[1]:,})\n"
+        embed = discord.Embed(color=Colors.SUCCESS)
+        embed.add_field(
+            name="Leaderboard",
+            value=result,
+        )
 
     return embed
 
@@ -498,3 +551,24 @@ def get_alliance_tag_from_id(conn, alliance_id):
     if result:
         return result[0]
     return None
+
+
+def get_player_population_change(conn, player_id, days=7):
+    """Return (population, change over `days`) from the player_daily rollup, or None"""
+    query = """
+        select population
+        from player_daily
+        where player_id = ?
+        and snapshot_day >= (select max(snapshot_day) from player_daily where player_id = ?) - ?
+        order by snapshot_day
+        """
+    try:
+        rows = conn.execute(query, (player_id, player_id, days)).fetchall()
+    except sqlite3.Error as e:
+        # Servers that haven't been loaded since the rollups were added
+        logger.warning(f"Could not read player_daily: {e}")
+        return None
+
+    if len(rows) == 0:
+        return None
+    return rows[-1][0], rows[-1][0] - rows[0][0]
@@ -1,7 +1,8 @@
 from typing import List
 import discord
 
-from utils.constants import BOT_SERVERS_DB_PATH, ConfigKeys
+from funcs import get_bot_db_path
+from utils.constants import ConfigKeys
 from services.config_service import read_config_str
 
 
@@ -13,7 +14,7 @@ class BaseApp:
     ):
         self.message = message
         self.guild_id = str(self.message.guild.id)
-        self.db_path = f"{BOT_SERVERS_DB_PATH}{self.guild_id}.db"
+        self.db_path = get_bot_db_path(self.guild_id)
         self.keyword = params[0]
         self.params = params[1:]
 
@@ -1,22 +1,27 @@
-import sqlite3
+import os
 import traceback
 from services.analytics_service import AnalyticsService
 import discord
 import pandas as pd
 from funcs import (
     execute_sql,
+    get_player_population_change,
     get_sql_by_path,
     init,
     process_name,
     get_connection_path,
 )
 from utils.constants import GAME_SERVERS_DB_PATH, Colors
+from services.connection_service import connection, run_db
+from services.metrics_service import RETENTION_MINUTES, report
+from services.timing_service import command_failed
 
 # from utils.validators import *
 from utils.decorators import (
     is_dev_or_admin_privs,
     is_dev_or_guild_admin,
     is_dev_or_user_or_admin_privs,
+    is_dev_privs,
 )
 from utils.errors import incorrect_roles_error, invalid_input_error, no_db_error
 from utils.logger import logger
@@ -44,6 +49,8 @@ class BoinkApp(BaseApp):
                 await self.alerts(self.params, self.message)
             elif self.keyword == "stats":
                 await self.stats(self.params, self.message)
+            elif self.keyword == "perf":
+                await self.perf(self.params, self.message)
             else:
                 logger.error(
                     f"{self.keyword} is not a valid command for {self.__class__.__name__}"
@@ -51,6 +58,7 @@ class BoinkApp(BaseApp):
                 response = invalid_input_error()
                 await self.message.channel.send(embed=response)
         except Exception as e:
+            command_failed(e)
             logger.error(f"Error in BoinkApp: {e}")
             logger.error(traceback.format_exc())
             response = incorrect_roles_error([str(e)])
@@ -61,7 +69,9 @@ class BoinkApp(BaseApp):
         logger.info("Initializing database...")
 
         response = init(self.message)
-        DB = read_config_str(self.guild_id, ConfigKeys.DATABASE, "")
+        # Only a database created here is already at the latest schema version.
+        # An existing one keeps its history for `manage.py migrate` to finish.
+        new_database = not os.path.exists(self.db_path)
 
         create_hammers = get_sql_by_path("sql/create_table_hammers.sql")
         create_defense_calls = get_sql_by_path("sql/create_table_defense_calls.sql")
@@ -70,15 +80,24 @@ class BoinkApp(BaseApp):
         )
         create_defense_threads = get_sql_by_path("sql/create_table_defense_threads.sql")
         create_raid_tracking = get_sql_by_path("sql/create_table_raid_tracking.sql")
+        create_schema_version = get_sql_by_path("sql/create_table_schema_version.sql")
+        create_guild_indexes = get_sql_by_path("sql/create_guild_indexes.sql")
+        # The create scripts already include every migration listed here
+        insert_schema_version = get_sql_by_path("sql/insert_schema_version.sql")
 
-        for query in [
+        queries = [
             create_hammers,
             create_defense_calls,
             create_submitted_defense,
             create_defense_threads,
             create_raid_tracking,
-        ]:
-            execute_sql(DB, query)
+            create_schema_version,
+        ]
+        if new_database:
+            queries += [create_guild_indexes, insert_schema_version]
+
+        for query in queries:
+            await run_db(execute_sql, self.db_path, query)
 
         await self.message.channel.send(embed=response)
 
@@ -150,17 +169,7 @@ class BoinkApp(BaseApp):
         ign = " ".join(params).lower()
 
         try:
-            cnx = sqlite3.connect(get_connection_path(game_server))
-
-            # First attempt an exact match
-            query = f"select * from x_world where lower(player_name) = '{ign}'"
-            df = pd.read_sql_query(query, cnx)
-
-            if df.empty:
-                # If no exact match, try a partial match
-                logger.info(f"No exact match found for {ign}. Trying partial match")
-                query = f"select * from x_world where lower(player_name) like '{ign}%'"
-                df = pd.read_sql_query(query, cnx)
+            df, trend = await run_db(self._find_player, game_server, ign)
 
             # Get largest timestamp from the df['timestamp'] column
             # timestamp = df["inserted_at"].max()
@@ -196,6 +205,10 @@ class BoinkApp(BaseApp):
                     f"[View on Travstat](https://www.travstat.com/players/{player_id}) | "
                     f"[View in-game]({game_server}/profile/{player_id})"
                 )
+                if trend:
+                    population, change = trend
+                    link += f"\nPopulation {population:,} ({change:+,} over 7 days)"
+
                 embed = discord.Embed(title=player, color=Colors.SUCCESS)
                 embed.description = (
                     link + "\n\n" + "**Village Name | X|Y | Population**\n"
@@ -210,6 +223,7 @@ class BoinkApp(BaseApp):
                 logger.error(f"No results found for {ign} in the map")
                 raise Exception("No results found")
         except Exception as e:
+            command_failed(e)
             logger.warn(
                 f"Sending failure message due to exception {e}\n{traceback.format_exc()}"
             )
@@ -219,6 +233,25 @@ class BoinkApp(BaseApp):
             )
             await message.channel.send(embed=embed)
 
+    def _find_player(self, game_server: str, ign: str):
+        """The villages of the best matching player and their population trend, read off the event loop"""
+        with connection(get_connection_path(game_server), read_only=True) as cnx:
+            # First attempt an exact match
+            query = f"select * from x_world where lower(player_name) = '{ign}'"
+            df = pd.read_sql_query(query, cnx)
+
+            if df.empty:
+                # If no exact match, try a partial match
+                logger.info(f"No exact match found for {ign}. Trying partial match")
+                query = f"select * from x_world where lower(player_name) like '{ign}%'"
+                df = pd.read_sql_query(query, cnx)
+
+            trend = None
+            if not df.empty:
+                trend = get_player_population_change(cnx, int(df["player_id"][0]))
+
+        return df, trend
+
     @is_dev_or_user_or_admin_privs
     async def alerts(self, params, message):
         action = params[0]
@@ -237,5 +270,26 @@ class BoinkApp(BaseApp):
         raise Exception("Stats command disabled")
 
         analytics = AnalyticsService()
-        stats = analytics.get_command_stats()
+        stats = await run_db(analytics.get_command_stats)
         await message.channel.send(content=str(stats))
+
+    @is_dev_privs
+    async def perf(self, params, message):
+        """Latency percentiles and counts of everything the bot has timed recently"""
+        minutes = RETENTION_MINUTES
+        if params:
+            if not params[0].isdigit() or not 1 <= int(params[0]) <= RETENTION_MINUTES:
+                await message.channel.send(embed=invalid_input_error())
+                return
+            minutes = int(params[0])
+
+        blocks = report(minutes)
+        if not blocks:
+            await message.channel.send(
+                content=f"Nothing recorded in the last {minutes} minutes"
+            )
+            return
+
+        await message.channel.send(content=f"Last {minutes} minutes")
+        for block in blocks:
+            await message.channel.send(content=block)
@@ -8,6 +8,8 @@ from utils.logger import logger
 from funcs import *
 from services.config_service import read_config_str
 from utils.constants import ConfigKeys
+from services.connection_service import connection, query_db, run_db
+from services.timing_service import command_failed
 
 
 class DefApp(BaseApp):
@@ -31,51 +33,52 @@ class DefApp(BaseApp):
                 response = invalid_input_error()
                 await self.message.channel.send(embed=response)
         except Exception as e:
+            command_failed(e)
             response = incorrect_roles_error([str(e)])
             await self.message.channel.send(embed=response)
 
     @is_dev_or_anvil_or_admin_privs
     async def list(self, message):
-        self.DB = read_config_str(self.guild_id, ConfigKeys.DATABASE, "")
         game_server = read_config_str(self.guild_id, ConfigKeys.GAME_SERVER, "")
-        response = list_open_cfds(self.DB, game_server)
+        response = await run_db(
+            list_open_cfds, self.db_path, self.guild_id, game_server
+        )
         await message.channel.send(embed=response)
 
     @is_dev_or_anvil_or_admin_privs
     async def send(self, message: discord.Message, params):
         if isinstance(message.channel, discord.Thread):
             logger.warn("Message is in a thread")
-            cfd_id = self._get_cfd_id_from_thread_id(message.channel.id)
+            cfd_id = await run_db(self._get_cfd_id_from_thread_id, message.channel.id)
         else:
             cfd_id = params[0]
         logger.info(f"Params: {params}")
         amount_sent = int(params[-1].replace(",", ""))
 
-        response = send_defense(self.db_path, cfd_id, amount_sent, message)
+        response = await run_db(
+            send_defense, self.db_path, self.guild_id, cfd_id, amount_sent, message
+        )
 
         await message.channel.send(embed=response)
 
     @is_dev_or_anvil_or_admin_privs
     async def leaderboard(self, message):
-        self.DB = read_config_str(self.guild_id, ConfigKeys.DATABASE, "")
-        response = get_leaderboard(self.db_path)
+        response = await run_db(get_leaderboard, self.db_path, self.guild_id)
         await message.channel.send(embed=response)
 
     @is_dev_or_anvil_or_admin_privs
     async def log(self, message: discord.Message):
         if isinstance(message.channel, discord.Thread):
-            cfd_id = self._get_cfd_id_from_thread_id(message.channel.id)
-            query = "select submitted_by_id, amount_submitted, datetime(submitted_at, 'localtime') from submitted_defense where defense_call_id = ?"
-            conn = sqlite3.connect(self.db_path)
-            data = (cfd_id,)
-            rows = conn.execute(query, data)
+            cfd_id = await run_db(self._get_cfd_id_from_thread_id, message.channel.id)
+            query = "select submitted_by_id, amount_submitted, datetime(submitted_at, 'localtime') from submitted_defense where guild_id = ? and defense_call_id = ?"
+            data = (self.guild_id, cfd_id)
+            rows = await query_db(self.db_path, query, data)
 
             result = ""
 
             for index, row in enumerate(rows):
                 logger.info(row)
                 result += f"{index}. <@{row[0]}> ({row[1]:,} @ {row[2]})\n"
-            conn.close()
 
             embed = discord.Embed(color=Colors.SUCCESS)
             embed.add_field(
@@ -86,10 +89,10 @@ class DefApp(BaseApp):
             await message.channel.send(embed=embed)
 
     def _get_cfd_id_from_thread_id(self, thread_id: int):
-        query = "select defense_call_id from defense_threads where id = ?"
-        conn = sqlite3.connect(self.db_path)
-        data = (thread_id,)
-        result = conn.execute(query, data)
-        cfd_id = result.fetchone()[0]
-        conn.close()
+        query = (
+            "select defense_call_id from defense_threads where id = ? and guild_id = ?"
+        )
+        data = (thread_id, self.guild_id)
+        with connection(self.db_path) as conn:
+            cfd_id = conn.execute(query, data).fetchone()[0]
         return cfd_id
@@ -7,6 +7,8 @@ from utils.printers import *
 from utils.logger import logger
 from funcs import *
 from utils.constants import ConfigKeys
+from services.connection_service import run_db
+from services.timing_service import command_failed
 import traceback
 
 
@@ -31,6 +33,7 @@ class TrackerApp(BaseApp):
                 )
                 await self.help()
         except Exception as e:
+            command_failed(e)
             logger.error(f"Error in TrackerApp: {e}")
             logger.error(f"Stack trace: {traceback.format_exc()}")
 
@@ -41,7 +44,6 @@ class TrackerApp(BaseApp):
     async def add(self, params):
         logger.info(f"Params: {params}")
 
-        self.DB = read_config_str(self.guild_id, "database", "")
         description = []
         url = None
         coords = None
@@ -80,23 +82,12 @@ class TrackerApp(BaseApp):
 
         logger.debug("Coordinates are valid")
 
-        if validate_unique_url(self.DB, url, description):
-            # Build query and data tuple based on whether notes are provided
-            base_query = "INSERT INTO HAMMERS (IGN, LINK, TIMESTAMP, COORDINATES{}) VALUES (?, ?, CURRENT_TIMESTAMP, ?{});"
-            notes_part = ", NOTES" if notes else ""
-            notes_placeholder = ", ?" if notes else ""
-            query = base_query.format(notes_part, notes_placeholder)
-            data = (
-                (description, url, coords, notes)
-                if notes
-                else (description, url, coords)
+        if await run_db(
+            validate_unique_url, self.db_path, self.guild_id, url, description
+        ):
+            await run_db(
+                add_report, self.db_path, self.guild_id, description, url, coords, notes
             )
-            logger.info(f"Query: {query}, Data: {data}")
-
-            # Execute database operation
-            with sqlite3.connect(self.DB) as conn:
-                conn.execute(query, data)
-                conn.commit()
 
             # Create response embed
             response = discord.Embed(color=Colors.SUCCESS)
@@ -116,18 +107,29 @@ class TrackerApp(BaseApp):
 
     @is_dev_or_user_or_admin_privs
     async def get(self, params):
-        self.DB = read_config_str(self.guild_id, ConfigKeys.DATABASE, "")
         game_server = read_config_str(self.guild_id, ConfigKeys.GAME_SERVER, "")
 
         try:
             if isinstance(int(params[-1]), int):
                 # This means it was `!tracker get ign 5`
-                response = get_reports(
-                    self.DB, " ".join(params[:-1]), game_server, params[-1]
+                response = await run_db(
+                    get_reports,
+                    self.db_path,
+                    self.guild_id,
+                    " ".join(params[:-1]),
+                    game_server,
+                    params[-1],
                 )
         except ValueError:
-            response = get_one_report(self.DB, " ".join(params), game_server)
-        except KeyError:
+            response = await run_db(
+                get_one_report,
+                self.db_path,
+                self.guild_id,
+                " ".join(params),
+                game_server,
+            )
+        except KeyError as e:
+            command_failed(e)
             response = no_db_error()
 
         await self.message.channel.send(embed=response)
@@ -137,15 +139,13 @@ class TrackerApp(BaseApp):
         logger.info(f"Params: {params}")
         ign = params[0]
         id = params[1]
-        DB = read_config_str(self.guild_id, ConfigKeys.DATABASE, "")
-        response = delete_report(DB, ign, id)
+        response = await run_db(delete_report, self.db_path, self.guild_id, ign, id)
 
         await message.channel.send(embed=response)
 
     @is_dev_or_user_or_admin_privs
     async def list(self, message):
-        self.DB = read_config_str(self.guild_id, ConfigKeys.DATABASE, "")
-        response = list_all_names(self.DB)
+        response = await run_db(list_all_names, self.db_path, self.guild_id)
 
         await message.channel.send(embed=response)
 
@@ -1,16 +1,93 @@
-import sqlite3
+import os
+import threading
+import time
 from typing import Optional, Dict, List
 from utils.logger import logger
 from utils.constants import ANALYTICS_DB_PATH
+from services.connection_service import connection
+
+# Rows are written in one transaction once this many are waiting...
+ANALYTICS_BATCH_SIZE = 100
+# ...or once the oldest has waited this long
+ANALYTICS_FLUSH_SECONDS = 5.0
+# Beyond this, new rows are dropped rather than growing without bound while
+# the database is unavailable
+ANALYTICS_BUFFER_LIMIT = 10_000
+# Added to the analytics table after release by
+# databases/migrations/analytics/001_add_timing_columns.sql
+ANALYTICS_TIMING_COLUMNS = {"db_time_ms", "discord_time_ms"}
+
+INSERT_QUERY = """
+    INSERT INTO ANALYTICS (
+        app, full_command, discord_user_id, discord_user_name, discord_server_id, discord_server_name, travian_server_code,
+        execution_time_ms, db_time_ms, discord_time_ms, success, error_message, recorded_at
+    )
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?);
+"""
+
+# For an analytics table not yet migrated; rows drop db_time_ms and discord_time_ms
+INSERT_WITHOUT_TIMING_QUERY = """
+    INSERT INTO ANALYTICS (
+        app, full_command, discord_user_id, discord_user_name, discord_server_id, discord_server_name, travian_server_code,
+        execution_time_ms, success, error_message, recorded_at
+    )
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?);
+"""
 
 
 class AnalyticsService:
-    """Class to manage analytics data across all Discord servers"""
+    """Class to manage analytics data across all Discord servers.
 
-    def __init__(self):
-        self.db_path = ANALYTICS_DB_PATH
+    Commands are only queued in memory; flush() writes them in batches.
+    """
+
+    def __init__(
+        self,
+        batch_size: int = ANALYTICS_BATCH_SIZE,
+        flush_seconds: float = ANALYTICS_FLUSH_SECONDS,
+        buffer_limit: int = ANALYTICS_BUFFER_LIMIT,
+        db_path: str = ANALYTICS_DB_PATH,
+    ):
+        self.db_path = db_path
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self.buffer_limit = buffer_limit
+        self._buffer: List[tuple] = []
+        self._oldest: Optional[float] = None
+        # Commands are queued on the event loop and flushed on a database thread
+        self._lock = threading.Lock()
+        self.recorded = 0
+        self.flushed = 0
+        self.dropped = 0
+        self.failed_flushes = 0
+        self._reported_drops = 0
+        self.records_timing = self.has_timing_columns()
         logger.info("Analytics Service initialized")
 
+    def has_timing_columns(self) -> bool:
+        """The analytics table has the timing columns INSERT_QUERY writes.
+
+        A database not created yet will have them; one created before them
+        needs `python manage.py migrate` in databases/.
+        """
+        if not os.path.exists(self.db_path):
+            return True
+        try:
+            with connection(self.db_path) as conn:
+                columns = {
+                    row[1] for row in conn.execute("pragma table_info(analytics)")
+                }
+        except Exception as e:
+            logger.error(f"Failed to read the analytics columns: {e}")
+            return True
+        if columns and not ANALYTICS_TIMING_COLUMNS <= columns:
+            logger.warning(
+                "The analytics table has no timing columns; run `python manage.py migrate` "
+                "in databases/ to record db_time_ms and discord_time_ms"
+            )
+            return False
+        return True
+
     def record_command(
         self,
         app: str,
@@ -21,41 +98,108 @@ class AnalyticsService:
         discord_server_name: str,
         travian_server_code: str,
         execution_time: Optional[float] = None,
+        db_time: Optional[float] = None,
+        discord_time: Optional[float] = None,
         success: bool = True,
         error_message: Optional[str] = None,
-    ) -> None:
-        """Record a command interaction in the analytics table"""
-        try:
-            execution_time_ms = (
-                int(execution_time * 1000) if execution_time is not None else None
+    ) -> bool:
+        """Queue a command interaction for the analytics table.
+
+        Returns False, and counts the row as dropped, if the buffer is full.
+        """
+        execution_time_ms, db_time_ms, discord_time_ms = (
+            int(seconds * 1000) if seconds is not None else None
+            for seconds in (execution_time, db_time, discord_time)
+        )
+        success_int = 1 if success else 0
+        data = (
+            app,
+            full_command,
+            discord_user_id,
+            discord_user_name,
+            discord_server_id,
+            discord_server_name,
+            travian_server_code,
+            execution_time_ms,
+            db_time_ms,
+            discord_time_ms,
+            success_int,
+            error_message,
+            # When the command ran, not when its row is flushed
+            time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime()),
+        )
+
+        with self._lock:
+            if len(self._buffer) >= self.buffer_limit:
+                self.dropped += 1
+                return False
+            if not self._buffer:
+                self._oldest = time.monotonic()
+            self._buffer.append(data)
+            self.recorded += 1
+        return True
+
+    def flush_due(self) -> bool:
+        """A full batch is waiting, or rows have waited long enough"""
+        with self._lock:
+            if not self._buffer:
+                return False
+            return (
+                len(self._buffer) >= self.batch_size
+                or time.monotonic() - self._oldest >= self.flush_seconds
             )
-            success_int = 1 if success else 0
 
-            query = """
-                INSERT INTO ANALYTICS (
-                    app, full_command, discord_user_id, discord_user_name, discord_server_id, discord_server_name, travian_server_code,
-                    execution_time_ms, success, error_message
-                )
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?);
-            """
-            data = (
-                app,
-                full_command,
-                discord_user_id,
-                discord_user_name,
-                discord_server_id,
-                discord_server_name,
-                travian_server_code,
-                execution_time_ms,
-                success_int,
-                error_message,
+    def flush(self) -> int:
+        """Write every queued row in one transaction; returns the rows written"""
+        with self._lock:
+            rows, self._buffer = self._buffer, []
+            oldest, self._oldest = self._oldest, None
+            dropped = self.dropped - self._reported_drops
+            self._reported_drops = self.dropped
+
+        if dropped:
+            logger.warning(
+                f"Dropped {dropped} analytics rows while the buffer was full"
             )
+        if not rows:
+            return 0
 
-            with sqlite3.connect(self.db_path) as conn:
-                conn.execute(query, data)
-            logger.info(f"Recorded analytics for command: {full_command}")
+        if self.records_timing:
+            query, values = INSERT_QUERY, rows
+        else:
+            query, values = (
+                INSERT_WITHOUT_TIMING_QUERY,
+                [row[:8] + row[10:] for row in rows],
+            )
+
+        try:
+            with connection(self.db_path) as conn:
+                conn.executemany(query, values)
         except Exception as e:
             logger.error(f"Failed to record analytics: {e}")
+            with self._lock:
+                self.failed_flushes += 1
+                # Keep the rows for the next flush, oldest first, within the limit
+                kept = rows + self._buffer
+                self.dropped += max(len(kept) - self.buffer_limit, 0)
+                self._buffer = kept[: self.buffer_limit]
+                self._oldest = oldest
+            return 0
+
+        with self._lock:
+            self.flushed += len(rows)
+        logger.info(f"Recorded analytics for {len(rows)} commands")
+        return len(rows)
+
+    def buffer_stats(self) -> Dict:
+        with self._lock:
+            return {
+                "buffered": len(self._buffer),
+                "recorded": self.recorded,
+                "flushed": self.flushed,
+                "dropped": self.dropped,
+                "failed_flushes": self.failed_flushes,
+            }
 
     def get_command_stats(
         self, days: int = 7, server_id: Optional[int] = None
@@ -85,7 +229,7 @@ class AnalyticsService:
 
             query = base_query.format(server_filter=server_filter)
 
-            with sqlite3.connect(self.db_path) as conn:
+            with connection(self.db_path) as conn:
                 rows = conn.execute(query, params).fetchall()
                 return [
                     {
@@ -121,7 +265,7 @@ class AnalyticsService:
                 ORDER BY total_uses DESC;
             """
 
-            with sqlite3.connect(self.db_path) as conn:
+            with connection(self.db_path) as conn:
                 rows = conn.execute(query, (user_id, f"-{days} days")).fetchall()
                 return [
                     {
@@ -153,7 +297,7 @@ class AnalyticsService:
                 AND recorded_at >= datetime('now', ?, 'localtime');
             """
 
-            with sqlite3.connect(self.db_path) as conn:
+            with connection(self.db_path) as conn:
                 row = conn.execute(query, (server_id, f"-{days} days")).fetchone()
                 return {
                     "total_commands": row[0],
@@ -15,6 +15,8 @@ class ConfigService:
 
         ConfigService._instance = self
         self._config = configparser.ConfigParser()
+        # Bumped on every change, so anything derived from the config knows to rebuild
+        self.version = 0
         self._reload_config()
 
     def get_instance() -> "ConfigService":
@@ -25,6 +27,7 @@ class ConfigService:
     def _reload_config(self) -> None:
         """Reload the config from disk"""
         self._config.read("config.ini")
+        self.version += 1
 
     def read_config_str(self, section: str, key: str, default: str = "") -> str:
         """Read a string value from the config"""
@@ -54,6 +57,7 @@ class ConfigService:
                 self._config.add_section(str(section))
 
             self._config[str(section)][key] = value
+            self.version += 1
 
             with open("config.ini", "w") as conf:
                 self._config.write(conf)
@@ -98,3 +102,7 @@ def update_config(section: str, key: str, value: str) -> bool:
 
 def dump_config() -> dict:
     return config_service.dump_config()
+
+
+def config_version() -> int:
+    return config_service.version
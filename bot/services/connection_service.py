@@ -0,0 +1,147 @@
+import asyncio
+import sqlite3
+import sys
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from functools import partial
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+from services.metrics_service import timer
+from services.timing_service import timed
+from utils.database import connect
+from utils.logger import logger
+
+# Each open database holds a file descriptor, plus two more for its WAL and
+# shared memory, so hundreds of guilds can't all stay open
+MAX_CONNECTIONS = 64
+# Threads running queries off the event loop. SQLite releases the GIL while it
+# works, so a slow guild only ties up one of them.
+DB_WORKERS = 4
+
+
+class ConnectionService:
+    _instance: Optional["ConnectionService"] = None
+
+    def __init__(
+        self, max_connections: int = MAX_CONNECTIONS, workers: int = DB_WORKERS
+    ):
+        if ConnectionService._instance is not None:
+            raise Exception(
+                "ConnectionService is a singleton class. Use ConnectionService.get_instance()"
+            )
+
+        ConnectionService._instance = self
+        self.max_connections = max_connections
+        self._connections: "OrderedDict[Tuple[str, bool], sqlite3.Connection]" = (
+            OrderedDict()
+        )
+        # One connection is never used by two threads at once, and is never
+        # evicted while borrowed
+        self._path_locks: Dict[Tuple[str, bool], threading.RLock] = {}
+        self._borrowed: Dict[Tuple[str, bool], int] = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="db"
+        )
+
+    def get_instance() -> "ConnectionService":
+        if ConnectionService._instance is None:
+            ConnectionService()
+        return ConnectionService._instance
+
+    def _get_connection(self, key: Tuple[str, bool]) -> sqlite3.Connection:
+        with self._lock:
+            conn = self._connections.get(key)
+            if conn is not None:
+                self._connections.move_to_end(key)
+                return conn
+
+            conn = connect(*key)
+            self._connections[key] = conn
+            idle = [k for k in self._connections if not self._borrowed.get(k)]
+            while len(self._connections) > self.max_connections and idle:
+                evicted = idle.pop(0)
+                logger.debug(f"Closing least recently used connection to {evicted[0]}")
+                self._connections.pop(evicted).close()
+            return conn
+
+    @contextmanager
+    def connection(
+        self, db_path: str, read_only: bool = False
+    ) -> Iterator[sqlite3.Connection]:
+        """Borrow a pooled connection. Commits on success and rolls back on error, but never closes it."""
+        key = (db_path, read_only)
+        with self._lock:
+            path_lock = self._path_locks.setdefault(key, threading.RLock())
+            self._borrowed[key] = self._borrowed.get(key, 0) + 1
+
+        try:
+            with timed("db"), path_lock:
+                conn = self._get_connection(key)
+                try:
+                    yield conn
+                except BaseException:
+                    if conn.in_transaction:
+                        conn.rollback()
+                    raise
+                if conn.in_transaction:
+                    conn.commit()
+        finally:
+            with self._lock:
+                self._borrowed[key] -= 1
+
+    async def run(self, func: Callable, *args: Any, **kwargs: Any) -> Any:
+        """Run blocking database work on the worker threads and await its result"""
+        name = getattr(func, "__qualname__", type(func).__name__)
+        return await self.run_as(name, func, *args, **kwargs)
+
+    async def run_as(self, name: str, func: Callable, *args: Any, **kwargs: Any) -> Any:
+        """run(), timed in the metrics as `db.<name>`"""
+        loop = asyncio.get_running_loop()
+        with timed("db"), timer(f"db.{name}"):
+            return await loop.run_in_executor(
+                self._executor, partial(func, *args, **kwargs)
+            )
+
+    def fetch_all(
+        self, db_path: str, query: str, params: tuple = (), read_only: bool = False
+    ) -> List[tuple]:
+        with self.connection(db_path, read_only) as conn:
+            return conn.execute(query, params).fetchall()
+
+    def close_all(self) -> None:
+        """Close every pooled connection"""
+        with self._lock:
+            while self._connections:
+                _, conn = self._connections.popitem()
+                conn.close()
+
+    def __len__(self) -> int:
+        return len(self._connections)
+
+
+connection_service = ConnectionService.get_instance()
+
+
+def connection(db_path: str, read_only: bool = False):
+    return connection_service.connection(db_path, read_only)
+
+
+async def run_db(func: Callable, *args: Any, **kwargs: Any) -> Any:
+    return await connection_service.run(func, *args, **kwargs)
+
+
+async def query_db(
+    db_path: str, query: str, params: tuple = (), read_only: bool = False
+) -> List[tuple]:
+    """Run one query off the event loop and return all of its rows"""
+    # Timed under the function that runs the query
+    caller = sys._getframe(1).f_code.co_qualname
+    return await connection_service.run_as(
+        caller, connection_service.fetch_all, db_path, query, params, read_only
+    )
+
+
+def close_all_connections() -> None:
+    connection_service.close_all()
@@ -0,0 +1,203 @@
+import re
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Deque, Dict, Iterator, List, Optional, Tuple
+
+# Histograms keep 2**SUB_BUCKET_BITS buckets per power of two microseconds, so
+# a percentile is within about 3% of the true value at any scale
+SUB_BUCKET_BITS = 5
+# Metrics are kept per minute for this long; `!boink perf` reports any window within it
+RETENTION_MINUTES = 60
+# Command keywords come from users, so new names stop being tracked past this
+MAX_METRICS = 500
+
+_SUB_BUCKETS = 1 << SUB_BUCKET_BITS
+_DISCORD_ID = re.compile(r"\d{15,}")
+
+
+def _bucket(micros: int) -> int:
+    exponent = max(micros.bit_length() - SUB_BUCKET_BITS - 1, 0)
+    return (exponent << SUB_BUCKET_BITS) + (micros >> exponent)
+
+
+def _bucket_value(index: int) -> float:
+    """The middle of a bucket, in microseconds"""
+    exponent = max(index // _SUB_BUCKETS - 1, 0)
+    lowest = (index - (exponent << SUB_BUCKET_BITS)) << exponent
+    return lowest + ((1 << exponent) - 1) / 2
+
+
+class Histogram:
+    """HDR-style latency histogram: log-linear buckets of microseconds"""
+
+    def __init__(self):
+        self.counts: Dict[int, int] = {}
+        self.count = 0
+        self.max = 0.0
+
+    def record(self, seconds: float) -> None:
+        index = _bucket(max(int(seconds * 1e6), 0))
+        self.counts[index] = self.counts.get(index, 0) + 1
+        self.count += 1
+        self.max = max(self.max, seconds)
+
+    def merge(self, other: "Histogram") -> None:
+        for index, count in other.counts.items():
+            self.counts[index] = self.counts.get(index, 0) + count
+        self.count += other.count
+        self.max = max(self.max, other.max)
+
+    def percentile(self, percent: float) -> float:
+        """In seconds; 0 for an empty histogram"""
+        if not self.count:
+            return 0.0
+        rank = max(percent / 100 * self.count, 1)
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= rank:
+                return min(_bucket_value(index) / 1e6, self.max)
+        return self.max
+
+
+class MetricsService:
+    """Latency histograms and counters for the bot, kept per minute in memory"""
+
+    _instance: Optional["MetricsService"] = None
+
+    def __init__(self):
+        if MetricsService._instance is not None:
+            raise Exception(
+                "MetricsService is a singleton class. Use MetricsService.get_instance()"
+            )
+
+        MetricsService._instance = self
+        self._histograms: Dict[str, Deque[Tuple[int, Histogram]]] = {}
+        self._counters: Dict[str, Deque[List[int]]] = {}
+        self._lock = threading.Lock()
+
+    def get_instance() -> "MetricsService":
+        if MetricsService._instance is None:
+            MetricsService()
+        return MetricsService._instance
+
+    def _slots(self, metrics: Dict[str, Deque], name: str) -> Optional[Deque]:
+        slots = metrics.get(name)
+        if slots is None and len(self._histograms) + len(self._counters) < MAX_METRICS:
+            slots = metrics[name] = deque(maxlen=RETENTION_MINUTES)
+        return slots
+
+    def observe(self, name: str, seconds: float) -> None:
+        minute = int(time.time() // 60)
+        with self._lock:
+            slots = self._slots(self._histograms, name)
+            if slots is None:
+                return
+            if not slots or slots[-1][0] != minute:
+                slots.append((minute, Histogram()))
+            slots[-1][1].record(seconds)
+
+    def increment(self, name: str, count: int = 1) -> None:
+        minute = int(time.time() // 60)
+        with self._lock:
+            slots = self._slots(self._counters, name)
+            if slots is None:
+                return
+            if not slots or slots[-1][0] != minute:
+                slots.append([minute, 0])
+            slots[-1][1] += count
+
+    @contextmanager
+    def timer(self, name: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start)
+
+    def histograms(self, minutes: int = RETENTION_MINUTES) -> Dict[str, Histogram]:
+        """Every histogram merged over the last `minutes` minutes"""
+        since = int(time.time() // 60) - minutes
+        merged = {}
+        with self._lock:
+            for name, slots in self._histograms.items():
+                histogram = Histogram()
+                for minute, slot in slots:
+                    if minute > since:
+                        histogram.merge(slot)
+                if histogram.count:
+                    merged[name] = histogram
+        return merged
+
+    def counters(self, minutes: int = RETENTION_MINUTES) -> Dict[str, int]:
+        since = int(time.time() // 60) - minutes
+        with self._lock:
+            totals = {
+                name: sum(count for minute, count in slots if minute > since)
+                for name, slots in self._counters.items()
+            }
+        return {name: total for name, total in totals.items() if total}
+
+    def reset(self) -> None:
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
+
+
+metrics_service = MetricsService.get_instance()
+
+
+def observe(name: str, seconds: float) -> None:
+    metrics_service.observe(name, seconds)
+
+
+def increment(name: str, count: int = 1) -> None:
+    metrics_service.increment(name, count)
+
+
+def timer(name: str):
+    return metrics_service.timer(name)
+
+
+def report(minutes: int, limit: int = 1900) -> List[str]:
+    """Percentiles and counts over the last `minutes`, as code blocks that fit in messages"""
+    histograms = metrics_service.histograms(minutes)
+    counters = metrics_service.counters(minutes)
+    if not histograms and not counters:
+        return []
+    width = max([len(name) for name in list(histograms) + list(counters)] + [6])
+    width = min(width, 48)
+
+    columns = " ".join(f"{column:>8}" for column in ("p50", "p95", "p99", "max"))
+    lines = [f"{'Metric':<{width}} {'Count':>7} {columns} (ms)"]
+    for name, histogram in sorted(histograms.items()):
+        percentiles = " ".join(
+            f"{histogram.percentile(percent) * 1000:>8.1f}" for percent in (50, 95, 99)
+        )
+        lines.append(
+            f"{name[:width]:<{width}} {histogram.count:>7} {percentiles} "
+            f"{histogram.max * 1000:>8.1f}"
+        )
+    if counters:
+        lines += ["", f"{'Counter':<{width}} {'Count':>7}"]
+        lines += [
+            f"{name[:width]:<{width}} {count:>7}"
+            for name, count in sorted(counters.items())
+        ]
+
+    messages = []
+    block = []
+    for line in lines:
+        if block and sum(len(text) + 1 for text in block) + len(line) > limit:
+            messages.append("```\n" + "\n".join(block) + "\n```")
+            block = []
+        block.append(line)
+    messages.append("```\n" + "\n".join(block) + "\n```")
+    return messages
+
+
+def discord_route(method: str, path: str) -> str:
+    """One metric per Discord endpoint, whichever channel or message it is for"""
+    return f"discord.{method} {_DISCORD_ID.sub('{id}', path)}"
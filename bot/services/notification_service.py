@@ -1,13 +1,21 @@
 import datetime
 import sqlite3
 import string
+import sys
+from contextlib import closing
 import discord
 from utils.constants import ConfigKeys, NotificationFlags, Colors
+from services.connection_service import connection_service, run_db
+from utils.database import connect
 from utils.logger import logger
 from services.config_service import read_config_str
 from funcs import get_alliance_tag_from_id, get_connection_path
 
 
+def fetch_all(conn: sqlite3.Connection, query: str, params: tuple = ()) -> list:
+    return list(conn.execute(query, params))
+
+
 class NotificationService:
     """Service to manage notifications and alerts across Discord servers"""
 
@@ -59,6 +67,14 @@ class NotificationService:
             logger.error(f"Error checking message history: {e}")
             return False
 
+    async def _fetch_all(
+        self, conn: sqlite3.Connection, query: str, params: tuple = ()
+    ) -> list:
+        """Run a query on a DB worker thread so the event loop keeps serving other guilds"""
+        # Timed under the alert that runs the query
+        caller = sys._getframe(1).f_code.co_qualname
+        return await connection_service.run_as(caller, fetch_all, conn, query, params)
+
     ######### ALERT FUNCTIONS #########
 
     async def _send_alliance_change_alert(
@@ -68,7 +84,7 @@ class NotificationService:
         try:
             # Get all players that changed alliances
             query = "select * from v_player_change where alliance_changed=1 and current_population>0"
-            rows = conn.execute(query)
+            rows = await self._fetch_all(conn, query)
 
             for row in rows:
                 if self._is_data_too_old(row[11]):
@@ -88,8 +104,10 @@ class NotificationService:
         """Send an alert about player changes to the specified channel"""
         try:
             # Player changed alliances
-            current_alliance = get_alliance_tag_from_id(conn, player_data[2])
-            old_alliance = get_alliance_tag_from_id(conn, player_data[3])
+            current_alliance = await run_db(
+                get_alliance_tag_from_id, conn, player_data[2]
+            )
+            old_alliance = await run_db(get_alliance_tag_from_id, conn, player_data[3])
 
             if current_alliance is None or current_alliance == "":
                 alert_message = f"Player {player_data[1]} left alliance {old_alliance}."
@@ -121,7 +139,7 @@ class NotificationService:
         try:
             # Get all players that changed alliances
             query = "select * from v_player_change where current_population=0"
-            rows = conn.execute(query)
+            rows = await self._fetch_all(conn, query)
 
             for row in rows:
                 if self._is_data_too_old(row[11]):
@@ -189,7 +207,7 @@ class NotificationService:
             """
 
             # Convert cursor to list to get count
-            rows = list(conn.execute(query, (alliance.strip(),)))
+            rows = await self._fetch_all(conn, query, (alliance.strip(),))
 
             channel = discord.utils.get(guild.text_channels, name=notif_channel)
             if channel is None:
@@ -238,7 +256,9 @@ class NotificationService:
         # Get game server config and connect to DB
         game_server = read_config_str(guild.id, ConfigKeys.GAME_SERVER, "")
 
-        with sqlite3.connect(get_connection_path(game_server)) as conn:
+        # A connection of its own rather than a pooled one: it is held across
+        # every Discord send of the run, and only one query runs on it at a time
+        with closing(connect(get_connection_path(game_server), read_only=True)) as conn:
             # Check each flag and process corresponding alerts
             if alert_code & NotificationFlags.PLAYER_DELETED:
                 logger.info("Sending player deleted alerts")
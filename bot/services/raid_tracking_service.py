@@ -4,6 +4,7 @@ from datetime import datetime, timedelta
 from typing import List, Tuple, Optional
 from utils.logger import logger
 from utils.constants import Colors
+from services.connection_service import connection, run_db
 import discord
 
 
@@ -69,88 +70,113 @@ class RaidTrackingService:
                 f"Found {len(top_entries)} top entries and {'a' if personal_entry else 'no'} personal entry"
             )
 
-            # Store entries
-            with sqlite3.connect(db_path) as conn:
-                # Store top 10 with rounded timestamp
-                rounded_time = self._round_to_last_update(now)
-                for rank, name, total in top_entries:
-                    # Check if record already exists
-                    existing = conn.execute(
-                        """
-                        SELECT id FROM RAID_TRACKING 
-                        WHERE player_name = ? 
-                        AND recorded_at = ?
-                        AND is_personal = FALSE
-                        """,
-                        (name, rounded_time),
-                    ).fetchone()
+            return await run_db(
+                self._record_leaderboard,
+                db_path,
+                message.guild.id,
+                str(message.channel.id),
+                top_entries,
+                personal_entry,
+                now,
+            )
+
+        except Exception as e:
+            logger.error(f"Error processing leaderboard: {e}", exc_info=True)
+            return None
+
+    def _record_leaderboard(
+        self,
+        db_path: str,
+        guild_id: int,
+        channel_id: str,
+        top_entries: List[Tuple[int, str, int]],
+        personal_entry: Optional[Tuple[int, str, int]],
+        now: datetime,
+    ) -> str:
+        """Store the leaderboard and build the rates table. Runs on a DB worker thread."""
+        with connection(db_path) as conn:
+            # Store top 10 with rounded timestamp
+            rounded_time = self._round_to_last_update(now)
+            for rank, name, total in top_entries:
+                # Check if record already exists
+                existing = conn.execute(
+                    """
+                    SELECT id FROM RAID_TRACKING 
+                    WHERE guild_id = ?
+                    AND player_name = ? 
+                    AND recorded_at = ?
+                    AND is_personal = FALSE
+                    """,
+                    (guild_id, name, rounded_time),
+                ).fetchone()
+
+                if existing:
+                    logger.debug(
+                        f"Skipping duplicate entry for {name} at {rounded_time}"
+                    )
+                    continue
 
-                    if existing:
-                        logger.debug(
-                            f"Skipping duplicate entry for {name} at {rounded_time}"
-                        )
-                        continue
+                logger.debug(
+                    f"Storing top entry: {name} (rank {rank}) with {total:,} at {rounded_time}"
+                )
+                conn.execute(
+                    """
+                    INSERT INTO RAID_TRACKING (
+                        guild_id, player_name, rank, total_raided, channel_id, recorded_at, is_personal
+                    ) VALUES (?, ?, ?, ?, ?, ?, ?)
+                    """,
+                    (
+                        guild_id,
+                        name,
+                        rank,
+                        total,
+                        channel_id,
+                        rounded_time,
+                        False,
+                    ),
+                )
 
+            # Store personal entry with exact timestamp
+            if personal_entry:
+                rank, name, total = personal_entry
+                # Check if record already exists
+                existing = conn.execute(
+                    """
+                    SELECT id FROM RAID_TRACKING 
+                    WHERE guild_id = ?
+                    AND player_name = ? 
+                    AND recorded_at = ?
+                    AND is_personal = TRUE
+                    """,
+                    (guild_id, name, now),
+                ).fetchone()
+
+                if not existing:
                     logger.debug(
-                        f"Storing top entry: {name} (rank {rank}) with {total:,} at {rounded_time}"
+                        f"Storing personal entry: {name} (rank {rank}) with {total:,}"
                     )
                     conn.execute(
                         """
                         INSERT INTO RAID_TRACKING (
-                            player_name, rank, total_raided, channel_id, recorded_at, is_personal
-                        ) VALUES (?, ?, ?, ?, ?, ?)
+                            guild_id, player_name, rank, total_raided, channel_id, recorded_at, is_personal
+                        ) VALUES (?, ?, ?, ?, ?, ?, ?)
                         """,
-                        (
-                            name,
-                            rank,
-                            total,
-                            str(message.channel.id),
-                            rounded_time,
-                            False,
-                        ),
+                        (guild_id, name, rank, total, channel_id, now, True),
+                    )
+                else:
+                    logger.debug(
+                        f"Skipping duplicate personal entry for {name} at {now}"
                     )
-
-                # Store personal entry with exact timestamp
-                if personal_entry:
-                    rank, name, total = personal_entry
-                    # Check if record already exists
-                    existing = conn.execute(
-                        """
-                        SELECT id FROM RAID_TRACKING 
-                        WHERE player_name = ? 
-                        AND recorded_at = ?
-                        AND is_personal = TRUE
-                        """,
-                        (name, now),
-                    ).fetchone()
-
-                    if not existing:
-                        logger.debug(
-                            f"Storing personal entry: {name} (rank {rank}) with {total:,}"
-                        )
-                        conn.execute(
-                            """
-                            INSERT INTO RAID_TRACKING (
-                                player_name, rank, total_raided, channel_id, recorded_at, is_personal
-                            ) VALUES (?, ?, ?, ?, ?, ?)
-                            """,
-                            (name, rank, total, str(message.channel.id), now, True),
-                        )
-                    else:
-                        logger.debug(
-                            f"Skipping duplicate personal entry for {name} at {now}"
-                        )
 
             # Calculate raid rates
-            return await self._calculate_raid_rates(conn, top_entries, personal_entry)
-
-        except Exception as e:
-            logger.error(f"Error processing leaderboard: {e}", exc_info=True)
-            return None
+            return self._calculate_raid_rates(
+                conn, guild_id, top_entries, personal_entry
+            )
 
-    async def _calculate_raid_rates(
+    def _calculate_raid_rates(
         self,
         conn: sqlite3.Connection,
+        guild_id: int,
         top_entries: List[Tuple[int, str, int]],
         personal_entry: Optional[Tuple[int, str, int]],
     ) -> str:
@@ -194,13 +220,14 @@ class RaidTrackingService:
                 """
                 SELECT total_raided, recorded_at
                 FROM RAID_TRACKING 
-                WHERE player_name = ? 
+                WHERE guild_id = ?
+                AND player_name = ? 
                 AND is_personal = FALSE
                 AND recorded_at >= ?
                 ORDER BY recorded_at DESC
                 LIMIT 2
                 """,
-                (name, week_start),
+                (guild_id, name, week_start),
             ).fetchall()
 
             if len(recent_records) < 2:
@@ -222,13 +249,14 @@ class RaidTrackingService:
                 """
                 SELECT total_raided, recorded_at
                 FROM RAID_TRACKING 
-                WHERE player_name = ? 
+                WHERE guild_id = ?
+                AND player_name = ? 
                 AND recorded_at >= ?
                 AND is_personal = FALSE
                 ORDER BY recorded_at ASC
                 LIMIT 1
                 """,
-                (name, week_start),
+                (guild_id, name, week_start),
             ).fetchone()
 
             week_rate = "N/A"
@@ -0,0 +1,83 @@
+from typing import Dict, NamedTuple, Optional, Tuple
+from services.config_service import (
+    config_version,
+    read_config_bool,
+    read_config_str,
+)
+from utils.constants import (
+    ALLOW_FORWARDING,
+    APPLICATIONS,
+    FORWARDING_MAP,
+    ConfigKeys,
+)
+from utils.factory import PREFIX
+
+COMMAND_PREFIXES = tuple(f"{PREFIX}{application}" for application in APPLICATIONS)
+
+
+class Route(NamedTuple):
+    """What can happen to a message in one channel, worked out from the config"""
+
+    # (guild id, channel id) to copy the message to
+    forward_to: Optional[Tuple[int, int]]
+    game_server: str
+    ignore_24_7: bool
+    # The raid channel of a guild with a database
+    raid_leaderboard: bool
+
+
+def _parse_forwarding_map(
+    forwarding_map: Dict[str, str],
+) -> Dict[Tuple[int, int], Tuple[int, int]]:
+    forwards = {}
+    for source, target in forwarding_map.items():
+        guild_id, channel_id = source.split("#")
+        target_guild_id, target_channel_id = target.split("#")
+        forwards[(int(guild_id), int(channel_id))] = (
+            int(target_guild_id),
+            int(target_channel_id),
+        )
+    return forwards
+
+
+class RoutingService:
+    """Per-channel routes for on_message, built once and rebuilt when the config changes"""
+
+    def __init__(self, forwarding_map: Dict[str, str] = None):
+        if forwarding_map is None:
+            forwarding_map = FORWARDING_MAP if ALLOW_FORWARDING else {}
+        self._forwards = _parse_forwarding_map(forwarding_map)
+        self._routes: Dict[Tuple[int, int], Route] = {}
+        self._version = config_version()
+
+    def route(self, guild_id: int, channel_id: int) -> Route:
+        if self._version != config_version():
+            self._routes.clear()
+            self._version = config_version()
+
+        key = (guild_id, channel_id)
+        route = self._routes.get(key)
+        if route is None:
+            route = self._build(guild_id, channel_id)
+            self._routes[key] = route
+        return route
+
+    def _build(self, guild_id: int, channel_id: int) -> Route:
+        raid_channel = read_config_str(guild_id, ConfigKeys.RAID_CHANNEL, "")
+        return Route(
+            forward_to=self._forwards.get((guild_id, channel_id)),
+            game_server=read_config_str(guild_id, ConfigKeys.GAME_SERVER, ""),
+            ignore_24_7=read_config_bool(guild_id, ConfigKeys.IGNORE_24_7, False),
+            raid_leaderboard=bool(raid_channel)
+            and raid_channel == str(channel_id)
+            and bool(read_config_str(guild_id, ConfigKeys.DATABASE, "")),
+        )
+
+
+def is_command(content: str) -> bool:
+    return content.startswith(COMMAND_PREFIXES)
+
+
+def may_have_coordinates(content: str) -> bool:
+    """Coordinates always have a separator, and most messages have neither"""
+    return "|" in content or "/" in content
@@ -0,0 +1,152 @@
+import functools
+import inspect
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Dict, Iterator, Optional
+
+import aiohttp
+import discord
+from services.config_service import read_config_str
+from services.metrics_service import discord_route, increment, observe
+from utils.constants import ConfigKeys
+from utils.logger import logger
+
+
+class CommandTiming:
+    """Where one command spent its time, and whether it failed"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.db_seconds = 0.0
+        self.discord_seconds = 0.0
+        self.error_message: Optional[str] = None
+        # Time inside a timed section isn't counted again by a nested one
+        self._timing = False
+
+    def fail(self, error: BaseException) -> None:
+        self.error_message = str(error) or type(error).__name__
+
+    def as_record(self) -> Dict[str, Any]:
+        """The keyword arguments for AnalyticsService.record_command"""
+        return {
+            "execution_time": time.perf_counter() - self.started,
+            "db_time": self.db_seconds,
+            "discord_time": self.discord_seconds,
+            "success": self.error_message is None,
+            "error_message": self.error_message,
+        }
+
+
+# The command being run by the current task, if any
+_current: ContextVar[Optional[CommandTiming]] = ContextVar(
+    "command_timing", default=None
+)
+
+
+@contextmanager
+def timed(kind: str) -> Iterator[None]:
+    """Count the time spent in the block as the current command's `kind` time: db or discord"""
+    timing = _current.get()
+    if timing is None or timing._timing:
+        yield
+        return
+
+    timing._timing = True
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        timing._timing = False
+        if kind == "db":
+            timing.db_seconds += elapsed
+        else:
+            timing.discord_seconds += elapsed
+
+
+def command_failed(error: BaseException) -> None:
+    """Mark the current command as failed, for handlers that reply with an error instead of raising"""
+    timing = _current.get()
+    if timing is not None:
+        timing.fail(error)
+
+
+async def run_timed(
+    record: Callable[..., Any],
+    run: Callable[[], Awaitable[Any]],
+    metric: str,
+    **command: Any,
+) -> Any:
+    """Run a command, then record its timings and outcome with the command's details.
+
+    The metrics get its latency as `command.<metric>`, and its failures.
+    """
+    timing = CommandTiming()
+    token = _current.set(timing)
+    try:
+        return await run()
+    except Exception as e:
+        timing.fail(e)
+        raise
+    finally:
+        _current.reset(token)
+        timings = timing.as_record()
+        observe(f"command.{metric}", timings["execution_time"])
+        if not timings["success"]:
+            increment(f"command.{metric}.errors")
+        record(**command, **timings)
+
+
+def discord_trace_config() -> aiohttp.TraceConfig:
+    """Times every Discord API request, in the metrics and as the running command's Discord time"""
+
+    async def on_request_start(session, context, params):
+        context.timing = _current.get()
+        context.start = time.perf_counter()
+
+    async def on_request_end(session, context, params):
+        elapsed = time.perf_counter() - context.start
+        route = discord_route(params.method, params.url.path)
+        observe(route, elapsed)
+        if isinstance(params, aiohttp.TraceRequestExceptionParams):
+            increment(f"{route}.errors")
+        timing = context.timing
+        if timing is not None and not timing._timing:
+            timing.discord_seconds += elapsed
+
+    trace_config = aiohttp.TraceConfig()
+    trace_config.on_request_start.append(on_request_start)
+    trace_config.on_request_end.append(on_request_end)
+    trace_config.on_request_exception.append(on_request_end)
+    return trace_config
+
+
+def timed_app_command(func: Callable) -> Callable:
+    """Record a slash command's timings and outcome, like the message commands"""
+    signature = inspect.signature(func)
+
+    @functools.wraps(func)
+    async def wrapper(interaction: discord.Interaction, *args, **kwargs):
+        analytics = getattr(interaction.client, "analytics", None)
+        if analytics is None:
+            logger.debug(f"No analytics to record /{func.__name__} in")
+            return await func(interaction, *args, **kwargs)
+
+        arguments = signature.bind(interaction, *args, **kwargs).arguments
+        options = [f"{name}:{value}" for name, value in list(arguments.items())[1:]]
+        guild_id = interaction.guild.id if interaction.guild else 0
+        return await run_timed(
+            analytics.record_command,
+            lambda: func(interaction, *args, **kwargs),
+            f"/{func.__name__}",
+            app=func.__name__,
+            full_command=" ".join([f"/{func.__name__}"] + options),
+            discord_user_id=interaction.user.id,
+            discord_user_name=interaction.user.display_name,
+            discord_server_id=guild_id,
+            discord_server_name=interaction.guild.name if interaction.guild else "",
+            travian_server_code=read_config_str(guild_id, ConfigKeys.GAME_SERVER, ""),
+        )
+
+    return wrapper
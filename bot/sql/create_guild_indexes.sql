@@ -0,0 +1,10 @@
+-- Every lookup is scoped to one guild, so guild_id leads each index.
+-- Keep in step with BOT_SERVER_INDEXES in databases/indexes.py.
+CREATE INDEX IF NOT EXISTS hammers_guild_lower_ign ON HAMMERS (GUILD_ID, lower(IGN), TIMESTAMP);
+CREATE INDEX IF NOT EXISTS hammers_guild_ign_coordinates ON HAMMERS (GUILD_ID, IGN, COORDINATES);
+CREATE INDEX IF NOT EXISTS defense_calls_guild_land_time ON DEFENSE_CALLS (guild_id, land_time);
+CREATE INDEX IF NOT EXISTS defense_calls_guild_event_id ON DEFENSE_CALLS (guild_id, event_id);
+CREATE INDEX IF NOT EXISTS defense_threads_guild_defense_call_id ON DEFENSE_THREADS (guild_id, defense_call_id);
+CREATE INDEX IF NOT EXISTS submitted_defense_guild_defense_call_id ON SUBMITTED_DEFENSE (guild_id, defense_call_id);
+CREATE INDEX IF NOT EXISTS submitted_defense_guild_submitter ON SUBMITTED_DEFENSE (guild_id, submitted_by_id, amount_submitted);
+CREATE INDEX IF NOT EXISTS raid_tracking_guild_player ON RAID_TRACKING (guild_id, player_name, is_personal, recorded_at);
@@ -1,5 +1,6 @@
 CREATE TABLE IF NOT EXISTS DEFENSE_CALLS(
     id INTEGER PRIMARY KEY AUTOINCREMENT NOT NULL,
+    guild_id INTEGER NOT NULL,
     created_by_id INTEGER NOT NULL,
     event_id INTEGER NOT NULL,
     created_by_name TEXT NOT NULL,
@@ -1,7 +1,8 @@
 CREATE TABLE IF NOT EXISTS DEFENSE_THREADS(
     id INTEGER PRIMARY KEY NOT NULL,
+    guild_id INTEGER NOT NULL,
     defense_call_id INTEGER NOT NULL,
     name TEXT NOT NULL,
     jump_url TEXT NOT NULL,
     FOREIGN KEY(defense_call_id) REFERENCES SUBMITTED_DEFENSE(id)
-    );
\ No newline at end of file
+    );
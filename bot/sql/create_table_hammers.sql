@@ -1,5 +1,6 @@
 CREATE TABLE IF NOT EXISTS HAMMERS (
     ID INTEGER PRIMARY KEY AUTOINCREMENT NOT NULL,
+    GUILD_ID INTEGER NOT NULL,
     IGN TEXT NOT NULL,
     LINK TEXT NOT NULL,
     COORDINATES TEXT NOT NULL,
@@ -0,0 +1,5 @@
+CREATE TABLE IF NOT EXISTS SCHEMA_VERSION (
+    version INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    applied_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+    );
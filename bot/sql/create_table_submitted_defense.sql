@@ -1,5 +1,6 @@
 CREATE TABLE IF NOT EXISTS SUBMITTED_DEFENSE(
     id INTEGER PRIMARY KEY AUTOINCREMENT NOT NULL,
+    guild_id INTEGER NOT NULL,
     defense_call_id INTEGER NOT NULL,
     submitted_by_id INTEGER NOT NULL,
     submitted_by_name TEXT NOT NULL, 
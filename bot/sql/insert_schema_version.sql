@@ -0,0 +1,3 @@
+INSERT OR IGNORE INTO SCHEMA_VERSION (version, name) VALUES
+    (1, '001_add_notes_to_hammers'),
+    (2, '002_partition_by_guild_id');
@@ -4,6 +4,7 @@ from discord import Message, Member, Guild
 from utils.constants import pytest_id
 from unittest.mock import MagicMock
 from core import Core
+from services.connection_service import close_all_connections
 
 
 @pytest.fixture
@@ -59,3 +60,10 @@ def mock_core(mock_discord_client):
     core = Core(intents=intents)
     core.client = mock_discord_client
     return core
+
+
+@pytest.fixture(autouse=True)
+def close_pooled_connections():
+    # Tests patch sqlite3.connect, so a pooled mock must not leak into the next test
+    yield
+    close_all_connections()
@@ -0,0 +1,180 @@
+import sqlite3
+from unittest.mock import AsyncMock, patch
+
+import pytest
+from services import analytics_service
+from services.analytics_service import AnalyticsService
+from test.conftest import build_mock_message
+
+ANALYTICS_SQL = "../databases/sql/create_table_analytics.sql"
+
+
+@pytest.fixture
+def analytics(tmp_path):
+    db_path = str(tmp_path / "analytics.db")
+    with open(ANALYTICS_SQL, "r") as sql_file, sqlite3.connect(db_path) as conn:
+        conn.executescript(sql_file.read())
+    return AnalyticsService(
+        batch_size=3, flush_seconds=60, buffer_limit=5, db_path=db_path
+    )
+
+
+def record(service: AnalyticsService, command: str = "!tracker get") -> bool:
+    return service.record_command(
+        app="tracker",
+        full_command=command,
+        discord_user_id=1,
+        discord_user_name="user",
+        discord_server_id=2,
+        discord_server_name="server",
+        travian_server_code="ts2",
+    )
+
+
+def rows(service: AnalyticsService) -> list:
+    with sqlite3.connect(service.db_path) as conn:
+        return conn.execute(
+            "select full_command, recorded_at is not null from analytics order by id"
+        ).fetchall()
+
+
+class TestAnalyticsService:
+    def test_recording_only_queues(self, analytics):
+        with patch.object(analytics_service, "connection") as connection:
+            assert record(analytics)
+
+        connection.assert_not_called()
+        assert rows(analytics) == []
+        assert analytics.buffer_stats()["buffered"] == 1
+
+    def test_flushes_in_one_batch(self, analytics):
+        record(analytics, "!tracker get a")
+        record(analytics, "!tracker get b")
+        assert not analytics.flush_due()
+        record(analytics, "!tracker get c")
+        assert analytics.flush_due()
+
+        assert analytics.flush() == 3
+
+        assert rows(analytics) == [
+            ("!tracker get a", 1),
+            ("!tracker get b", 1),
+            ("!tracker get c", 1),
+        ]
+        assert not analytics.flush_due()
+        assert analytics.flush() == 0
+
+    def test_flush_due_after_interval(self, analytics, monkeypatch):
+        record(analytics)
+        assert not analytics.flush_due()
+
+        monkeypatch.setattr(analytics, "flush_seconds", 0)
+
+        assert analytics.flush_due()
+
+    def test_drops_when_full(self, analytics):
+        results = [record(analytics, f"!tracker get {i}") for i in range(7)]
+
+        assert results == [True] * 5 + [False] * 2
+        assert analytics.flush() == 5
+        assert analytics.buffer_stats() == {
+            "buffered": 0,
+            "recorded": 5,
+            "flushed": 5,
+            "dropped": 2,
+            "failed_flushes": 0,
+        }
+
+    def test_failed_flush_keeps_rows(self, analytics, tmp_path):
+        db_path = analytics.db_path
+        analytics.db_path = str(tmp_path / "missing" / "analytics.db")
+        for i in range(4):
+            record(analytics, f"!tracker get {i}")
+
+        assert analytics.flush() == 0
+        record(analytics, "!tracker get 4")
+        record(analytics, "!tracker get 5")
+
+        analytics.db_path = db_path
+        assert analytics.flush() == 5
+        assert [command for command, _ in rows(analytics)] == [
+            f"!tracker get {i}" for i in range(5)
+        ]
+        stats = analytics.buffer_stats()
+        assert stats["failed_flushes"] == 1 and stats["dropped"] == 1
+
+    def test_records_without_timing_columns_on_an_older_table(self, analytics):
+        with sqlite3.connect(analytics.db_path) as conn:
+            conn.execute("alter table analytics drop column db_time_ms")
+            conn.execute("alter table analytics drop column discord_time_ms")
+
+        service = AnalyticsService(db_path=analytics.db_path)
+        service.record_command(
+            app="tracker",
+            full_command="!tracker get",
+            discord_user_id=1,
+            discord_user_name="user",
+            discord_server_id=2,
+            discord_server_name="server",
+            travian_server_code="ts2",
+            execution_time=0.5,
+            db_time=0.1,
+            success=False,
+            error_message="error",
+        )
+
+        assert not service.records_timing
+        assert service.flush() == 1
+        with sqlite3.connect(service.db_path) as conn:
+            assert conn.execute(
+                "select execution_time_ms, success, error_message from analytics"
+            ).fetchall() == [(500, 0, "error")]
+            # Adding the columns is left to the databases migrations
+            columns = {row[1] for row in conn.execute("pragma table_info(analytics)")}
+        assert "db_time_ms" not in columns
+
+    def test_records_timing_columns(self, analytics):
+        analytics.record_command(
+            app="tracker",
+            full_command="!tracker get",
+            discord_user_id=1,
+            discord_user_name="user",
+            discord_server_id=2,
+            discord_server_name="server",
+            travian_server_code="ts2",
+            execution_time=0.5,
+            db_time=0.1,
+            discord_time=0.2,
+        )
+
+        assert analytics.records_timing
+        assert analytics.flush() == 1
+        with sqlite3.connect(analytics.db_path) as conn:
+            assert conn.execute(
+                "select execution_time_ms, db_time_ms, discord_time_ms from analytics"
+            ).fetchall() == [(500, 100, 200)]
+
+
+class TestCore:
+    @pytest.mark.asyncio
+    async def test_commands_are_queued(self, analytics, mock_core):
+        mock_core.analytics = analytics
+        message = build_mock_message("!tracker get player")
+        app = AsyncMock()
+
+        with patch("core.get_app", return_value=app):
+            await mock_core.on_message(message)
+
+        app.run.assert_awaited_once()
+
+        assert analytics.buffer_stats()["buffered"] == 1
+        assert rows(analytics) == []
+
+    @pytest.mark.asyncio
+    async def test_close_flushes(self, analytics, mock_core):
+        mock_core.analytics = analytics
+        record(analytics)
+
+        await mock_core.close()
+
+        assert rows(analytics) == [("!tracker get", 1)]
@@ -1,8 +1,12 @@
+import configparser
+import sqlite3
+
 import pytest
 from unittest.mock import AsyncMock, MagicMock
 from unittest.mock import patch
+import funcs
 from utils.constants import Colors, ConfigKeys, pytest_id
-from services.config_service import dump_config, update_config
+from services.config_service import config_service, dump_config, update_config
 
 MOCK_GAME_SERVER = "https://ts2.x1.america.travian.com"
 
@@ -148,3 +152,39 @@ class TestBoinkApp:
         mock_message.channel.send.assert_called_once()
         sent_embed = mock_message.channel.send.call_args[1]["embed"]
         assert sent_embed.color.value == Colors.ERROR
+
+
+class TestSchemaCheck:
+    @pytest.fixture
+    def guild_dbs(self, tmp_path, monkeypatch):
+        parser = configparser.ConfigParser()
+        for guild_id, versions in {"1": [1], "2": [1, 2], "3": None, "4": []}.items():
+            db_path = str(tmp_path / f"{guild_id}.db")
+            parser[guild_id] = {ConfigKeys.DATABASE: db_path}
+            if versions is None:
+                continue
+            with sqlite3.connect(db_path) as conn:
+                conn.execute("create table hammers (ign text)")
+                if versions:
+                    conn.execute("create table schema_version (version integer)")
+                    conn.executemany(
+                        "insert into schema_version values (?)",
+                        [(version,) for version in versions],
+                    )
+        monkeypatch.setattr(config_service, "_config", parser)
+        monkeypatch.setattr(
+            funcs, "get_bot_db_path", lambda guild_id: str(tmp_path / f"{guild_id}.db")
+        )
+        return tmp_path
+
+    def test_finds_databases_behind_the_latest_migration(self, guild_dbs):
+        # 3.db was never created, so there is nothing to migrate
+        assert funcs.outdated_bot_databases() == [
+            str(guild_dbs / "1.db"),
+            str(guild_dbs / "4.db"),
+        ]
+
+    @pytest.mark.asyncio
+    async def test_refuses_to_start(self, guild_dbs, mock_core):
+        with pytest.raises(RuntimeError, match="manage.py migrate"):
+            await mock_core.setup_hook()
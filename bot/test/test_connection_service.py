@@ -0,0 +1,110 @@
+import asyncio
+import configparser
+import sqlite3
+import time
+from unittest.mock import patch
+
+import funcs
+import pytest
+from services.config_service import config_service
+from services.connection_service import connection, connection_service
+from test.conftest import build_mock_message
+from utils.constants import pytest_id
+
+
+def get_connection(db_path, read_only=False):
+    with connection(db_path, read_only) as conn:
+        return conn
+
+
+@pytest.fixture
+def guild_dbs(tmp_path):
+    paths = []
+    for guild_id in range(3):
+        path = str(tmp_path / f"{guild_id}.db")
+        with sqlite3.connect(path) as conn:
+            conn.execute("create table hammers (ign text)")
+        paths.append(path)
+    return paths
+
+
+class TestConnectionService:
+    def test_reuses_connection_per_path(self, guild_dbs):
+        assert get_connection(guild_dbs[0]) is get_connection(guild_dbs[0])
+        assert get_connection(guild_dbs[0]) is not get_connection(guild_dbs[1])
+        assert get_connection(guild_dbs[0]) is not get_connection(
+            guild_dbs[0], read_only=True
+        )
+
+    def test_evicts_least_recently_used(self, guild_dbs, monkeypatch):
+        monkeypatch.setattr(connection_service, "max_connections", 2)
+        first = get_connection(guild_dbs[0])
+        second = get_connection(guild_dbs[1])
+        get_connection(guild_dbs[0])
+
+        get_connection(guild_dbs[2])
+
+        assert len(connection_service) == 2
+        assert get_connection(guild_dbs[0]) is first
+        with pytest.raises(sqlite3.ProgrammingError):
+            second.execute("select 1")
+
+    def test_commits_on_success_and_rolls_back_on_error(self, guild_dbs):
+        with connection(guild_dbs[0]) as conn:
+            conn.execute("insert into hammers values ('kept')")
+
+        with pytest.raises(ValueError):
+            with connection(guild_dbs[0]) as conn:
+                conn.execute("insert into hammers values ('discarded')")
+                raise ValueError
+
+        with sqlite3.connect(guild_dbs[0]) as other:
+            assert other.execute("select ign from hammers").fetchall() == [("kept",)]
+
+    def test_read_only_connection_refuses_writes(self, guild_dbs):
+        with pytest.raises(sqlite3.OperationalError):
+            with connection(guild_dbs[0], read_only=True) as conn:
+                conn.execute("insert into hammers values ('nope')")
+
+
+SLOW_QUERY = """
+with recursive counter(x) as (select 1 union all select x + 1 from counter where x < 5000000)
+select count(*) from counter
+"""
+
+
+class TestNonBlockingCommands:
+    async def test_slow_guild_does_not_block_others(self, mock_core, tmp_path):
+        timings = {}
+        messages = []
+        for guild_id in (1001, 1002):
+            with sqlite3.connect(tmp_path / f"{guild_id}.db") as conn:
+                conn.executescript(open("sql/create_table_hammers.sql").read())
+
+            message = build_mock_message("!tracker list", id=guild_id)
+            message.guild.id = guild_id
+            message.author.id = pytest_id
+
+            async def send(*args, guild_id=guild_id, **kwargs):
+                timings[guild_id] = time.perf_counter()
+
+            message.channel.send = send
+            messages.append(message)
+
+        def list_all_names(db_name, guild_id):
+            if db_name.endswith("1001.db"):
+                with connection(db_name) as conn:
+                    conn.execute(SLOW_QUERY).fetchall()
+            return funcs.list_all_names(db_name, guild_id)
+
+        start = time.perf_counter()
+        # An empty config, so neither guild touches config.ini or consolidated_db
+        with (
+            patch("handlers.tracker_app.list_all_names", list_all_names),
+            patch("funcs.BOT_SERVERS_DB_PATH", f"{tmp_path}/"),
+            patch.object(config_service, "_config", configparser.ConfigParser()),
+        ):
+            await asyncio.gather(*(mock_core.on_message(m) for m in messages))
+
+        slow, fast = timings[1001] - start, timings[1002] - start
+        assert fast < slow / 4
@@ -0,0 +1,153 @@
+import random
+import sqlite3
+import time
+from unittest.mock import AsyncMock, patch
+
+import pytest
+from services import metrics_service as metrics
+from services.connection_service import query_db, run_db
+from services.metrics_service import Histogram, discord_route, metrics_service, report
+from utils.constants import Colors, pytest_id
+
+
+@pytest.fixture(autouse=True)
+def reset_metrics():
+    metrics_service.reset()
+    yield
+    metrics_service.reset()
+
+
+class TestHistogram:
+    def test_percentiles_within_bucket_precision(self):
+        rng = random.Random(1)
+        samples = [rng.lognormvariate(-4, 1) for _ in range(20000)]
+        histogram = Histogram()
+        for sample in samples:
+            histogram.record(sample)
+
+        samples.sort()
+        for percent in (50, 95, 99):
+            exact = samples[int(percent / 100 * len(samples)) - 1]
+            assert histogram.percentile(percent) == pytest.approx(exact, rel=0.04)
+        assert histogram.max == samples[-1]
+        assert histogram.percentile(100) == pytest.approx(samples[-1], rel=0.04)
+        assert Histogram().percentile(50) == 0.0
+
+    def test_merge(self):
+        first, second = Histogram(), Histogram()
+        for _ in range(3):
+            first.record(0.001)
+        second.record(0.5)
+
+        first.merge(second)
+
+        assert first.count == 4
+        assert first.percentile(50) == pytest.approx(0.001, rel=0.04)
+        assert first.percentile(99) == pytest.approx(0.5, rel=0.04)
+
+
+class TestMetricsService:
+    def test_window(self):
+        now = time.time()
+        with patch.object(metrics.time, "time", return_value=now - 30 * 60):
+            metrics.observe("command.tracker get", 0.2)
+            metrics.increment("command.tracker get.errors")
+        metrics.observe("command.tracker get", 0.01)
+        metrics.increment("command.tracker get.errors", 2)
+
+        assert metrics_service.histograms(5)["command.tracker get"].count == 1
+        assert metrics_service.histograms(60)["command.tracker get"].count == 2
+        assert metrics_service.counters(5) == {"command.tracker get.errors": 2}
+        assert metrics_service.counters(60) == {"command.tracker get.errors": 3}
+
+    def test_stops_adding_names_at_the_limit(self, monkeypatch):
+        monkeypatch.setattr(metrics, "MAX_METRICS", 2)
+        for keyword in ["get", "add", "typo"]:
+            metrics.observe(f"command.tracker {keyword}", 0.01)
+        metrics.observe("command.tracker get", 0.01)
+
+        assert {
+            name: histogram.count
+            for name, histogram in metrics_service.histograms().items()
+        } == {"command.tracker get": 2, "command.tracker add": 1}
+
+    def test_report_fits_in_messages(self):
+        for i in range(100):
+            metrics.observe(f"db.function_{i}", 0.001 * i)
+        metrics.increment("loop.close_threads.errors")
+
+        blocks = report(60)
+
+        assert len(blocks) > 1
+        assert all(len(block) <= 2000 for block in blocks)
+        assert all(
+            block.startswith("```") and block.endswith("```") for block in blocks
+        )
+        text = "".join(blocks)
+        assert "db.function_99" in text and "loop.close_threads.errors" in text
+        assert report(60) and not report(0)
+
+    def test_discord_routes(self):
+        assert (
+            discord_route("POST", "/api/v10/channels/1312569623476174949/messages")
+            == "discord.POST /api/v10/channels/{id}/messages"
+        )
+
+    @pytest.mark.asyncio
+    async def test_database_call_sites(self, tmp_path):
+        db_path = str(tmp_path / "guild.db")
+        with sqlite3.connect(db_path) as conn:
+            conn.execute("create table hammers (ign text)")
+
+        async def list_hammers():
+            return await query_db(db_path, "select * from hammers")
+
+        await run_db(time.sleep, 0)
+        await list_hammers()
+
+        names = set(metrics_service.histograms())
+        assert "db.sleep" in names
+        assert (
+            "db.TestMetricsService.test_database_call_sites.<locals>.list_hammers"
+            in names
+        )
+
+
+class TestPerfCommand:
+    @pytest.mark.asyncio
+    async def test_prints_percentiles(self, mock_message, mock_core):
+        metrics.observe("command.tracker get", 0.05)
+        mock_message.content = "!boink perf 15"
+        mock_message.channel.send = AsyncMock()
+        mock_message.author.id = pytest_id
+
+        await mock_core.on_message(mock_message)
+
+        sent = [
+            call.kwargs["content"] for call in mock_message.channel.send.call_args_list
+        ]
+        assert sent[0] == "Last 15 minutes"
+        assert "command.tracker get" in sent[1] and "p99" in sent[1]
+
+    @pytest.mark.asyncio
+    async def test_dev_only(self, mock_message, mock_core):
+        mock_message.content = "!boink perf"
+        mock_message.channel.send = AsyncMock()
+        mock_message.author.id = 1
+
+        await mock_core.on_message(mock_message)
+
+        embed = mock_message.channel.send.call_args.kwargs["embed"]
+        assert embed.color.value == Colors.ERROR
+        assert "Dev" in embed.fields[0].value
+
+    @pytest.mark.asyncio
+    async def test_rejects_a_window_out_of_range(self, mock_message, mock_core):
+        mock_message.content = "!boink perf 600"
+        mock_message.channel.send = AsyncMock()
+        mock_message.author.id = pytest_id
+
+        await mock_core.on_message(mock_message)
+
+        embed = mock_message.channel.send.call_args.kwargs["embed"]
+        assert embed.color.value == Colors.ERROR
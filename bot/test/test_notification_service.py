@@ -3,6 +3,7 @@ import discord
 import pytest
 from unittest.mock import MagicMock, AsyncMock, patch
 import sqlite3
+from services.metrics_service import metrics_service
 from services.notification_service import NotificationService
 from utils.constants import Colors, NotificationFlags
 
@@ -55,6 +56,18 @@ class TestNotificationService:
                 "Player Test Player has changed alliances from **NEW** to **OLD**"
             )
 
+    async def test_queries_are_timed_under_their_alert(self, notification_service):
+        service, guild, channel = notification_service
+        mock_conn = MagicMock(spec=sqlite3.Connection)
+        mock_conn.execute.return_value = []
+        metrics_service.reset()
+
+        await service._send_player_deleted_alert(mock_conn, guild)
+
+        assert list(metrics_service.histograms()) == [
+            "db.NotificationService._send_player_deleted_alert"
+        ]
+
     async def test_channel_not_found(self, notification_service):
         service, guild, channel = notification_service
         # Setup mocks
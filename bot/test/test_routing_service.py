@@ -0,0 +1,140 @@
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+from services import routing_service
+from services.config_service import update_config
+from services.routing_service import RoutingService, is_command, may_have_coordinates
+from utils.constants import Colors, ConfigKeys
+
+GUILD_ID = 987654321
+RAID_CHANNEL = 555
+FORWARDING_MAP = {f"{GUILD_ID}#1": "42#43"}
+MOCK_GAME_SERVER = "https://ts2.x1.america.travian.com"
+
+
+@pytest.fixture
+def routes():
+    update_config(str(GUILD_ID), ConfigKeys.GAME_SERVER, MOCK_GAME_SERVER)
+    update_config(str(GUILD_ID), ConfigKeys.RAID_CHANNEL, str(RAID_CHANNEL))
+    update_config(str(GUILD_ID), ConfigKeys.DATABASE, "")
+    update_config(str(GUILD_ID), ConfigKeys.IGNORE_24_7, "False")
+    return RoutingService(FORWARDING_MAP)
+
+
+class TestRoutingService:
+    def test_routes_from_config(self, routes):
+        forwarded = routes.route(GUILD_ID, 1)
+        plain = routes.route(GUILD_ID, 2)
+
+        assert forwarded.forward_to == (42, 43)
+        assert plain.forward_to is None
+        assert plain.game_server == MOCK_GAME_SERVER
+        assert not plain.ignore_24_7
+        # No database yet, so nothing to record leaderboards in
+        assert not routes.route(GUILD_ID, RAID_CHANNEL).raid_leaderboard
+
+    def test_built_once_per_channel(self, routes):
+        with patch.object(routes, "_build", wraps=routes._build) as build:
+            for _ in range(100):
+                routes.route(GUILD_ID, 2)
+
+        build.assert_called_once_with(GUILD_ID, 2)
+
+    def test_rebuilt_when_config_changes(self, routes):
+        assert not routes.route(GUILD_ID, 2).ignore_24_7
+
+        update_config(str(GUILD_ID), ConfigKeys.IGNORE_24_7, "True")
+        update_config(str(GUILD_ID), ConfigKeys.DATABASE, "1234")
+
+        assert routes.route(GUILD_ID, 2).ignore_24_7
+        assert routes.route(GUILD_ID, RAID_CHANNEL).raid_leaderboard
+        assert not routes.route(GUILD_ID, RAID_CHANNEL + 1).raid_leaderboard
+
+    def test_message_checks(self):
+        assert is_command("!tracker get player")
+        assert not is_command("!other")
+        assert not is_command("hello !boink")
+
+        assert may_have_coordinates("attack on 55|-55")
+        assert may_have_coordinates("55/55 is under attack")
+        assert not may_have_coordinates("good morning")
+
+
+class TestOnMessage:
+    @pytest.mark.asyncio
+    async def test_links_coordinates(self, routes, mock_message, mock_core):
+        mock_core.routes = routes
+        mock_message.guild.id = GUILD_ID
+        mock_message.channel.id = 2
+        mock_message.channel.send = AsyncMock()
+        mock_message.content = "incoming on −‭44‬‬|‭84?"
+
+        await mock_core.on_message(mock_message)
+
+        embed = mock_message.channel.send.call_args[1]["embed"]
+        assert embed.color.value == Colors.SUCCESS
+        assert (
+            embed.fields[0].value
+            == f"{MOCK_GAME_SERVER}/position_details.php?x=-44&y=84"
+        )
+
+    @pytest.mark.asyncio
+    async def test_links_every_coordinate_in_one_embed(
+        self, routes, mock_message, mock_core
+    ):
+        mock_core.routes = routes
+        mock_message.guild.id = GUILD_ID
+        mock_message.channel.id = 2
+        mock_message.channel.send = AsyncMock()
+        mock_message.content = "\n".join(
+            f"target {i}: ({i}|-{i})" for i in range(1, 101)
+        )
+
+        await mock_core.on_message(mock_message)
+
+        mock_message.channel.send.assert_called_once()
+        embed = mock_message.channel.send.call_args[1]["embed"]
+        links = "\n".join(field.value for field in embed.fields).split("\n")
+        assert links[:2] == [
+            f"{MOCK_GAME_SERVER}/position_details.php?x=1&y=-1",
+            f"{MOCK_GAME_SERVER}/position_details.php?x=2&y=-2",
+        ]
+        assert all(len(field.value) <= 1024 for field in embed.fields)
+        assert len(embed) <= 6000
+
+    @pytest.mark.asyncio
+    async def test_forwards(self, routes, mock_message, mock_core):
+        mock_core.routes = routes
+        target = MagicMock()
+        target.get_channel.return_value.send = AsyncMock()
+        mock_core.get_guild = MagicMock(return_value=target)
+        mock_message.guild.id = GUILD_ID
+        mock_message.channel.id = 1
+        mock_message.channel.send = AsyncMock()
+        mock_message.content = "scouts report"
+
+        await mock_core.on_message(mock_message)
+
+        mock_core.get_guild.assert_called_once_with(42)
+        target.get_channel.assert_called_once_with(43)
+        target.get_channel.return_value.send.assert_called_once_with("scouts report")
+
+    @pytest.mark.asyncio
+    async def test_ordinary_messages_skip_every_handler(
+        self, routes, mock_message, mock_core
+    ):
+        mock_core.routes = routes
+        mock_message.guild.id = GUILD_ID
+        mock_message.channel.id = 2
+        mock_message.channel.send = AsyncMock()
+        mock_message.content = "good morning and/or evening"
+        routes.route(GUILD_ID, 2)
+
+        with (
+            patch("core.get_app") as get_app,
+            patch.object(routing_service, "read_config_str") as read_config_str,
+        ):
+            await mock_core.on_message(mock_message)
+
+        get_app.assert_not_called()
+        read_config_str.assert_not_called()
+        mock_message.channel.send.assert_not_called()
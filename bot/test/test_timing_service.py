@@ -0,0 +1,129 @@
+import time
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import discord
+import pytest
+from yarl import URL
+from bot.commands.scout import scout
+from services.connection_service import run_db
+from services.timing_service import (
+    command_failed,
+    discord_trace_config,
+    run_timed,
+    timed,
+)
+from test.conftest import build_mock_message
+
+
+class TestRunTimed:
+    @pytest.mark.asyncio
+    async def test_splits_database_and_discord_time(self):
+        recorder = MagicMock()
+
+        async def command():
+            await run_db(time.sleep, 0.02)
+            with timed("discord"):
+                time.sleep(0.01)
+            time.sleep(0.01)
+
+        await run_timed(recorder, command, "tracker get", app="tracker")
+
+        timings = recorder.call_args.kwargs
+        assert timings["app"] == "tracker"
+        assert timings["success"] and timings["error_message"] is None
+        assert 0.02 <= timings["db_time"] < timings["execution_time"]
+        assert 0.01 <= timings["discord_time"] < timings["execution_time"]
+        assert timings["execution_time"] >= 0.04
+
+    @pytest.mark.asyncio
+    async def test_nested_sections_count_once(self):
+        recorder = MagicMock()
+
+        async def command():
+            with timed("db"), timed("db"):
+                time.sleep(0.01)
+
+        await run_timed(recorder, command, "test")
+
+        timings = recorder.call_args.kwargs
+        assert timings["db_time"] <= timings["execution_time"]
+
+    @pytest.mark.asyncio
+    async def test_records_failures(self):
+        recorder = MagicMock()
+
+        async def raises():
+            raise ValueError("bad input")
+
+        async def replies_with_an_error():
+            command_failed(PermissionError("admin"))
+
+        with pytest.raises(ValueError):
+            await run_timed(recorder, raises, "test")
+        assert recorder.call_args.kwargs["error_message"] == "bad input"
+
+        await run_timed(recorder, replies_with_an_error, "test")
+        assert not recorder.call_args.kwargs["success"]
+        assert recorder.call_args.kwargs["error_message"] == "admin"
+
+    @pytest.mark.asyncio
+    async def test_outside_a_command_nothing_is_timed(self):
+        with timed("db"):
+            pass
+        command_failed(ValueError())
+
+    @pytest.mark.asyncio
+    async def test_discord_requests_are_timed(self):
+        trace_config = discord_trace_config()
+        recorder = MagicMock()
+
+        params = SimpleNamespace(
+            method="POST",
+            url=URL(
+                "https://discord.com/api/v10/channels/1312569623476174949/messages"
+            ),
+        )
+
+        async def command():
+            context = SimpleNamespace()
+            await trace_config.on_request_start[0](None, context, params)
+            time.sleep(0.01)
+            await trace_config.on_request_end[0](None, context, params)
+
+        await run_timed(recorder, command, "test")
+
+        assert recorder.call_args.kwargs["discord_time"] >= 0.01
+
+
+class TestMiddleware:
+    @pytest.mark.asyncio
+    async def test_message_commands(self, mock_core):
+        mock_core.analytics = MagicMock()
+        message = build_mock_message("!tracker get player")
+        app = AsyncMock()
+        app.run.side_effect = lambda: command_failed(KeyError("database"))
+
+        with patch("core.get_app", return_value=app):
+            await mock_core.on_message(message)
+
+        timings = mock_core.analytics.record_command.call_args.kwargs
+        assert timings["app"] == "tracker"
+        assert timings["full_command"] == "!tracker get player"
+        assert not timings["success"]
+        assert timings["execution_time"] is not None
+
+    @pytest.mark.asyncio
+    async def test_slash_commands(self):
+        interaction = MagicMock(spec=discord.Interaction)
+        interaction.response = AsyncMock()
+        interaction.guild.id = 42
+
+        await scout.callback(interaction, 1000, 800, 3600, 10, 0.25, 100, 50, 9)
+
+        interaction.response.send_message.assert_called_once()
+        timings = interaction.client.analytics.record_command.call_args.kwargs
+        assert timings["app"] == "scout"
+        assert timings["full_command"].startswith("/scout crop_1:1000 crop_2:800")
+        assert timings["discord_server_id"] == 42
+        assert timings["success"]
@@ -22,6 +22,21 @@ class TestValidators:
         assert not coordinates_are_valid("−‭44‬‬|‭84")
         assert coordinates_are_valid(preprocess_coordinates("−‭44‬‬|‭84"))
 
+    def test_find_coordinates(self):
+        assert find_coordinates("55|55") == [(55, 55)]
+        assert find_coordinates("hit (−‭44‬‬|‭84) then 12/-5, 3|4? and 12/-5") == [
+            (-44, 84),
+            (12, -5),
+            (3, 4),
+        ]
+        assert find_coordinates("(10|20)(30|40)") == [(10, 20), (30, 40)]
+        assert find_coordinates("24|7 and 1|1", ignore_24_7=True) == [(1, 1)]
+
+        assert find_coordinates("and/or ab|cd 55/ab") == []
+        assert find_coordinates("555/55 55/-555 201|0") == []
+        assert find_coordinates("55/55/55 1.5/2 3|4.5") == []
+        assert find_coordinates("https://example.com/12/34") == []
+
     def test_url_is_valid(self):
         assert url_is_valid("https://www.example.com")
         # Any Discord link will include https
@@ -22,6 +22,7 @@ class ConfigKeys:
     ENEMY_ALLIANCES = "enemy_alliances"
     NOTIF_CHANNEL = "notif_channel"
     RAID_CHANNEL = "raid_channel"
+    CONSOLIDATED_DB = "consolidated_db"
 
 
 class Apps:
@@ -49,7 +50,13 @@ MAP_MAX = 200
 MAP_MIN = -200
 
 BOT_SERVERS_DB_PATH = "../databases/bot_servers/"
+# Every guild's tables in one database, partitioned by guild_id. Used instead
+# of the per-guild files when `consolidated_db` is set in the default section.
+CONSOLIDATED_DB_PATH = "../databases/bot_servers/consolidated.db"
 GAME_SERVERS_DB_PATH = "../databases/game_servers/"
+# The latest migration in databases/migrations. Bot queries filter on guild_id,
+# so a bot database must be migrated at least this far before the bot starts.
+BOT_SCHEMA_VERSION = 2
 ANALYTICS_DB_PATH = "../databases/analytics/analytics.db"
 
 URL_PATTERN = (
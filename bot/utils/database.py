@@ -0,0 +1,33 @@
+import sqlite3
+
+# Guild databases are written by commands while other commands read them, and
+# game server databases are rewritten by the loader while the bot reads them.
+# WAL keeps readers unblocked in both cases. NORMAL sync is durable against
+# process crashes in WAL mode; only a power cut can lose the last commits.
+BOT_PRAGMAS = {
+    "journal_mode": "wal",
+    "synchronous": "normal",
+    "mmap_size": 64 * 1024 * 1024,
+    "cache_size": -8 * 1024,
+    "temp_store": "memory",
+}
+# The loader owns the journal mode of game server databases; the bot only reads them
+GAME_SERVER_PRAGMAS = {
+    "mmap_size": 256 * 1024 * 1024,
+    "cache_size": -16 * 1024,
+    "temp_store": "memory",
+    "query_only": "on",
+}
+# Prepared statements kept per connection. Commands reuse a few dozen queries,
+# so with pooled connections nearly every execute skips the parse.
+CACHED_STATEMENTS = 256
+
+
+def connect(db_path: str, read_only: bool = False) -> sqlite3.Connection:
+    """Open a guild database, or a game server database with read_only=True, with the shared profile"""
+    conn = sqlite3.connect(
+        db_path, cached_statements=CACHED_STATEMENTS, check_same_thread=False
+    )
+    for pragma, value in (GAME_SERVER_PRAGMAS if read_only else BOT_PRAGMAS).items():
+        conn.execute(f"pragma {pragma} = {value}")
+    return conn
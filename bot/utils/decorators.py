@@ -1,6 +1,16 @@
 from utils.validators import *
 
 
+def is_dev_privs(func):
+    def wrapper(instance, *args, **kwargs):
+        if is_dev(instance.message):
+            return func(instance, *args, **kwargs)
+        else:
+            raise PermissionError("Dev")
+
+    return wrapper
+
+
 def is_dev_or_admin_privs(func):
     def wrapper(instance, *args, **kwargs):
         if is_dev(instance.message) or user_has_role(
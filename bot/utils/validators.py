@@ -1,9 +1,10 @@
 import discord
 import re
 import sqlite3
-import traceback
+from typing import List, Tuple
 
-from utils.constants import dev_ids, pytest_id, MAP_MAX, MAP_MIN, FORWARDING_MAP
+from utils.constants import dev_ids, pytest_id, MAP_MAX, MAP_MIN
+from services.connection_service import connection
 from utils.logger import logger
 
 
@@ -32,12 +33,36 @@ def coordinates_are_valid(coordinates: str, ignore_24_7: bool = False) -> bool:
         if ignore_24_7 and x == 24 and y == 7:
             return False
         return True
-    except ValueError as e:
-        logger.error(f"Error: {e}")
-        logger.error(f"Traceback: {traceback.format_exc()}")
+    except ValueError:
+        # Ordinary words like "and/or" end up here
+        logger.debug(f"Not coordinates: {coordinates}")
         return False
 
 
+# Bidi controls and marks that Travian wraps around copied coordinates
+_BIDI = "[\u200e\u200f\u202a-\u202e]*"
+_NUMBER = f"([-\u2212]?){_BIDI}([0-9]+)"
+# x|y, x/y and (x|y) anywhere in a message, but not inside longer numbers,
+# decimals, paths or triples like 55/55/55
+COORDINATES_PATTERN = re.compile(
+    f"(?<![\\w.|/]){_BIDI}{_NUMBER}{_BIDI}[|/]{_BIDI}{_NUMBER}(?![\\w|/]|\\.[0-9])"
+)
+
+
+def find_coordinates(content: str, ignore_24_7: bool = False) -> List[Tuple[int, int]]:
+    """Every distinct pair of map coordinates in a message, in order, in one pass"""
+    found = {}
+    for x_sign, x, y_sign, y in COORDINATES_PATTERN.findall(content):
+        x = -int(x) if x_sign else int(x)
+        y = -int(y) if y_sign else int(y)
+        if not (MAP_MIN <= x <= MAP_MAX and MAP_MIN <= y <= MAP_MAX):
+            continue
+        if ignore_24_7 and x == 24 and y == 7:
+            continue
+        found[(x, y)] = None
+    return list(found)
+
+
 def url_is_valid(url: str):
     pattern = "http[s]?://(?:[a-zA-Z]|[0-9]|[$-_@.&+]|[!*\\(\\),]|(?:%[0-9a-fA-F][0-9a-fA-F]))+"
 
@@ -46,11 +71,11 @@ def url_is_valid(url: str):
     return url_is_valid
 
 
-def validate_unique_url(db_name, url, ign) -> bool:
+def validate_unique_url(db_name, guild_id, url, ign) -> bool:
     try:
-        with sqlite3.connect(db_name) as conn:
-            query = "SELECT LINK FROM HAMMERS WHERE IGN = ?;"
-            urls = [row[0] for row in conn.execute(query, (ign,))]
+        with connection(db_name) as conn:
+            query = "SELECT LINK FROM HAMMERS WHERE GUILD_ID = ? AND IGN = ?;"
+            urls = [row[0] for row in conn.execute(query, (guild_id, ign))]
             logger.info(f"Found URLs for {ign}: {urls}")
             return url not in urls
     except sqlite3.Error as e:
@@ -90,13 +115,6 @@ def is_dev(message) -> bool:
     return message.author.id in dev_ids or message.author.id == pytest_id
 
 
-def should_forward(message: discord.Message):
-    key = f"{message.guild.id}#{message.channel.id}"
-    if key in FORWARDING_MAP:
-        return FORWARDING_MAP[key]
-    return None
-
-
 def preprocess_coordinates(coordinates: str) -> str:
     pattern = r"[\u202A-\u202E]"
     clean_coords = re.sub(pattern, "", coordinates)
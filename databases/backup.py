@@ -0,0 +1,220 @@
+import glob
+import hashlib
+import json
+import os
+import sqlite3
+import time
+import traceback
+from contextlib import closing
+from datetime import datetime, timezone
+from typing import List, Optional
+
+from connection import connect
+from parallel import run_parallel
+
+BACKUP_DIR = "backups"
+MANIFEST = "manifest.json"
+# Pages copied per backup step. Between steps the source is unlocked, so the
+# loader and readers carry on; a write from another connection restarts the copy.
+BACKUP_PAGES = 1024
+BACKUP_SLEEP = 0.005
+# A server written faster than it is copied would restart forever. After this
+# many restarts the copy is taken in one step instead: in WAL mode that reads a
+# single snapshot, which never blocks the writer.
+MAX_RESTARTS = 3
+
+
+class _Restarted(Exception):
+    pass
+
+
+def sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as db_file:
+        for chunk in iter(lambda: db_file.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _result(db: str, error: str = None) -> dict:
+    return {
+        "db": db,
+        "backup": None,
+        "bytes": 0,
+        "sha256": None,
+        "seconds": 0.0,
+        "error": error,
+    }
+
+
+def _copy(source: sqlite3.Connection, target: sqlite3.Connection, pages: int) -> None:
+    remaining = None
+    restarts = 0
+
+    def progress(status, left, total):
+        nonlocal remaining, restarts
+        if remaining is not None and left > remaining:
+            restarts += 1
+            if restarts > MAX_RESTARTS:
+                raise _Restarted()
+        remaining = left
+
+    try:
+        source.backup(target, pages=pages, progress=progress, sleep=BACKUP_SLEEP)
+    except _Restarted:
+        source.backup(target)
+
+
+def backup_db(db: str, dest: str, pages: int = BACKUP_PAGES) -> dict:
+    """Copy a live database to `dest` with the online backup API, then verify and checksum it.
+
+    The copy is written next to `dest` and only moved into place once it
+    passes an integrity check. Failures are reported in the result, not raised.
+    """
+    result = _result(db)
+    start = time.perf_counter()
+    partial = dest + ".partial"
+    try:
+        if not os.path.exists(db):
+            raise FileNotFoundError(db)
+        os.makedirs(os.path.dirname(dest) or ".", exist_ok=True)
+        with (
+            closing(connect(db, read_only=True)) as source,
+            closing(sqlite3.connect(partial)) as target,
+        ):
+            _copy(source, target, pages)
+            (check,) = target.execute("pragma quick_check").fetchone()
+            if check != "ok":
+                raise sqlite3.DatabaseError(f"Backup of {db} failed its check: {check}")
+            # Backups are single files; the source's WAL mode would come with the copy
+            target.execute("pragma journal_mode = delete")
+        os.replace(partial, dest)
+
+        result["backup"] = dest
+        result["bytes"] = os.path.getsize(dest)
+        result["sha256"] = sha256(dest)
+    except Exception as e:
+        traceback.print_exc()
+        result["error"] = str(e) or e.__class__.__name__
+        if os.path.exists(partial):
+            os.remove(partial)
+
+    result["seconds"] = time.perf_counter() - start
+    return result
+
+
+def _backup_name(db: str) -> str:
+    path = os.path.abspath(db)
+    return os.path.join(os.path.basename(os.path.dirname(path)), os.path.basename(path))
+
+
+def backup(
+    dbs: List[str],
+    backup_dir: str = BACKUP_DIR,
+    workers: int = 1,
+    pages: int = BACKUP_PAGES,
+) -> str:
+    """Back up every database into a new timestamped directory with a manifest.
+
+    Each copy is named after its folder and file, e.g. game_servers/am3.db.
+    Returns the directory; failures are listed in the manifest.
+    """
+    created_at = datetime.now(timezone.utc)
+    directory = os.path.join(backup_dir, created_at.strftime("%Y%m%d-%H%M%S"))
+    jobs = [(db, os.path.join(directory, _backup_name(db)), pages) for db in dbs]
+    results = run_parallel(
+        backup_db, jobs, workers, lambda job, error: _result(job[0], error)
+    )
+
+    for result in results:
+        if result["backup"]:
+            result["backup"] = os.path.relpath(result["backup"], directory)
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, MANIFEST), "w") as manifest:
+        json.dump(
+            {"created_at": created_at.isoformat(), "databases": results},
+            manifest,
+            indent=2,
+        )
+    return directory
+
+
+def read_manifest(directory: str) -> dict:
+    with open(os.path.join(directory, MANIFEST), "r") as manifest:
+        return json.load(manifest)
+
+
+def latest_backup(backup_dir: str = BACKUP_DIR) -> Optional[str]:
+    """The most recent backup directory with a manifest, or None"""
+    manifests = sorted(glob.glob(os.path.join(backup_dir, "*", MANIFEST)))
+    return os.path.dirname(manifests[-1]) if manifests else None
+
+
+def _restore_result(db: str, error: str = None) -> dict:
+    return {"db": db, "bytes": 0, "seconds": 0.0, "error": error}
+
+
+def restore_db(backup_path: str, expected_sha256: str, db: str) -> dict:
+    """Verify a backup against its checksum and copy it over `db` in one step.
+
+    Other connections to `db` see the restored contents on their next
+    transaction. Failures are reported in the result, not raised.
+    """
+    result = _restore_result(db)
+    start = time.perf_counter()
+    try:
+        if sha256(backup_path) != expected_sha256:
+            raise ValueError(f"Checksum mismatch for {backup_path}")
+        os.makedirs(os.path.dirname(db) or ".", exist_ok=True)
+        with (
+            closing(sqlite3.connect(backup_path)) as source,
+            closing(connect(db)) as target,
+        ):
+            source.backup(target)
+        result["bytes"] = os.path.getsize(backup_path)
+    except Exception as e:
+        traceback.print_exc()
+        result["error"] = str(e) or e.__class__.__name__
+
+    result["seconds"] = time.perf_counter() - start
+    return result
+
+
+def restore(
+    directory: str, dbs: List[str] = None, target_dir: str = ".", workers: int = 1
+) -> List[dict]:
+    """Restore the databases of a backup, or only `dbs`, to their paths under target_dir"""
+    entries = [
+        entry for entry in read_manifest(directory)["databases"] if not entry["error"]
+    ]
+    if dbs:
+        wanted = {os.path.normpath(db) for db in dbs}
+        entries = [
+            entry for entry in entries if os.path.normpath(entry["db"]) in wanted
+        ]
+
+    jobs = [
+        (
+            os.path.join(directory, entry["backup"]),
+            entry["sha256"],
+            os.path.join(target_dir, entry["backup"]),
+        )
+        for entry in entries
+    ]
+    results = run_parallel(
+        restore_db, jobs, workers, lambda job, error: _restore_result(job[0], error)
+    )
+    for result, entry in zip(results, entries):
+        result["db"] = entry["db"]
+    return results
+
+
+def print_summary(results: List[dict]) -> None:
+    print(f"{'Database':<40} {'Status':<8} {'Size (MB)':>10} {'Time (s)':>9}")
+    for result in results:
+        status = "FAILED" if result["error"] else "OK"
+        print(
+            f"{result['db']:<40} {status:<8} {result['bytes'] / 1e6:>10.1f} {result['seconds']:>9.2f}"
+        )
+        if result["error"]:
+            print(f"    {result['error']}")
@@ -0,0 +1,83 @@
+"""Compare map.sql ingestion throughput: one execute() per line vs the batched ingest path.
+
+Run from the databases directory:
+    python benchmarks/bench_ingest.py --villages 60000
+"""
+
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from generate import World, WorldConfig, read_create_x_world_next  # noqa: E402
+from indexes import X_WORLD_INDEXES  # noqa: E402
+from ingest import load_x_world_next, swap_x_world  # noqa: E402
+
+
+def load_per_line(
+    cnx: sqlite3.Connection, text: str, create_x_world_next: str
+) -> tuple:
+    """The previous load.py behaviour, kept here as the baseline.
+
+    The batched path ends with an indexed x_world, so the same indexes are built here too.
+    Returns the rows loaded and the seconds spent building indexes.
+    """
+    cnx.executescript(create_x_world_next.replace("x_world_next", "x_world"))
+    records = 0
+    for record in text.splitlines():
+        cnx.execute(record)
+        records += 1
+    cnx.commit()
+    start = time.perf_counter()
+    cnx.executescript("\n".join(index.create_sql() for index in X_WORLD_INDEXES))
+    return records, time.perf_counter() - start
+
+
+def load_batched(cnx: sqlite3.Connection, text: str, create_x_world_next: str) -> tuple:
+    """ingest.load_x_world, timing the swap (which builds the indexes) on its own"""
+    records = load_x_world_next(cnx, text.splitlines(), create_x_world_next)
+    start = time.perf_counter()
+    swap_x_world(cnx)
+    return records, time.perf_counter() - start
+
+
+def run(label, loader, text, create_x_world_next, repeat):
+    timings = []
+    for _ in range(repeat):
+        with tempfile.TemporaryDirectory() as tmp:
+            cnx = sqlite3.connect(os.path.join(tmp, "bench.db"))
+            start = time.perf_counter()
+            records, indexing = loader(cnx, text, create_x_world_next)
+            timings.append((time.perf_counter() - start, indexing))
+            cnx.close()
+    elapsed, indexing = min(timings)
+
+    print(
+        f"{label:<20} {records:>8} rows {elapsed:>8.2f}s {records / elapsed:>12,.0f} rows/sec"
+        f" {indexing:>8.2f}s"
+    )
+    return records / elapsed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--villages", type=int, default=60000)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    create_x_world_next = read_create_x_world_next()
+
+    text = World(WorldConfig(villages=args.villages, seed=args.seed)).map_sql()
+    print(f"Synthetic map.sql: {args.villages} villages, {len(text) / 1e6:.1f} MB\n")
+
+    print(f"{'':<20} {'':>8} {'':>4} {'Total':>9} {'':>21} {'Indexes':>9}")
+    before = run(
+        "execute() per line", load_per_line, text, create_x_world_next, args.repeat
+    )
+    after = run("batched ingest", load_batched, text, create_x_world_next, args.repeat)
+    print(f"\nSpeedup: {after / before:.1f}x")
@@ -0,0 +1,109 @@
+"""Reader latency on a game server while load.py is writing it, with the default
+rollback journal vs the connection.py profile (WAL).
+
+Run from the databases directory:
+    python benchmarks/bench_readers.py --villages 60000 --loads 3
+"""
+
+import argparse
+import multiprocessing
+import os
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from connection import checkpoint, connect  # noqa: E402
+from generate import DAY, START, World, WorldConfig, read_create_x_world_next  # noqa: E402
+from history import record_snapshot  # noqa: E402
+from ingest import load_x_world  # noqa: E402
+
+QUERIES = [
+    "select * from x_world where lower(player_name) = 'player 42'",
+    "select snapshot_day, sum(population) from map_history where player_id = 42 group by 1",
+]
+
+
+def open_db(path: str, wal: bool, read_only: bool = False) -> sqlite3.Connection:
+    if wal:
+        return connect(path, read_only)
+    cnx = sqlite3.connect(path)
+    cnx.execute("pragma journal_mode = delete")
+    return cnx
+
+
+def load(
+    path: str, wal: bool, text: str, create_x_world_next: str, days: range
+) -> None:
+    cnx = open_db(path, wal)
+    for day in days:
+        load_x_world(cnx, text.splitlines(), create_x_world_next)
+        record_snapshot(cnx, snapshot_at=START + day * DAY)
+    if wal:
+        checkpoint(cnx)
+    cnx.close()
+
+
+def run(label, wal, text, create_x_world_next, loads):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        load(path, wal, text, create_x_world_next, range(7))
+        cnx = open_db(path, wal)
+        cnx.execute(
+            "create index map_history_player_day on map_history (player_id, snapshot_day)"
+        )
+        cnx.close()
+
+        writer = multiprocessing.Process(
+            target=load,
+            args=(path, wal, text, create_x_world_next, range(7, 7 + loads)),
+        )
+        reader = open_db(path, wal, read_only=True)
+        latencies = []
+        errors = 0
+        writer.start()
+        while writer.is_alive():
+            for query in QUERIES:
+                start = time.perf_counter()
+                try:
+                    reader.execute(query).fetchall()
+                except sqlite3.OperationalError:
+                    errors += 1
+                latencies.append(time.perf_counter() - start)
+        writer.join()
+        reader.close()
+
+    latencies.sort()
+    p99 = latencies[int(len(latencies) * 0.99)]
+    print(
+        f"{label:<18} {len(latencies):>7} reads  p50 {statistics.median(latencies) * 1000:>7.2f}ms  "
+        f"p99 {p99 * 1000:>8.2f}ms  max {latencies[-1] * 1000:>8.2f}ms  {errors} failed"
+    )
+    return latencies[-1], len(latencies)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--villages", type=int, default=60000)
+    parser.add_argument("--loads", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    create_x_world_next = read_create_x_world_next()
+
+    text = World(WorldConfig(villages=args.villages, seed=args.seed)).map_sql()
+    print(f"Reading while {args.loads} loads of {args.villages} villages run\n")
+
+    before_max, before_reads = run(
+        "rollback journal", False, text, create_x_world_next, args.loads
+    )
+    after_max, after_reads = run(
+        "WAL profile", True, text, create_x_world_next, args.loads
+    )
+    print(
+        f"\nWorst read {before_max / after_max:.1f}x faster, "
+        f"{after_reads / before_reads:.1f}x as many reads served during the load"
+    )
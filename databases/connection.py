@@ -0,0 +1,38 @@
+import sqlite3
+from typing import Tuple
+
+# WAL lets the site and bot keep reading a server while load.py writes it;
+# readers see the last committed load until the next commit. NORMAL is durable
+# against process crashes in WAL mode, and a load lost to a power cut is rerun.
+PRAGMAS = {
+    "journal_mode": "wal",
+    "synchronous": "normal",
+    "mmap_size": 256 * 1024 * 1024,
+    "cache_size": -64 * 1024,
+    "temp_store": "memory",
+}
+# Readers leave the journal mode to the writer and refuse to write by accident
+READ_ONLY_PRAGMAS = {
+    "mmap_size": 256 * 1024 * 1024,
+    "cache_size": -32 * 1024,
+    "temp_store": "memory",
+    "query_only": "on",
+}
+
+
+def connect(path: str, read_only: bool = False) -> sqlite3.Connection:
+    """Open a game server database with the shared storage profile"""
+    cnx = sqlite3.connect(path)
+    for pragma, value in (READ_ONLY_PRAGMAS if read_only else PRAGMAS).items():
+        cnx.execute(f"pragma {pragma} = {value}")
+    return cnx
+
+
+def checkpoint(cnx: sqlite3.Connection) -> Tuple[bool, int, int]:
+    """Copy the WAL back into the database and truncate it.
+
+    Returns whether a reader blocked it, the WAL pages and the pages checkpointed.
+    A blocked checkpoint is harmless and is retried after the next load.
+    """
+    busy, log, checkpointed = cnx.execute("pragma wal_checkpoint(truncate)").fetchone()
+    return bool(busy), log, checkpointed
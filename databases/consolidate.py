@@ -0,0 +1,153 @@
+import glob
+import os
+import sqlite3
+import time
+import traceback
+from contextlib import closing
+from typing import List
+
+from connection import connect
+from ingest import run_in_transaction
+from migrate import applied_versions, load_migrations
+
+BOT_SQL_DIR = "../bot/sql"
+CONSOLIDATED_DB = "bot_servers/consolidated.db"
+
+# Tables folded from each guild's file, parents before children. Ids that
+# aren't Discord ids are shifted past the consolidated table's largest id, and
+# the references to them shifted with them.
+TABLES = {
+    "HAMMERS": {"ID": "HAMMERS"},
+    "DEFENSE_CALLS": {"id": "DEFENSE_CALLS"},
+    "DEFENSE_THREADS": {"defense_call_id": "DEFENSE_CALLS"},
+    "SUBMITTED_DEFENSE": {
+        "id": "SUBMITTED_DEFENSE",
+        "defense_call_id": "DEFENSE_CALLS",
+    },
+    "RAID_TRACKING": {"id": "RAID_TRACKING"},
+}
+
+
+def create_consolidated(cnx: sqlite3.Connection) -> None:
+    """Create the bot tables with the same scripts the bot runs for a new guild"""
+    scripts = sorted(glob.glob(os.path.join(BOT_SQL_DIR, "create_table_*.sql")))
+    scripts += [
+        os.path.join(BOT_SQL_DIR, "create_guild_indexes.sql"),
+        os.path.join(BOT_SQL_DIR, "insert_schema_version.sql"),
+    ]
+    for script in scripts:
+        with open(script, "r") as sql_file:
+            cnx.executescript(sql_file.read())
+    cnx.commit()
+
+
+def _columns(cnx: sqlite3.Connection, table: str) -> List[str]:
+    return [row[1] for row in cnx.execute(f"pragma main.table_info({table})")]
+
+
+def _fold_script(cnx: sqlite3.Connection) -> str:
+    """Copy every table from the attached `guild` database, shifting ids by the :offset_<table> params"""
+    statements = []
+    for table, shifted in TABLES.items():
+        columns = _columns(cnx, table)
+        select = [
+            f"{column} + :offset_{shifted[column]}" if column in shifted else column
+            for column in columns
+        ]
+        statements.append(
+            f"insert into main.{table} ({', '.join(columns)})\n"
+            f"select {', '.join(select)} from guild.{table};"
+        )
+    return "\n".join(statements)
+
+
+def _offsets(cnx: sqlite3.Connection) -> dict:
+    return {
+        f"offset_{table}": cnx.execute(
+            f"select coalesce(max({column}), 0) from main.{table}"
+        ).fetchone()[0]
+        for table, shifted in TABLES.items()
+        for column, parent in shifted.items()
+        if parent == table
+    }
+
+
+def _guild_ids(cnx: sqlite3.Connection, schema: str) -> set:
+    guild_ids = set()
+    for table in TABLES:
+        guild_ids.update(
+            guild_id
+            for (guild_id,) in cnx.execute(
+                f"select distinct guild_id from {schema}.{table}"
+            )
+        )
+    return guild_ids
+
+
+def fold_db(cnx: sqlite3.Connection, db: str, latest: set) -> dict:
+    """Copy one guild database into the consolidated one in a single transaction.
+
+    The guild database must have every migration applied, so its rows carry
+    their guild_id. Guilds already in the consolidated database are skipped.
+    """
+    result = {"db": db, "rows": 0, "skipped": False, "seconds": 0.0, "error": None}
+    start = time.perf_counter()
+    try:
+        with closing(sqlite3.connect(db)) as guild:
+            missing = latest - applied_versions(guild)
+        if missing:
+            raise ValueError(
+                f"Missing migrations {sorted(missing)}; run `manage.py migrate` first"
+            )
+
+        cnx.execute("attach database ? as guild", (db,))
+        try:
+            guild_ids = _guild_ids(cnx, "guild")
+            if guild_ids & _guild_ids(cnx, "main"):
+                result["skipped"] = True
+            else:
+                before = cnx.total_changes
+                run_in_transaction(cnx, _fold_script(cnx), _offsets(cnx))
+                result["rows"] = cnx.total_changes - before
+        finally:
+            cnx.execute("detach database guild")
+    except Exception as e:
+        traceback.print_exc()
+        result["error"] = str(e) or e.__class__.__name__
+
+    result["seconds"] = time.perf_counter() - start
+    return result
+
+
+def consolidate(dbs: List[str], target: str = CONSOLIDATED_DB) -> List[dict]:
+    """Fold the per-guild databases into the consolidated one, creating it if needed"""
+    latest = {migration.version for migration in load_migrations()}
+    new_target = not os.path.exists(target)
+    cnx = connect(target)
+    if new_target:
+        create_consolidated(cnx)
+    elif latest - applied_versions(cnx):
+        cnx.close()
+        raise ValueError(
+            f"{target} has pending migrations; run `manage.py migrate` first"
+        )
+
+    results = [fold_db(cnx, db, latest) for db in dbs]
+    cnx.close()
+    return results
+
+
+def print_summary(results: List[dict]) -> None:
+    print(f"{'Database':<40} {'Status':<8} {'Rows':>8} {'Time (s)':>9}")
+    for result in results:
+        if result["error"]:
+            status = "FAILED"
+        elif result["skipped"]:
+            status = "SKIPPED"
+        else:
+            status = "OK"
+        print(
+            f"{result['db']:<40} {status:<8} {result['rows']:>8} {result['seconds']:>9.2f}"
+        )
+        if result["error"]:
+            print(f"    {result['error']}")
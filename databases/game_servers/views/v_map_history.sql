@@ -2,7 +2,7 @@ DROP VIEW IF EXISTS v_map_history;
 
 CREATE VIEW v_map_history as
 select 
-    strftime('%Y-%m-%d', datetime(inserted_at, 'unixepoch', 'localtime')) as date, 
+    date(snapshot_day * 86400, 'unixepoch') as date, 
     player_id, 
     player_name, 
     village_id, 
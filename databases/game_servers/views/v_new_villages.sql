@@ -1,16 +1,24 @@
 DROP VIEW IF EXISTS v_new_villages;
 
+-- Villages on coordinates that were empty in the previous snapshot. The
+-- previous snapshot's coordinates are materialized once and probed through an
+-- automatic index, instead of searching map_history once per village.
 CREATE VIEW v_new_villages AS
-WITH latest_time AS (
-    SELECT MAX(inserted_at) as max_time 
+WITH latest_day AS (
+    SELECT MAX(snapshot_day) AS day
     FROM map_history
 ),
-previous_time AS (
-    SELECT MAX(inserted_at) as prev_time 
-    FROM map_history 
-    WHERE inserted_at < (SELECT max_time FROM latest_time)
+previous_day AS (
+    SELECT MAX(snapshot_day) AS day
+    FROM map_history
+    WHERE snapshot_day < (SELECT day FROM latest_day)
+),
+previous_villages AS MATERIALIZED (
+    SELECT x_coordinate, y_coordinate
+    FROM map_history
+    WHERE snapshot_day = (SELECT day FROM previous_day)
 )
-SELECT 
+SELECT
     curr.inserted_at,
     curr.village_id,
     curr.village_name,
@@ -24,10 +32,11 @@ SELECT
     curr.tribe_id as tribe,
     curr.capital as is_capital
 FROM map_history curr
-LEFT JOIN map_history prev ON 
-    curr.x_coordinate = prev.x_coordinate 
-    AND curr.y_coordinate = prev.y_coordinate
-    AND prev.inserted_at = (SELECT prev_time FROM previous_time)
-WHERE curr.inserted_at = (SELECT max_time FROM latest_time)
-    AND prev.village_id IS NULL 
-    AND curr.village_id IS NOT NULL; 
\ No newline at end of file
+WHERE curr.snapshot_day = (SELECT day FROM latest_day)
+    AND curr.village_id IS NOT NULL
+    AND NOT EXISTS (
+        SELECT 1
+        FROM previous_villages prev
+        WHERE prev.x_coordinate = curr.x_coordinate
+            AND prev.y_coordinate = curr.y_coordinate
+    );
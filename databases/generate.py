@@ -0,0 +1,515 @@
+"""Seeded synthetic worlds, game server histories and bot databases for tests and benchmarks.
+
+Run from the databases directory, e.g.:
+    python generate.py map --villages 60000 > map.sql
+    python generate.py game-server game_servers/synthetic.db --days 90 --schema delta
+    python generate.py bot-server bot_servers/synthetic.db --guilds 100
+"""
+
+import argparse
+import random
+import sqlite3
+import sys
+from typing import Dict, Iterable, Iterator, List, NamedTuple
+
+from consolidate import create_consolidated
+from history import convert_to_delta, record_changes, record_snapshot
+from indexes import ANALYTICS_INDEXES, GAME_SERVER_INDEXES, ensure_indexes
+from ingest import load_x_world, load_x_world_next
+from materialize import refresh_materialized
+from normalized import normalize, record_normalized
+
+START = 1_700_000_000
+DAY = 24 * 60 * 60
+MAP_RADIUS = 200
+# Tribe ids as in map.sql, weighted roughly as on a live server. Natars (5)
+# are added as their own player.
+TRIBE_MIX = {1: 0.28, 2: 0.3, 3: 0.3, 6: 0.06, 7: 0.06}
+NATARS = 1
+# Quotes, spaces and non-ASCII letters, as in real player and alliance names
+NAME_PREFIXES = [
+    "Player ",
+    "player",
+    "O'Neil",
+    "Kikkes",
+    "Ærwyn",
+    "Über",
+    "the_",
+    "Dr. ",
+    "Lúcia",
+    "x",
+]
+
+# How load.py records a day into each history schema: the switch run after the
+# first snapshot, the loader and the recorder for every later day
+SCHEMAS = {
+    "snapshot": (None, load_x_world, record_snapshot),
+    "delta": (convert_to_delta, load_x_world, record_changes),
+    "normalized": (normalize, load_x_world_next, record_normalized),
+}
+
+
+class WorldConfig(NamedTuple):
+    """The shape of a generated world. Daily rates are shares of all villages or players."""
+
+    villages: int = 20_000
+    players: int = 0  # villages / 6 if 0
+    alliances: int = 0  # players / 20 if 0
+    tribe_mix: Dict[int, float] = TRIBE_MIX
+    max_population: int = 1200
+    growth: float = 0.04
+    settle_rate: float = 0.01
+    conquest_rate: float = 0.002
+    deletion_rate: float = 0.001
+    alliance_change_rate: float = 0.005
+    seed: int = 1
+
+
+class World:
+    """Villages, players and alliances of one game server, advanced a day at a time"""
+
+    def __init__(self, config: WorldConfig = WorldConfig()):
+        self.config = config
+        self.rng = random.Random(config.seed)
+        self.day = 0
+        self.villages: Dict[int, list] = {}
+        self.players: Dict[int, list] = {}
+        # Where each player's first village is, so the rest are founded around it
+        self.homes: Dict[int, tuple] = {}
+        self.occupied = set()
+        self.next_village_id = 1
+
+        players = config.players or max(1, config.villages // 6)
+        alliances = config.alliances or max(1, players // 20)
+        self.alliances = {
+            alliance_id: f"{self.rng.choice(NAME_PREFIXES)[:3]}{alliance_id}"
+            for alliance_id in range(1, alliances + 1)
+        }
+        tribes, weights = zip(*config.tribe_mix.items())
+        for player_id in range(NATARS + 1, players + NATARS + 1):
+            # A fifth of players are in no alliance
+            alliance_id = (
+                self.rng.randint(1, alliances) if self.rng.random() < 0.8 else 0
+            )
+            tribe = self.rng.choices(tribes, weights)[0]
+            self.players[player_id] = [self._name(player_id), alliance_id, tribe]
+        self.players[NATARS] = ["Natars", 0, 5]
+
+        # Most players have a few villages, the top ones dozens
+        owners = list(self.players)
+        weights = [self.rng.paretovariate(3) for _ in owners]
+        weights[-1] = len(owners) / 200  # Natars
+        for player_id in self.rng.choices(owners, weights, k=config.villages):
+            self._settle(player_id, self.rng.randint(2, config.max_population))
+
+    def _name(self, number: int) -> str:
+        return f"{self.rng.choice(NAME_PREFIXES)}{number}"
+
+    def _settle(self, player_id: int, population: int) -> None:
+        """Found a village for a player, near their others if they have any"""
+        home = self.homes.get(player_id)
+        for attempt in range(100):
+            if home and attempt < 50:
+                x = home[0] + self.rng.randint(-15, 15)
+                y = home[1] + self.rng.randint(-15, 15)
+            else:
+                x = self.rng.randint(-MAP_RADIUS, MAP_RADIUS)
+                y = self.rng.randint(-MAP_RADIUS, MAP_RADIUS)
+            if (
+                abs(x) <= MAP_RADIUS
+                and abs(y) <= MAP_RADIUS
+                and (x, y) not in self.occupied
+            ):
+                break
+        else:
+            return
+        village_id = self.next_village_id
+        self.next_village_id += 1
+        tribe = self.players[player_id][2]
+        name = f"Village {village_id}"
+        # x, y, tribe, name, player_id, population, capital
+        self.villages[village_id] = [
+            x,
+            y,
+            tribe,
+            name,
+            player_id,
+            population,
+            home is None,
+        ]
+        self.occupied.add((x, y))
+        self.homes.setdefault(player_id, (x, y))
+
+    def advance(self) -> None:
+        """One day: villages grow, new ones are founded, some are conquered and some players delete"""
+        config, rng = self.config, self.rng
+        self.day += 1
+        for village in self.villages.values():
+            # Logistic growth towards max_population, with some days idle
+            if rng.random() < 0.8:
+                headroom = 1 - village[5] / config.max_population
+                growth = max(1, round(config.growth * village[5] * headroom))
+                village[5] = min(config.max_population, village[5] + growth)
+
+        owners = [
+            village[4] for village in self.villages.values() if village[4] != NATARS
+        ]
+        for _ in range(round(len(self.villages) * config.settle_rate)):
+            self._settle(rng.choice(owners), rng.randint(2, 10))
+
+        village_ids = list(self.villages)
+        for _ in range(round(len(village_ids) * config.conquest_rate)):
+            village = self.villages[rng.choice(village_ids)]
+            if not village[6]:
+                village[4] = rng.choice(owners)
+                village[5] = max(2, village[5] * 2 // 3)
+
+        player_ids = [player_id for player_id in self.players if player_id != NATARS]
+        deleted = set(
+            rng.sample(player_ids, round(len(player_ids) * config.deletion_rate))
+        )
+        for player_id in deleted:
+            del self.players[player_id]
+            self.homes.pop(player_id, None)
+        for village_id, village in list(self.villages.items()):
+            if village[4] in deleted:
+                del self.villages[village_id]
+                self.occupied.discard((village[0], village[1]))
+        player_ids = [player_id for player_id in player_ids if player_id not in deleted]
+
+        for player_id in rng.sample(
+            player_ids, round(len(player_ids) * config.alliance_change_rate)
+        ):
+            self.players[player_id][1] = rng.choice([0] + list(self.alliances))
+
+    def map_sql_lines(self) -> Iterator[str]:
+        """Today's map.sql, one INSERT per village as the game servers publish it"""
+        for village_id, (
+            x,
+            y,
+            tribe,
+            village_name,
+            player_id,
+            population,
+            capital,
+        ) in self.villages.items():
+            player_name, alliance_id, _ = self.players[player_id]
+            alliance_tag = self.alliances.get(alliance_id, "")
+            field_id = (MAP_RADIUS - y) * (2 * MAP_RADIUS + 1) + x + MAP_RADIUS + 1
+            yield (
+                "INSERT INTO `x_world` VALUES "
+                f"({field_id},{x},{y},{tribe},{village_id},{_quote(village_name)},{player_id},"
+                f"{_quote(player_name)},{alliance_id},{_quote(alliance_tag)},{population},NULL,"
+                f"{'TRUE' if capital else 'FALSE'},NULL,NULL,NULL);\n"
+            )
+
+    def map_sql(self) -> str:
+        return "".join(self.map_sql_lines())
+
+
+def _quote(value: str) -> str:
+    return "'" + value.replace("'", "''") + "'"
+
+
+def read_create_x_world_next() -> str:
+    with open("sql/create_x_world_next.sql", "r") as sql_file:
+        return sql_file.read()
+
+
+def village_line(
+    village_id: int,
+    population: int = 100,
+    player_id: int = None,
+    alliance_id: int = 1,
+    alliance_tag: str = "SPQR",
+) -> str:
+    """One village as a map.sql line, for tests that pick each change between days by hand"""
+    player_id = player_id or village_id
+    return (
+        "INSERT INTO `x_world` VALUES "
+        f"({village_id},{village_id},{-village_id},1,{village_id},'Village {village_id}',"
+        f"{player_id},'Player {player_id}',{alliance_id},{_quote(alliance_tag)},{population},"
+        "NULL,FALSE,NULL,NULL,NULL);"
+    )
+
+
+def load_history(
+    cnx: sqlite3.Connection,
+    days: Iterable[Iterable[str]],
+    schema: str = "snapshot",
+    start: int = START,
+) -> None:
+    """Load each day's map.sql lines a day apart, the way load.py would, into a server
+    on the given history schema
+    """
+    create_x_world_next = read_create_x_world_next()
+    switch, load, record = SCHEMAS[schema]
+    for day, lines in enumerate(days):
+        if day == 0:
+            load_x_world(cnx, lines, create_x_world_next)
+            record_snapshot(cnx, snapshot_at=start)
+            if switch:
+                switch(cnx)
+        else:
+            load(cnx, lines, create_x_world_next)
+            record(cnx, snapshot_at=start + day * DAY)
+
+
+def game_server(
+    cnx: sqlite3.Connection,
+    config: WorldConfig = WorldConfig(),
+    days: int = 30,
+    schema: str = "snapshot",
+    start: int = START,
+) -> World:
+    """Load `days` daily snapshots of a generated world, the way load.py would, into a server
+    on the given history schema. Returns the world as of the last day.
+    """
+    world = World(config)
+
+    def daily_maps():
+        yield world.map_sql_lines()
+        for _ in range(1, days):
+            world.advance()
+            yield world.map_sql_lines()
+
+    load_history(cnx, daily_maps(), schema, start)
+    refresh_materialized(cnx)
+    ensure_indexes(cnx, GAME_SERVER_INDEXES)
+    return world
+
+
+class GuildConfig(NamedTuple):
+    """The bot data of one guild"""
+
+    hammers: int = 2000
+    players: int = (
+        200  # distinct players reported, unless fill_guild is given their names
+    )
+    defense_calls: int = 200
+    submissions: int = 5  # per defense call
+    raid_players: int = 10  # the first players, tracked on the raid leaderboard
+    raid_hours: int = 24 * 14
+
+
+def guild_ids(guilds: int, seed: int = 1) -> List[int]:
+    """Discord-like snowflake ids"""
+    rng = random.Random(seed)
+    return sorted(rng.randrange(10**17, 10**18) for _ in range(guilds))
+
+
+def fill_guild(
+    cnx: sqlite3.Connection,
+    guild_id: int,
+    config: GuildConfig = GuildConfig(),
+    seed: int = 1,
+    now: int = START,
+    players: List[str] = None,
+) -> None:
+    """Add a guild's hammers, defense calls, threads, submissions and raid history.
+
+    Reports are about `players`, e.g. a World's player names, or generated ones.
+    The same guild and seed give the same rows, whichever database they go into.
+    """
+    rng = random.Random(f"{seed}:{guild_id}")
+    if players is None:
+        players = [
+            f"{rng.choice(NAME_PREFIXES)}{player}" for player in range(config.players)
+        ]
+    cnx.executemany(
+        "insert into HAMMERS (GUILD_ID, IGN, LINK, COORDINATES, TIMESTAMP, NOTES) "
+        "values (?, ?, ?, ?, datetime(?, 'unixepoch'), ?)",
+        (
+            (
+                guild_id,
+                rng.choice(players),
+                f"https://ts2.x1.america.travian.com/report?id={rng.getrandbits(40)}",
+                f"{rng.randint(-MAP_RADIUS, MAP_RADIUS)}|{rng.randint(-MAP_RADIUS, MAP_RADIUS)}",
+                now - rng.randrange(90 * DAY),
+                "" if rng.random() < 0.9 else "catapults",
+            )
+            for _ in range(config.hammers)
+        ),
+    )
+    for event_id in range(config.defense_calls):
+        # Most calls have landed; a few are still open
+        land_time = (
+            now + rng.randint(60, DAY)
+            if rng.random() < 0.05
+            else now - rng.randrange(90 * DAY)
+        )
+        (cfd_id,) = cnx.execute(
+            "insert into DEFENSE_CALLS (guild_id, created_by_id, event_id, created_by_name, land_time, "
+            "x_coordinate, y_coordinate, amount_requested, amount_submitted, created_at, cancelled) "
+            "values (?, ?, ?, 'anvil', datetime(?, 'unixepoch'), ?, ?, ?, 0, datetime(?, 'unixepoch'), ?) "
+            "returning id",
+            (
+                guild_id,
+                rng.getrandbits(60),
+                event_id,
+                land_time,
+                rng.randint(-MAP_RADIUS, MAP_RADIUS),
+                rng.randint(-MAP_RADIUS, MAP_RADIUS),
+                rng.randrange(10_000, 500_000, 1000),
+                land_time - rng.randint(DAY // 4, 2 * DAY),
+                rng.random() < 0.05,
+            ),
+        ).fetchone()
+        cnx.execute(
+            "insert into DEFENSE_THREADS (id, guild_id, defense_call_id, name, jump_url) "
+            "values (?, ?, ?, ?, ?)",
+            (
+                rng.getrandbits(60),
+                guild_id,
+                cfd_id,
+                f"cfd-{cfd_id}",
+                f"https://discord.com/channels/{guild_id}/{cfd_id}",
+            ),
+        )
+        submissions = [
+            (
+                guild_id,
+                cfd_id,
+                rng.getrandbits(60),
+                "defender",
+                rng.randrange(1000, 50_000, 100),
+            )
+            for _ in range(rng.randint(0, 2 * config.submissions))
+        ]
+        cnx.executemany(
+            "insert into SUBMITTED_DEFENSE (guild_id, defense_call_id, submitted_by_id, "
+            "submitted_by_name, amount_submitted) values (?, ?, ?, ?, ?)",
+            submissions,
+        )
+        cnx.execute(
+            "update DEFENSE_CALLS set amount_submitted = ? where id = ?",
+            (sum(submission[4] for submission in submissions), cfd_id),
+        )
+
+    # The raid leaderboard is recorded at half past every hour
+    raiders = {name: rng.randint(0, 100_000) for name in players[: config.raid_players]}
+    last_update = now - now % 3600 - 1800
+    rows = []
+    for hour in range(config.raid_hours, 0, -1):
+        for rank, name in enumerate(
+            sorted(raiders, key=raiders.get, reverse=True), start=1
+        ):
+            raiders[name] += rng.randint(0, 20_000)
+            rows.append(
+                (guild_id, name, rank, raiders[name], last_update - hour * 3600)
+            )
+    cnx.executemany(
+        "insert into RAID_TRACKING (guild_id, player_name, rank, total_raided, channel_id, recorded_at) "
+        "values (?, ?, ?, ?, 'raids', datetime(?, 'unixepoch'))",
+        rows,
+    )
+
+
+def bot_server(
+    cnx: sqlite3.Connection,
+    guilds: List[int],
+    config: GuildConfig = GuildConfig(),
+    seed: int = 1,
+    now: int = START,
+    players: List[str] = None,
+) -> None:
+    """Create the bot tables and fill them with every guild, as in the consolidated database"""
+    create_consolidated(cnx)
+    for guild_id in guilds:
+        fill_guild(cnx, guild_id, config, seed, now, players)
+    cnx.commit()
+
+
+def analytics(
+    cnx: sqlite3.Connection,
+    commands: int,
+    guilds: List[int],
+    users: int = 5000,
+    days: int = 90,
+    seed: int = 1,
+) -> None:
+    """Create the analytics table and record `commands` commands spread over the last `days` days"""
+    rng = random.Random(seed)
+    with open("sql/create_table_analytics.sql", "r") as sql_file:
+        cnx.executescript(sql_file.read())
+    ensure_indexes(cnx, ANALYTICS_INDEXES)
+    apps = [
+        ("tracker", "tracker get"),
+        ("tracker", "tracker add"),
+        ("def", "def list"),
+        ("boink", "boink search"),
+    ]
+    cnx.executemany(
+        "insert into ANALYTICS (app, full_command, discord_user_id, discord_user_name, discord_server_id, "
+        "discord_server_name, travian_server_code, recorded_at, success, execution_time_ms) "
+        "values (?, ?, ?, 'user', ?, 'guild', 'am3', datetime('now', ?), ?, ?)",
+        (
+            (
+                *rng.choice(apps),
+                rng.randrange(users),
+                rng.choice(guilds),
+                f"-{rng.randrange(days * 24 * 60)} minutes",
+                rng.random() < 0.98,
+                int(rng.lognormvariate(3, 1)),
+            )
+            for _ in range(commands)
+        ),
+    )
+    cnx.commit()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate synthetic game and bot data")
+    parser.add_argument("--seed", type=int, default=1)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    map_parser = commands.add_parser("map", help="Write a map.sql dump to stdout")
+    map_parser.add_argument("--villages", type=int, default=WorldConfig.villages)
+    map_parser.add_argument(
+        "--days", type=int, default=1, help="Days the world is advanced first"
+    )
+
+    game_parser = commands.add_parser(
+        "game-server", help="Build a game server database with history"
+    )
+    game_parser.add_argument("path")
+    game_parser.add_argument("--villages", type=int, default=WorldConfig.villages)
+    game_parser.add_argument("--days", type=int, default=30)
+    game_parser.add_argument("--schema", choices=SCHEMAS, default="snapshot")
+
+    bot_parser = commands.add_parser(
+        "bot-server", help="Build a bot database with every guild in it"
+    )
+    bot_parser.add_argument("path")
+    bot_parser.add_argument("--guilds", type=int, default=100)
+    bot_parser.add_argument(
+        "--hammers", type=int, default=GuildConfig.hammers, help="Per guild"
+    )
+    bot_parser.add_argument(
+        "--defense-calls", type=int, default=GuildConfig.defense_calls, help="Per guild"
+    )
+    args = parser.parse_args()
+
+    if args.command == "map":
+        world = World(WorldConfig(villages=args.villages, seed=args.seed))
+        for _ in range(1, args.days):
+            world.advance()
+        sys.stdout.writelines(world.map_sql_lines())
+    elif args.command == "game-server":
+        cnx = sqlite3.connect(args.path)
+        world = game_server(
+            cnx,
+            WorldConfig(villages=args.villages, seed=args.seed),
+            args.days,
+            args.schema,
+        )
+        cnx.close()
+        print(
+            f"{args.path}: {args.days} days of {len(world.villages)} villages ({args.schema})"
+        )
+    else:
+        cnx = sqlite3.connect(args.path)
+        config = GuildConfig(hammers=args.hammers, defense_calls=args.defense_calls)
+        bot_server(cnx, guild_ids(args.guilds, args.seed), config, args.seed)
+        cnx.close()
+        print(f"{args.path}: {args.guilds} guilds")
@@ -0,0 +1,106 @@
+import datetime
+import sqlite3
+import time
+from typing import Tuple
+
+from ingest import run_in_transaction
+
+EPOCH = datetime.date(1970, 1, 1)
+
+
+def _read_sql(name: str) -> str:
+    with open(f"sql/{name}.sql", "r") as sql_file:
+        return sql_file.read()
+
+
+def _has_table(cnx: sqlite3.Connection, name: str) -> bool:
+    return (
+        cnx.execute(
+            "select 1 from sqlite_master where type = 'table' and name = ?", (name,)
+        ).fetchone()
+        is not None
+    )
+
+
+def snapshot_day(snapshot_at: int) -> int:
+    """The local calendar day of a load as days since the epoch, the key of map_history"""
+    return (datetime.date.fromtimestamp(snapshot_at) - EPOCH).days
+
+
+def uses_delta_history(cnx: sqlite3.Connection) -> bool:
+    """Whether this server records village changes rather than full daily snapshots"""
+    return _has_table(cnx, "map_changes")
+
+
+def uses_normalized_schema(cnx: sqlite3.Connection) -> bool:
+    """Whether this server stores history in the STRICT dimension/fact tables"""
+    return _has_table(cnx, "village_days")
+
+
+def needs_dedupe(cnx: sqlite3.Connection) -> bool:
+    """Whether map_history still has the old one-row-per-load x|y@timestamp key"""
+    if not _has_table(cnx, "map_history"):
+        return False
+    columns = [row[1] for row in cnx.execute("pragma table_info(map_history)")]
+    return "snapshot_day" not in columns
+
+
+def dedupe_map_history(cnx: sqlite3.Connection) -> Tuple[int, int]:
+    """Rebuild an old map_history keyed by (village_id, snapshot_day). Returns rows before and after."""
+    before = cnx.execute("select count(*) from map_history").fetchone()[0]
+    run_in_transaction(
+        cnx,
+        "alter table map_history rename to map_history_old;\n"
+        + _read_sql("create_map_history")
+        + _read_sql("dedupe_map_history"),
+    )
+    after = cnx.execute("select count(*) from map_history").fetchone()[0]
+    return before, after
+
+
+def _snapshot_params(snapshot_at: int = None) -> dict:
+    if snapshot_at is None:
+        snapshot_at = int(time.time())
+    return {"snapshot_at": snapshot_at, "snapshot_day": snapshot_day(snapshot_at)}
+
+
+def record_snapshot(cnx: sqlite3.Connection, snapshot_at: int = None) -> int:
+    """Copy x_world into map_history, replacing any earlier load of the same day"""
+    if needs_dedupe(cnx):
+        dedupe_map_history(cnx)
+
+    before = cnx.total_changes
+    run_in_transaction(
+        cnx,
+        _read_sql("create_map_history") + _read_sql("insert_map_history"),
+        _snapshot_params(snapshot_at),
+    )
+    return cnx.total_changes - before
+
+
+def record_changes(cnx: sqlite3.Connection, snapshot_at: int = None) -> int:
+    """Diff x_world against the current village versions. Returns the number of rows written."""
+    before = cnx.total_changes
+    run_in_transaction(
+        cnx, _read_sql("insert_map_changes"), _snapshot_params(snapshot_at)
+    )
+    return cnx.total_changes - before
+
+
+def convert_to_delta(cnx: sqlite3.Connection) -> None:
+    """Switch a server to delta history, folding any existing map_history table into it"""
+    if uses_normalized_schema(cnx):
+        raise ValueError("normalized servers can't be switched to delta history")
+    if needs_dedupe(cnx):
+        dedupe_map_history(cnx)
+
+    if _has_table(cnx, "map_history"):
+        script = (
+            "alter table map_history rename to map_history_full;\n"
+            + _read_sql("create_map_changes")
+            + _read_sql("convert_map_history")
+        )
+    else:
+        script = _read_sql("create_map_changes")
+
+    run_in_transaction(cnx, script)
@@ -0,0 +1,190 @@
+import sqlite3
+from typing import Dict, List, NamedTuple, Tuple
+
+
+class Index(NamedTuple):
+    name: str
+    table: str
+    columns: str
+
+    def create_sql(self, table: str = None) -> str:
+        return f"create index if not exists {self.name} on {table or self.table} ({self.columns});"
+
+
+# x_world indexes are built on x_world_next before every swap (see
+# ingest.swap_x_world), so the reloaded table is never served unindexed
+X_WORLD_INDEXES = [
+    Index("x_world_player_id", "x_world", "player_id"),
+    Index("x_world_alliance_id", "x_world", "alliance_id"),
+    Index("x_world_alliance_tag", "x_world", "alliance_tag"),
+    Index("x_world_lower_player_name", "x_world", "lower(player_name)"),
+    Index("x_world_coordinates", "x_world", "x_coordinate, y_coordinate"),
+]
+
+# Normalized servers (see normalized.py), where x_world and map_history are
+# views. village_days is keyed by (snapshot_day, village_id), so needs no day index.
+NORMALIZED_INDEXES = [
+    Index(
+        "village_days_player_day",
+        "village_days",
+        "player_key, snapshot_day, population",
+    ),
+    Index(
+        "village_days_alliance_day",
+        "village_days",
+        "alliance_key, snapshot_day, population",
+    ),
+    Index("players_player_id", "players", "player_id"),
+    Index("players_lower_player_name", "players", "lower(player_name)"),
+    Index("alliances_alliance_id", "alliances", "alliance_id"),
+    Index("alliances_alliance_tag", "alliances", "alliance_tag"),
+]
+
+# Loads are bucketed by local day, and SQLite rejects an index on
+# strftime(..., 'localtime') as non-deterministic once rows are inserted, so
+# the day bucket is the snapshot_day column (see history.snapshot_day)
+GAME_SERVER_INDEXES = (
+    X_WORLD_INDEXES
+    + [
+        Index(
+            "map_history_player_day",
+            "map_history",
+            "player_id, snapshot_day, population",
+        ),
+        Index(
+            "map_history_alliance_day",
+            "map_history",
+            "alliance_id, snapshot_day, population",
+        ),
+        Index("map_history_snapshot_day", "map_history", "snapshot_day"),
+        Index("seven_day_pop_player_id", "seven_day_pop", "player_id"),
+    ]
+    + NORMALIZED_INDEXES
+)
+
+# Bot tables hold one guild per file, or every guild in the consolidated
+# database, so each index leads with guild_id. New databases get them from
+# bot/sql/create_guild_indexes.sql.
+BOT_SERVER_INDEXES = [
+    Index("hammers_guild_lower_ign", "hammers", "guild_id, lower(ign), timestamp"),
+    Index("hammers_guild_ign_coordinates", "hammers", "guild_id, ign, coordinates"),
+    Index("defense_calls_guild_land_time", "defense_calls", "guild_id, land_time"),
+    Index("defense_calls_guild_event_id", "defense_calls", "guild_id, event_id"),
+    Index(
+        "defense_threads_guild_defense_call_id",
+        "defense_threads",
+        "guild_id, defense_call_id",
+    ),
+    Index(
+        "submitted_defense_guild_defense_call_id",
+        "submitted_defense",
+        "guild_id, defense_call_id",
+    ),
+    Index(
+        "submitted_defense_guild_submitter",
+        "submitted_defense",
+        "guild_id, submitted_by_id, amount_submitted",
+    ),
+    Index(
+        "raid_tracking_guild_player",
+        "raid_tracking",
+        "guild_id, player_name, is_personal, recorded_at",
+    ),
+]
+
+# The bot's command analytics, read back by `!boink stats`
+ANALYTICS_INDEXES = [
+    Index("analytics_recorded_at", "analytics", "recorded_at"),
+    Index(
+        "analytics_server_recorded_at", "analytics", "discord_server_id, recorded_at"
+    ),
+    Index("analytics_user_recorded_at", "analytics", "discord_user_id, recorded_at"),
+]
+
+# Representative queries from the bot and site, used to report plan changes
+GAME_SERVER_QUERIES = {
+    "boink search": "select * from x_world where lower(player_name) = 'kikkes'",
+    "player villages": "select * from x_world where player_id = 1",
+    "alliance villages": "select * from x_world where alliance_id = 1",
+    "world map alliances": "select * from x_world where alliance_tag in ('SPQR')",
+    "player history": (
+        "select date(snapshot_day * 86400, 'unixepoch') as date, player_id, sum(population) "
+        "from map_history where player_id = 1 group by 1, 2 order by 1"
+    ),
+    "alliance history": (
+        "select date(snapshot_day * 86400, 'unixepoch') as date, alliance_id, sum(population) "
+        "from map_history where alliance_id = 1 group by 1, 2 order by 1"
+    ),
+    "last update": "select max(snapshot_day) from map_history",
+    "player village growth": "select * from v_seven_day_pop where player_id = 1",
+}
+
+BOT_SERVER_QUERIES = {
+    "hammer lookup": (
+        "select * from hammers where guild_id = 1 and lower(ign) = 'kikkes' "
+        "order by timestamp limit 5"
+    ),
+    "open defense calls": (
+        "select dc.id, dt.jump_url from defense_calls dc "
+        "join defense_threads dt on dt.guild_id = dc.guild_id and dc.id = dt.defense_call_id "
+        "where dc.guild_id = 1 and current_timestamp < land_time and not cancelled"
+    ),
+    "defense leaderboard": (
+        "select submitted_by_id, sum(amount_submitted) from submitted_defense "
+        "where guild_id = 1 group by 1 order by 2 desc limit 10"
+    ),
+    "raid history": (
+        "select total_raided, recorded_at from raid_tracking "
+        "where guild_id = 1 and player_name = 'Kikkes' and is_personal = FALSE "
+        "and recorded_at >= '2024-01-01' order by recorded_at desc limit 2"
+    ),
+}
+
+
+def _tables(cnx: sqlite3.Connection) -> set:
+    return {
+        name.lower()
+        for (name,) in cnx.execute(
+            "select name from sqlite_master where type = 'table'"
+        )
+    }
+
+
+def query_plan(cnx: sqlite3.Connection, query: str, params: tuple = ()) -> str:
+    """The EXPLAIN QUERY PLAN of a query, one step per line; empty if it can't be planned"""
+    try:
+        rows = cnx.execute(f"explain query plan {query}", params).fetchall()
+    except sqlite3.OperationalError:
+        return ""
+    return "\n".join(row[-1] for row in rows)
+
+
+def ensure_indexes(
+    cnx: sqlite3.Connection, indexes: List[Index], queries: Dict[str, str] = None
+) -> Tuple[List[str], Dict[str, Tuple[str, str]]]:
+    """Create any missing indexes on tables that exist.
+
+    Returns the names of indexes created and, for each query given, its plan before and after.
+    """
+    queries = queries or {}
+    before = {label: query_plan(cnx, query) for label, query in queries.items()}
+
+    tables = _tables(cnx)
+    existing = {
+        name
+        for (name,) in cnx.execute(
+            "select name from sqlite_master where type = 'index'"
+        )
+    }
+    created = []
+    for index in indexes:
+        if index.table.lower() in tables and index.name not in existing:
+            cnx.execute(index.create_sql())
+            created.append(index.name)
+    cnx.commit()
+
+    plans = {
+        label: (before[label], query_plan(cnx, query))
+        for label, query in queries.items()
+    }
+    return created, plans
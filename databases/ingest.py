@@ -0,0 +1,326 @@
+import codecs
+import itertools
+import re
+import sqlite3
+from typing import Iterable, Iterator, List, Tuple
+
+import requests
+
+from indexes import X_WORLD_INDEXES
+
+X_WORLD_COLUMNS = [
+    "id",
+    "x_coordinate",
+    "y_coordinate",
+    "tribe_id",
+    "village_id",
+    "village_name",
+    "player_id",
+    "player_name",
+    "alliance_id",
+    "alliance_tag",
+    "population",
+    "region",
+    "capital",
+    "city",
+    "harbor",
+    "victory_points",
+]
+
+BATCH_SIZE = 5000
+CHUNK_SIZE = 64 * 1024
+# Rows per INSERT statement. Bound rows stay under SQLite's historical limit of
+# 999 host parameters (16 columns * 50 rows), and literal statements stay small
+# enough that the connection's statement cache doesn't pin megabytes of SQL.
+ROWS_PER_STATEMENT = 50
+
+_INT = r"-?\d+"
+_SQLITE_STRING = r"'[^'\\]*(?:''[^'\\]*)*'"
+_LITERAL = rf"(?:{_INT}|NULL|TRUE|FALSE|{_SQLITE_STRING})"
+
+# Fast path: the exact shape of a map.sql line, one village per statement, with
+# every value already a valid SQLite literal. The captured tuple can be handed to
+# SQLite as-is, which parses literals far faster than Python can.
+_LINE_PATTERN = re.compile(
+    r"INSERT INTO `?x_world`? VALUES (\("
+    + ",".join([_INT] * 5 + [_SQLITE_STRING, _INT, _SQLITE_STRING, _INT])
+    + ","
+    + ",".join([_SQLITE_STRING, _INT] + [_LITERAL] * 5)
+    + r"\));?$",
+    re.IGNORECASE,
+)
+# Slow path: one value inside a VALUES tuple, followed by the separator that ends it
+_VALUE_PATTERN = re.compile(
+    r"""\s*(?:
+        '(?P<string>[^'\\]*(?:(?:\\.|'')[^'\\]*)*)'
+        |(?P<number>-?\d+(?:\.\d+)?)
+        |(?P<keyword>NULL|TRUE|FALSE)
+    )\s*(?P<separator>[,)])""",
+    re.VERBOSE | re.IGNORECASE,
+)
+_VALUES_PATTERN = re.compile(r"\bVALUES\s*", re.IGNORECASE)
+_ESCAPE_PATTERN = re.compile(r"\\(.)|''")
+_ESCAPES = {"n": "\n", "r": "\r", "t": "\t", "0": "\0"}
+_KEYWORDS = {"NULL": None, "TRUE": 1, "FALSE": 0}
+
+
+def _unescape(value: str) -> str:
+    if "\\" not in value and "''" not in value:
+        return value
+
+    def replace(match):
+        if match.group(1) is None:
+            return "'"
+        return _ESCAPES.get(match.group(1), match.group(1))
+
+    return _ESCAPE_PATTERN.sub(replace, value)
+
+
+def parse_insert(line: str) -> List[Tuple]:
+    """Parse an `INSERT INTO x_world VALUES (...)[, (...)];` statement into typed tuples"""
+    values_match = _VALUES_PATTERN.search(line)
+    if values_match is None:
+        raise ValueError(f"Not an INSERT ... VALUES statement: {line[:80]}")
+
+    rows = []
+    pos = values_match.end()
+    length = len(line)
+    while True:
+        while pos < length and line[pos] in " \t,":
+            pos += 1
+        if pos >= length or line[pos] != "(":
+            break
+        pos += 1
+
+        row = []
+        while True:
+            match = _VALUE_PATTERN.match(line, pos)
+            if match is None:
+                raise ValueError(f"Malformed value at column {pos}: {line[:80]}")
+            pos = match.end()
+
+            if match.group("string") is not None:
+                row.append(_unescape(match.group("string")))
+            elif match.group("number") is not None:
+                number = match.group("number")
+                row.append(float(number) if "." in number else int(number))
+            else:
+                row.append(_KEYWORDS[match.group("keyword").upper()])
+
+            if match.group("separator") == ")":
+                break
+
+        if len(row) != len(X_WORLD_COLUMNS):
+            raise ValueError(
+                f"Expected {len(X_WORLD_COLUMNS)} values, got {len(row)}: {line[:80]}"
+            )
+        rows.append(tuple(row))
+
+    if not rows:
+        raise ValueError(f"No value tuples found: {line[:80]}")
+    return rows
+
+
+def iter_rows(lines: Iterable[str]) -> Iterator[Tuple]:
+    """Yield typed x_world tuples from the lines of a map.sql dump, skipping blank lines"""
+    for line_number, line in enumerate(lines, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield from parse_insert(line)
+        except ValueError as e:
+            raise ValueError(f"map.sql line {line_number}: {e}") from None
+
+
+def _insert_query(table: str, rows: int) -> str:
+    placeholders = "(" + ", ".join("?" * len(X_WORLD_COLUMNS)) + ")"
+    return (
+        f"insert into {table} ({', '.join(X_WORLD_COLUMNS)}) "
+        f"values {', '.join([placeholders] * rows)}"
+    )
+
+
+def _flush_literals(cnx: sqlite3.Connection, table: str, literals: List[str]) -> None:
+    cnx.execute(
+        f"insert into {table} ({', '.join(X_WORLD_COLUMNS)}) values {','.join(literals)}"
+    )
+
+
+def _flush_rows(cnx: sqlite3.Connection, table: str, rows: List[Tuple]) -> None:
+    full = len(rows) - len(rows) % ROWS_PER_STATEMENT
+    chain = itertools.chain.from_iterable
+    cnx.executemany(
+        _insert_query(table, ROWS_PER_STATEMENT),
+        (
+            tuple(chain(rows[start : start + ROWS_PER_STATEMENT]))
+            for start in range(0, full, ROWS_PER_STATEMENT)
+        ),
+    )
+    if full < len(rows):
+        cnx.executemany(_insert_query(table, 1), rows[full:])
+
+
+def insert_lines(
+    cnx: sqlite3.Connection,
+    lines: Iterable[str],
+    table: str = "x_world",
+    batch_size: int = BATCH_SIZE,
+) -> int:
+    """Insert the lines of a map.sql dump in batches. The caller owns the transaction.
+
+    Lines that are already plain SQLite literals are validated and batched into
+    multi-row statements. Anything else (MySQL backslash escapes, several villages
+    per statement) goes through the tokenizer and is bound with executemany.
+    """
+    records = 0
+    literals = []
+    rows = []
+    for line_number, line in enumerate(lines, start=1):
+        line = line.strip()
+        if not line:
+            continue
+
+        match = _LINE_PATTERN.match(line)
+        if match is not None:
+            literals.append(match.group(1))
+            if len(literals) >= ROWS_PER_STATEMENT:
+                _flush_literals(cnx, table, literals)
+                records += len(literals)
+                literals.clear()
+            continue
+
+        try:
+            rows.extend(parse_insert(line))
+        except ValueError as e:
+            raise ValueError(f"map.sql line {line_number}: {e}") from None
+        if len(rows) >= batch_size:
+            _flush_rows(cnx, table, rows)
+            records += len(rows)
+            rows.clear()
+
+    if literals:
+        _flush_literals(cnx, table, literals)
+        records += len(literals)
+    if rows:
+        _flush_rows(cnx, table, rows)
+        records += len(rows)
+
+    return records
+
+
+def stream_lines(response: requests.Response) -> Iterator[str]:
+    """Yield decoded lines from a streamed response without buffering the whole body.
+
+    requests undoes any gzip/deflate content encoding while the body is read, so
+    only one chunk plus the current line is ever held in memory.
+    """
+    # requests falls back to ISO-8859-1 for text/* without a charset; the dumps are UTF-8
+    charset = "charset" in response.headers.get("content-type", "")
+    encoding = response.encoding if charset and response.encoding else "utf-8"
+    decoder = codecs.getincrementaldecoder(encoding)(errors="replace")
+    pending = ""
+    for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+        pending += decoder.decode(chunk)
+        lines = pending.split("\n")
+        pending = lines.pop()
+        yield from lines
+
+    pending += decoder.decode(b"", final=True)
+    if pending:
+        yield pending
+
+
+def fetch_map_sql(server_link: str, timeout: float = 60) -> requests.Response:
+    """Open a streaming download of a server's map.sql"""
+    response = requests.get(server_link + "/map.sql", stream=True, timeout=timeout)
+    response.raise_for_status()
+    return response
+
+
+def split_statements(script: str) -> List[str]:
+    """Split a .sql file into statements, dropping full-line comments"""
+    statements = []
+    pending = ""
+    for line in script.splitlines(keepends=True):
+        if line.lstrip().startswith("--"):
+            continue
+        pending += line
+        if sqlite3.complete_statement(pending):
+            statements.append(pending.strip())
+            pending = ""
+    if pending.strip():
+        statements.append(pending.strip())
+    return statements
+
+
+def run_in_transaction(
+    cnx: sqlite3.Connection, script: str, params: dict = None
+) -> None:
+    """Run every statement of a .sql file in one write transaction, binding named params"""
+    # Tables are swapped by dropping/renaming underneath views that reference
+    # them by name. The modern rename checks every view against the schema
+    # mid-transaction, when the table is briefly missing, and refuses; it would
+    # also rewrite views to follow a renamed table. Legacy mode does neither.
+    cnx.execute("pragma legacy_alter_table = on")
+    try:
+        cnx.execute("begin immediate")
+        for statement in split_statements(script):
+            cnx.execute(statement, params or {})
+        cnx.execute("commit")
+    except Exception:
+        if cnx.in_transaction:
+            cnx.execute("rollback")
+        raise
+    finally:
+        cnx.execute("pragma legacy_alter_table = off")
+
+
+def swap_x_world(cnx: sqlite3.Connection) -> None:
+    """Replace x_world with the loaded x_world_next in a single transaction.
+
+    Readers see the old x_world until the commit. The old table and its indexes
+    are dropped first, so the new indexes can be built under the same names.
+    """
+    run_in_transaction(
+        cnx,
+        "drop table if exists x_world;\n"
+        + "\n".join(index.create_sql(table="x_world_next") for index in X_WORLD_INDEXES)
+        + "\nalter table x_world_next rename to x_world;",
+    )
+
+
+def load_x_world_next(
+    cnx: sqlite3.Connection,
+    lines: Iterable[str],
+    create_x_world_next: str,
+    batch_size: int = BATCH_SIZE,
+) -> int:
+    """Load a map.sql dump into a fresh x_world_next in a single transaction"""
+    cnx.executescript(create_x_world_next)
+
+    try:
+        cnx.execute("begin")
+        records = insert_lines(cnx, lines, table="x_world_next", batch_size=batch_size)
+        cnx.execute("commit")
+    except Exception:
+        cnx.execute("rollback")
+        cnx.execute("drop table if exists x_world_next")
+        raise
+
+    return records
+
+
+def load_x_world(
+    cnx: sqlite3.Connection,
+    lines: Iterable[str],
+    create_x_world_next: str,
+    batch_size: int = BATCH_SIZE,
+) -> int:
+    """Load a map.sql dump into x_world_next, then swap it in for x_world.
+
+    x_world stays fully readable for the whole load; a failed load leaves it untouched.
+    """
+    records = load_x_world_next(cnx, lines, create_x_world_next, batch_size)
+    swap_x_world(cnx)
+    return records
@@ -1,38 +1,148 @@
 #!/projects/hammer_tracker/dash_site/env/bin/python3
-import requests
-import sqlite3
+import argparse
+import sys
+import time
+import traceback
+from contextlib import closing
 
+from connection import checkpoint, connect
+from history import (
+    record_changes,
+    record_snapshot,
+    uses_delta_history,
+    uses_normalized_schema,
+)
+from indexes import GAME_SERVER_INDEXES, ensure_indexes
+from ingest import fetch_map_sql, load_x_world, load_x_world_next, stream_lines
+from maintenance import maintain
+from materialize import refresh_materialized
+from normalized import record_normalized
+from parallel import run_parallel
 from servers import SERVER_LINKS
 
 
-with open("sql/replace_x_world.sql", "r") as sql_file:
-    replace_x_world = sql_file.read()
+def _result(server_nick: str, error: str = None) -> dict:
+    return {
+        "server": server_nick,
+        "records": 0,
+        "download_and_load": 0.0,
+        "history": 0.0,
+        "error": error,
+    }
 
-with open("sql/insert_map_history.sql", "r") as sql_file:
-    insert_map_history = sql_file.read()
 
-for server in SERVER_LINKS:
-    server_link = server[0]
-    server_nick = server[1]
+def load_server(
+    server_link: str, server_nick: str, db_dir: str = "game_servers"
+) -> dict:
+    """Download, parse and load one server. Failures are reported in the result, not raised."""
+    result = _result(server_nick)
+
+    with open("sql/create_x_world_next.sql", "r") as sql_file:
+        create_x_world_next = sql_file.read()
 
     try:
         print(f"Loading {server_link} into x_world")
-        data = requests.get(server_link + "/map.sql")
-        cnx = sqlite3.connect(f"game_servers/{server_nick}.db")
-        cnx.executescript(replace_x_world)
-
-        records = 0
-        for record in data.text.split("\n"):
-            cnx.execute(record)
-            records += 1
-        print(f"Loaded {records} into {server_nick}.db")
-        cnx.commit()
+        start = time.perf_counter()
+        with closing(connect(f"{db_dir}/{server_nick}.db")) as cnx:
+            # Checkpoint once after the whole load rather than every 1000 pages of it
+            cnx.execute("pragma wal_autocheckpoint = 0")
+            # Normalized servers keep x_world as a view over the fact table, so the
+            # staged load is recorded into it instead of swapped in
+            normalized = uses_normalized_schema(cnx)
+            load = load_x_world_next if normalized else load_x_world
+            with fetch_map_sql(server_link) as response:
+                result["records"] = load(
+                    cnx, stream_lines(response), create_x_world_next
+                )
+            result["download_and_load"] = time.perf_counter() - start
+            print(f"Loaded {result['records']} into {server_nick}.db")
 
-        print(f"Updating history table for {server_link}\n")
-        cnx.executescript(insert_map_history)
-        cnx.commit()
+            start = time.perf_counter()
+            if normalized:
+                print(f"Recording normalized snapshot for {server_link}\n")
+                record_normalized(cnx)
+            elif uses_delta_history(cnx):
+                print(f"Recording village changes for {server_link}\n")
+                changes = record_changes(cnx)
+                print(f"Recorded {changes} changes into {server_nick}.db")
+            else:
+                print(f"Updating history table for {server_link}\n")
+                record_snapshot(cnx)
 
-        cnx.close()
+            refresh_materialized(cnx)
+            created, _ = ensure_indexes(cnx, GAME_SERVER_INDEXES)
+            if created:
+                print(f"Created indexes {', '.join(created)} on {server_nick}.db")
+            maintained = maintain(cnx, f"{db_dir}/{server_nick}.db")
+            if maintained["error"]:
+                print(f"Maintenance of {server_nick}.db failed: {maintained['error']}")
+            else:
+                print(
+                    f"Maintained {server_nick}.db: {', '.join(maintained['actions'])} "
+                    f"({maintained['size_before'] / 1e6:.1f}MB -> {maintained['size_after'] / 1e6:.1f}MB "
+                    f"in {maintained['seconds']:.2f}s)"
+                )
+            busy, log, _ = checkpoint(cnx)
+            if busy:
+                print(
+                    f"Checkpoint of {server_nick}.db blocked by a reader; {log} WAL pages kept"
+                )
+            result["history"] = time.perf_counter() - start
 
     except Exception as e:
         print(f"Failed to collect map data for {server_link}\n{e}")
+        traceback.print_exc()
+        result["error"] = str(e) or e.__class__.__name__
+
+    return result
+
+
+def print_summary(results: list) -> None:
+    print(
+        f"{'Server':<10} {'Status':<8} {'Records':>9} {'Load (s)':>10} {'History (s)':>12}"
+    )
+    for result in results:
+        status = "FAILED" if result["error"] else "OK"
+        print(
+            f"{result['server']:<10} {status:<8} {result['records']:>9} "
+            f"{result['download_and_load']:>10.2f} {result['history']:>12.2f}"
+        )
+        if result["error"]:
+            print(f"    {result['error']}")
+
+
+def run(servers: list, workers: int = 1, db_dir: str = "game_servers") -> list:
+    """Load every server, `workers` at a time, returning one result per server in order"""
+    jobs = [(link, nick, db_dir) for link, nick in servers]
+    return run_parallel(
+        load_server, jobs, workers, lambda job, error: _result(job[1], error)
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load map.sql for every game server")
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Number of servers to download and load concurrently",
+    )
+    parser.add_argument(
+        "--servers",
+        nargs="+",
+        metavar="NICK",
+        help="Only load these servers, e.g. --servers am3 eu2",
+    )
+    args = parser.parse_args()
+
+    servers = SERVER_LINKS
+    if args.servers:
+        servers = [server for server in SERVER_LINKS if server[1] in args.servers]
+
+    start = time.perf_counter()
+    results = run(servers, args.workers)
+    print_summary(results)
+    print(f"\nTotal: {time.perf_counter() - start:.2f}s with {args.workers} worker(s)")
+
+    failed = [result["server"] for result in results if result["error"]]
+    sys.exit(1 if failed else 0)
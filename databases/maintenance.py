@@ -0,0 +1,202 @@
+import os
+import sqlite3
+import time
+import traceback
+from typing import List, NamedTuple
+
+from connection import checkpoint, connect
+from parallel import run_parallel
+
+# Re-analyze once a database has grown or shrunk by this much since the last
+# ANALYZE; in between, `pragma optimize` keeps the statistics fresh enough
+ANALYZE_GROWTH = 0.2
+# Rows sampled per index by ANALYZE. Plans only need rough row counts, and
+# this keeps ANALYZE of a multi-GB map_history to a second or two.
+ANALYSIS_LIMIT = 1000
+# Free pages worth handing back to the filesystem, as a share of the file and in pages
+VACUUM_FREE_RATIO = 0.1
+VACUUM_MIN_PAGES = 1024
+# WAL left behind by readers blocking the loader's checkpoint
+CHECKPOINT_WAL_BYTES = 64 * 1024 * 1024
+
+CREATE_MAINTENANCE_LOG = """
+create table if not exists maintenance_log (
+    ran_at timestamp not null default current_timestamp,
+    actions text not null,
+    pages_before integer not null,
+    pages_after integer not null,
+    freelist_count integer not null,
+    seconds real not null
+);
+"""
+
+
+class Stats(NamedTuple):
+    page_count: int
+    freelist_count: int
+    auto_vacuum: int
+    wal_bytes: int
+    analyzed: bool
+    # Pages after ANALYZE last ran, or None if it never ran through here
+    analyzed_page_count: int
+
+
+def file_size(db: str) -> int:
+    """Bytes on disk for the database and its WAL"""
+    return sum(
+        os.path.getsize(path) for path in (db, db + "-wal") if os.path.exists(path)
+    )
+
+
+def _tables(cnx: sqlite3.Connection) -> set:
+    return {
+        name
+        for (name,) in cnx.execute(
+            "select name from sqlite_master where type = 'table'"
+        )
+    }
+
+
+def stats(cnx: sqlite3.Connection, db: str) -> Stats:
+    tables = _tables(cnx)
+    analyzed_page_count = None
+    if "maintenance_log" in tables:
+        row = cnx.execute(
+            "select pages_after from maintenance_log where instr(actions, 'analyze') "
+            "order by rowid desc limit 1"
+        ).fetchone()
+        analyzed_page_count = row[0] if row else None
+    wal = db + "-wal"
+    return Stats(
+        page_count=cnx.execute("pragma page_count").fetchone()[0],
+        freelist_count=cnx.execute("pragma freelist_count").fetchone()[0],
+        auto_vacuum=cnx.execute("pragma auto_vacuum").fetchone()[0],
+        wal_bytes=os.path.getsize(wal) if os.path.exists(wal) else 0,
+        analyzed="sqlite_stat1" in tables,
+        analyzed_page_count=analyzed_page_count,
+    )
+
+
+def plan(current: Stats) -> List[str]:
+    """The maintenance a database needs, in the order it should run"""
+    actions = []
+    if not current.analyzed or current.analyzed_page_count is None:
+        actions.append("analyze")
+    elif abs(current.page_count - current.analyzed_page_count) >= (
+        ANALYZE_GROWTH * current.analyzed_page_count
+    ):
+        actions.append("analyze")
+    else:
+        actions.append("optimize")
+
+    free = current.freelist_count
+    if free >= VACUUM_MIN_PAGES and free >= VACUUM_FREE_RATIO * current.page_count:
+        # Incremental vacuum only works once auto_vacuum is incremental, and
+        # switching to it takes one full VACUUM
+        actions.append("incremental vacuum" if current.auto_vacuum == 2 else "vacuum")
+
+    if "vacuum" in actions or current.wal_bytes >= CHECKPOINT_WAL_BYTES:
+        actions.append("checkpoint")
+    return actions
+
+
+def _run(cnx: sqlite3.Connection, db: str, action: str) -> None:
+    if action == "analyze":
+        cnx.execute(f"pragma analysis_limit = {ANALYSIS_LIMIT}")
+        cnx.execute("analyze")
+    elif action == "optimize":
+        cnx.execute("pragma optimize")
+    elif action == "vacuum":
+        cnx.execute("pragma auto_vacuum = incremental")
+        cnx.execute("vacuum")
+    elif action == "incremental vacuum":
+        # Each step of the pragma frees one page; executescript steps it to the end
+        cnx.executescript("pragma incremental_vacuum")
+    elif action == "checkpoint":
+        busy, log, _ = checkpoint(cnx)
+        if busy:
+            print(f"Checkpoint of {db} blocked by a reader; {log} WAL pages kept")
+    cnx.commit()
+
+
+def _result(db: str, error: str = None) -> dict:
+    return {
+        "db": db,
+        "actions": [],
+        "size_before": 0,
+        "size_after": 0,
+        "seconds": 0.0,
+        "error": error,
+    }
+
+
+def maintain(cnx: sqlite3.Connection, db: str, dry_run: bool = False) -> dict:
+    """Run the maintenance `db` needs on an open connection and record it in maintenance_log.
+
+    Failures are reported in the result, not raised.
+    """
+    result = _result(db)
+    start = time.perf_counter()
+    try:
+        result["size_before"] = result["size_after"] = file_size(db)
+        current = stats(cnx, db)
+        result["actions"] = plan(current)
+        if not dry_run:
+            for action in result["actions"]:
+                if action != "checkpoint":
+                    _run(cnx, db, action)
+            cnx.executescript(CREATE_MAINTENANCE_LOG)
+            cnx.execute(
+                "insert into maintenance_log (actions, pages_before, pages_after, freelist_count, seconds) "
+                "values (?, ?, ?, ?, ?)",
+                (
+                    ", ".join(result["actions"]),
+                    current.page_count,
+                    cnx.execute("pragma page_count").fetchone()[0],
+                    cnx.execute("pragma freelist_count").fetchone()[0],
+                    time.perf_counter() - start,
+                ),
+            )
+            cnx.commit()
+            # Last, so the log row goes into the database file with everything else
+            if "checkpoint" in result["actions"]:
+                _run(cnx, db, "checkpoint")
+            result["size_after"] = file_size(db)
+    except Exception as e:
+        traceback.print_exc()
+        result["error"] = str(e) or e.__class__.__name__
+
+    result["seconds"] = time.perf_counter() - start
+    return result
+
+
+def maintain_db(db: str, dry_run: bool = False) -> dict:
+    if not os.path.exists(db):
+        return _result(db, f"{db} does not exist")
+    cnx = connect(db)
+    result = maintain(cnx, db, dry_run)
+    cnx.close()
+    return result
+
+
+def run(dbs: List[str], workers: int = 1, dry_run: bool = False) -> List[dict]:
+    """Maintain every database, `workers` at a time, returning one result per database in order"""
+    jobs = [(db, dry_run) for db in dbs]
+    return run_parallel(
+        maintain_db, jobs, workers, lambda job, error: _result(job[0], error)
+    )
+
+
+def print_summary(results: List[dict], dry_run: bool = False) -> None:
+    header = "Planned" if dry_run else "Actions"
+    print(
+        f"{'Database':<40} {header:<40} {'Before (MB)':>11} {'After (MB)':>11} {'Time (s)':>9}"
+    )
+    for result in results:
+        actions = "FAILED" if result["error"] else ", ".join(result["actions"])
+        print(
+            f"{result['db']:<40} {actions:<40} {result['size_before'] / 1e6:>11.1f} "
+            f"{result['size_after'] / 1e6:>11.1f} {result['seconds']:>9.2f}"
+        )
+        if result["error"]:
+            print(f"    {result['error']}")
@@ -3,6 +3,36 @@ import glob
 import sqlite3
 from pathlib import Path
 import os
+import sys
+import time
+
+from connection import connect
+from indexes import (
+    ANALYTICS_INDEXES,
+    BOT_SERVER_INDEXES,
+    BOT_SERVER_QUERIES,
+    GAME_SERVER_INDEXES,
+    GAME_SERVER_QUERIES,
+    ensure_indexes,
+)
+from history import (
+    convert_to_delta,
+    dedupe_map_history,
+    needs_dedupe,
+    uses_delta_history,
+    uses_normalized_schema,
+)
+from materialize import refresh_materialized
+import backup
+import consolidate
+import maintenance
+import migrate
+from normalized import normalize
+from retention import RetentionPolicy, apply_retention, vacuum_into
+
+# The analytics database has its own numbered migrations, apart from the bot servers'
+ANALYTICS_DB = "analytics/analytics.db"
+ANALYTICS_MIGRATIONS = "migrations/analytics"
 
 
 def _get_views() -> list:
@@ -34,12 +64,14 @@ def refresh_views():
     views = _get_views()
 
     for db in dbs:
-        cnx = sqlite3.connect(db)
+        cnx = connect(db)
         print(f"Opened {db}")
         for view_path in views:
             print(f"Executing {view_path}")
             with open(view_path, "r") as view:
                 cnx.executescript(view.read())
+        print("Refreshing materialized tables")
+        refresh_materialized(cnx)
         cnx.close()
 
     return
@@ -76,6 +108,64 @@ def copy_prod_db(username):
 
 
 
+@manage.command(
+    name="backup",
+    help="Back up live game and bot server databases online, with checksums and a manifest",
+)
+@click.option(
+    "--workers", default=4, show_default=True, help="Databases copied concurrently"
+)
+@click.option(
+    "--pages",
+    default=backup.BACKUP_PAGES,
+    show_default=True,
+    help="Pages per backup step",
+)
+@click.option("--backup-dir", default=backup.BACKUP_DIR, show_default=True)
+@click.argument("dbs", nargs=-1)
+def backup_command(workers, pages, backup_dir, dbs):
+    dbs = dbs or _get_dbs() + _get_bot_servers()
+
+    start = time.perf_counter()
+    directory = backup.backup(list(dbs), backup_dir, workers, pages)
+    results = backup.read_manifest(directory)["databases"]
+    backup.print_summary(results)
+    print(f"\nTotal: {time.perf_counter() - start:.2f}s into {directory}")
+
+    if any(result["error"] for result in results):
+        sys.exit(1)
+
+
+@manage.command(
+    name="restore",
+    help="Restore databases from a backup (the latest if none given) after verifying checksums",
+)
+@click.option(
+    "--workers", default=4, show_default=True, help="Databases restored concurrently"
+)
+@click.option("--backup-dir", default=backup.BACKUP_DIR, show_default=True)
+@click.option(
+    "--db",
+    "dbs",
+    multiple=True,
+    help="Only restore this database, e.g. game_servers/am3.db",
+)
+@click.argument("directory", required=False)
+def restore_command(workers, backup_dir, dbs, directory):
+    directory = directory or backup.latest_backup(backup_dir)
+    if directory is None:
+        print(f"No backups found in {backup_dir}")
+        sys.exit(1)
+
+    start = time.perf_counter()
+    results = backup.restore(directory, list(dbs), workers=workers)
+    backup.print_summary(results)
+    print(f"\nTotal: {time.perf_counter() - start:.2f}s from {directory}")
+
+    if any(result["error"] for result in results):
+        sys.exit(1)
+
+
 @manage.command(help="Initialize analytics database")
 def init_analytics():
     """Initialize the analytics database"""
@@ -86,7 +176,8 @@ def init_analytics():
         print("Creating analytics directory")
         analytics_path.mkdir(parents=True, exist_ok=True)
 
-    db_path = analytics_path / "analytics.db"
+    db_path = Path(ANALYTICS_DB)
+    created = not db_path.exists()
 
     try:
         with open("sql/create_table_analytics.sql", "r") as f:
@@ -95,12 +186,284 @@ def init_analytics():
         print(f"Creating analytics database at {db_path}")
         with sqlite3.connect(db_path) as conn:
             conn.executescript(create_table_sql)
+            ensure_indexes(conn, ANALYTICS_INDEXES)
             conn.commit()
+
+        # A new database already has every column, so it only records the
+        # migrations; an older one gets the ones it is missing
+        migrations = migrate.load_migrations(ANALYTICS_MIGRATIONS)
+        baseline = max((m.version for m in migrations), default=0) if created else 0
+        result = migrate.migrate_db(str(db_path), migrations, baseline=baseline)
+        if result["error"]:
+            raise RuntimeError(result["error"])
+        for name in result["applied"]:
+            print(f"Applied {name}")
         print("Analytics database initialized successfully")
     except Exception as e:
         print(f"Failed to initialize analytics database: {e}")
         raise
 
+
+@manage.command(
+    name="ensure-indexes",
+    help="Create missing indexes on all game and bot server databases and the analytics database",
+)
+def ensure_indexes_command():
+    targets = [(db, GAME_SERVER_INDEXES, GAME_SERVER_QUERIES) for db in _get_dbs()]
+    targets += [
+        (db, BOT_SERVER_INDEXES, BOT_SERVER_QUERIES) for db in _get_bot_servers()
+    ]
+    if os.path.exists(ANALYTICS_DB):
+        targets.append((ANALYTICS_DB, ANALYTICS_INDEXES, {}))
+
+    for db, indexes, queries in targets:
+        cnx = connect(db)
+        print(f"Opened {db}")
+        created, plans = ensure_indexes(cnx, indexes, queries)
+        cnx.close()
+
+        if not created:
+            print("All indexes already present\n")
+            continue
+
+        print(f"Created {', '.join(created)}")
+        for label, (before, after) in plans.items():
+            if before != after:
+                print(f"  {label}:")
+                print(f"    before: {'; '.join(before.splitlines())}")
+                print(f"    after:  {'; '.join(after.splitlines())}")
+        print()
+
+    return
+
+
+@manage.command(
+    help="Collapse repeated same-day loads in map_history (all servers if none given)"
+)
+@click.argument("dbs", nargs=-1)
+def dedupe_history(dbs):
+    dbs = dbs or _get_dbs()
+
+    for db in dbs:
+        cnx = connect(db)
+        if not needs_dedupe(cnx):
+            print(f"{db} is already keyed by snapshot day")
+            cnx.close()
+            continue
+
+        print(f"Deduplicating {db}...")
+        before, after = dedupe_map_history(cnx)
+        cnx.execute("vacuum")
+        cnx.close()
+        print(f"Deduplicated {db}: {before} rows -> {after} rows")
+
+    return
+
+
+@manage.command(help="Switch game servers to delta history (all servers if none given)")
+@click.argument("dbs", nargs=-1)
+def history_to_delta(dbs):
+    dbs = dbs or _get_dbs()
+
+    for db in dbs:
+        cnx = connect(db)
+        if uses_delta_history(cnx):
+            print(f"{db} already uses delta history")
+            cnx.close()
+            continue
+
+        print(f"Converting {db} to delta history...")
+        size_before = os.path.getsize(db)
+        convert_to_delta(cnx)
+        snapshots, versions = cnx.execute(
+            "select (select count(*) from map_snapshots), (select count(*) from map_changes)"
+        ).fetchone()
+        cnx.execute("vacuum")
+        cnx.close()
+        print(
+            f"Converted {db}: {snapshots} snapshots in {versions} village versions, "
+            f"{size_before / 1e6:.1f} MB -> {os.path.getsize(db) / 1e6:.1f} MB"
+        )
+
+    return
+
+
+@manage.command(
+    name="normalize",
+    help="Move game servers to the compact STRICT schema (all servers if none given)",
+)
+@click.argument("dbs", nargs=-1)
+def normalize_command(dbs):
+    dbs = dbs or _get_dbs()
+
+    for db in dbs:
+        cnx = connect(db)
+        if uses_normalized_schema(cnx):
+            print(f"{db} is already normalized")
+            cnx.close()
+            continue
+
+        print(f"Normalizing {db}...")
+        size_before = os.path.getsize(db)
+        try:
+            normalize(cnx)
+        except ValueError as e:
+            print(f"Skipping {db}: {e}")
+            cnx.close()
+            continue
+        days, villages, players = cnx.execute(
+            "select (select count(*) from map_snapshots), (select count(*) from villages), "
+            "(select count(*) from players)"
+        ).fetchone()
+        cnx.execute("vacuum")
+        cnx.close()
+        print(
+            f"Normalized {db}: {days} days, {villages} villages, {players} players, "
+            f"{size_before / 1e6:.1f} MB -> {os.path.getsize(db) / 1e6:.1f} MB"
+        )
+
+    return
+
+
+@manage.command(
+    name="apply-retention",
+    help="Downsample old map history (all servers if none given)",
+)
+@click.option(
+    "--daily-days", default=60, show_default=True, help="Keep every day this recent"
+)
+@click.option(
+    "--weekly-days",
+    default=365,
+    show_default=True,
+    help="Keep one day per week this recent, then one per month",
+)
+@click.option("--dry-run", is_flag=True, help="Only report what would be pruned")
+@click.option(
+    "--vacuum-into",
+    "vacuum_into_dir",
+    type=click.Path(file_okay=False),
+    help="Write a compacted copy of each database into this directory",
+)
+@click.argument("dbs", nargs=-1)
+def apply_retention_command(daily_days, weekly_days, dry_run, vacuum_into_dir, dbs):
+    policy = RetentionPolicy(daily_days, weekly_days)
+    try:
+        policy.validate()
+    except ValueError as e:
+        raise click.BadParameter(str(e))
+
+    dbs = dbs or _get_dbs()
+    if vacuum_into_dir:
+        Path(vacuum_into_dir).mkdir(parents=True, exist_ok=True)
+
+    for db in dbs:
+        cnx = connect(db)
+        pruned, rows = apply_retention(cnx, policy, dry_run)
+        verb = "Would prune" if dry_run else "Pruned"
+        print(f"{db}: {verb} {len(pruned)} snapshot days, {rows} rows deleted")
+
+        if vacuum_into_dir and not dry_run:
+            compacted = str(Path(vacuum_into_dir) / Path(db).name)
+            vacuum_into(cnx, compacted)
+            print(
+                f"Compacted {db} into {compacted}: {os.path.getsize(db) / 1e6:.1f} MB "
+                f"-> {os.path.getsize(compacted) / 1e6:.1f} MB"
+            )
+        cnx.close()
+
+    if vacuum_into_dir and not dry_run:
+        # Swapping under a live connection loses whatever it writes afterwards
+        print(
+            "Stop the bot, site and loader before moving the compacted copies into place"
+        )
+
+    return
+
+
+@manage.command(
+    name="migrate",
+    help="Apply pending versioned migrations to bot server databases (all, and the analytics database, if none given)",
+)
+@click.option(
+    "--workers", default=4, show_default=True, help="Databases migrated concurrently"
+)
+@click.option("--dry-run", is_flag=True, help="Only report the pending migrations")
+@click.option(
+    "--baseline",
+    type=int,
+    default=0,
+    help="Record versions up to this one as applied on databases never migrated before",
+)
+@click.argument("dbs", nargs=-1)
+def migrate_command(workers, dry_run, baseline, dbs):
+    migrate_analytics = not dbs and os.path.exists(ANALYTICS_DB)
+    dbs = dbs or _get_bot_servers()
+    migrations = migrate.load_migrations()
+
+    start = time.perf_counter()
+    results = migrate.run(list(dbs), migrations, workers, dry_run, baseline)
+    if migrate_analytics:
+        results.append(
+            migrate.migrate_db(
+                ANALYTICS_DB,
+                migrate.load_migrations(ANALYTICS_MIGRATIONS),
+                dry_run,
+            )
+        )
+    migrate.print_summary(results, dry_run)
+    print(f"\nTotal: {time.perf_counter() - start:.2f}s with {workers} worker(s)")
+
+    if any(result["error"] for result in results):
+        sys.exit(1)
+
+
+@manage.command(
+    name="consolidate",
+    help="Fold bot server databases into the consolidated database (all if none given)",
+)
+@click.option("--target", default=consolidate.CONSOLIDATED_DB, show_default=True)
+@click.argument("dbs", nargs=-1)
+def consolidate_command(target, dbs):
+    dbs = dbs or [
+        db
+        for db in _get_bot_servers()
+        if os.path.abspath(db) != os.path.abspath(target)
+    ]
+
+    start = time.perf_counter()
+    results = consolidate.consolidate(list(dbs), target)
+    consolidate.print_summary(results)
+    print(f"\nTotal: {time.perf_counter() - start:.2f}s into {target}")
+
+    if any(result["error"] for result in results):
+        sys.exit(1)
+    print(
+        "Set consolidated_db = true in the [default] section of the bot config to use it"
+    )
+
+
+@manage.command(
+    name="maintain",
+    help="Analyze, optimize, vacuum and checkpoint game and bot server databases as needed (all if none given)",
+)
+@click.option(
+    "--workers", default=4, show_default=True, help="Databases maintained concurrently"
+)
+@click.option("--dry-run", is_flag=True, help="Only report the planned maintenance")
+@click.argument("dbs", nargs=-1)
+def maintain_command(workers, dry_run, dbs):
+    dbs = dbs or _get_dbs() + _get_bot_servers()
+
+    start = time.perf_counter()
+    results = maintenance.run(list(dbs), workers, dry_run)
+    maintenance.print_summary(results, dry_run)
+    print(f"\nTotal: {time.perf_counter() - start:.2f}s with {workers} worker(s)")
+
+    if any(result["error"] for result in results):
+        sys.exit(1)
+
+
 @manage.command(help="Execute a specific database script")
 @click.argument("script_name")
 def execute_migration(script_name):
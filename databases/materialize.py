@@ -0,0 +1,74 @@
+import sqlite3
+from typing import Dict, Optional
+
+from ingest import run_in_transaction
+
+# Per-day aggregates kept for all of history; only days since the last refresh are recomputed
+ROLLUP_TABLES = ["player_daily", "alliance_daily"]
+# Snapshots of the newest day, by the column holding the day. Moved on from the
+# day before (or redone for a reloaded day) by sql/update_<table>.sql, which
+# reads only the newest day of map_history; rebuilt whole otherwise.
+MATERIALIZED_TABLES = {"seven_day_pop": "load_date", "player_change": "created_at"}
+
+
+def _since_day(cnx: sqlite3.Connection, table: str) -> int:
+    exists = cnx.execute(
+        "select 1 from sqlite_master where type = 'table' and name = ?", (table,)
+    ).fetchone()
+    if exists is None:
+        return 0
+    # Redo the last day rolled up, in case it was reloaded since
+    last_day = cnx.execute(f"select max(snapshot_day) from {table}").fetchone()[0]
+    return 0 if last_day is None else last_day
+
+
+def _materialized_day(cnx: sqlite3.Connection, table: str) -> Optional[int]:
+    """The snapshot day a materialized table holds, or None if it is missing or empty"""
+    exists = cnx.execute(
+        "select 1 from sqlite_master where type = 'table' and name = ?", (table,)
+    ).fetchone()
+    if exists is None:
+        return None
+    row = cnx.execute(
+        f"select cast(strftime('%s', {MATERIALIZED_TABLES[table]}) as int) / 86400 "
+        f"from {table} limit 1"
+    ).fetchone()
+    return None if row is None else row[0]
+
+
+def _read_sql(name: str) -> str:
+    with open(f"sql/{name}.sql", "r") as sql_file:
+        return sql_file.read()
+
+
+def refresh_materialized(cnx: sqlite3.Connection) -> Dict[str, int]:
+    """Bring the rollup and materialized tables up to date with map_history.
+
+    Each table is refreshed in its own transaction, so readers always see
+    complete days. Returns the row count of each table.
+    """
+    has_history = cnx.execute(
+        "select 1 from sqlite_master where name = 'map_history'"
+    ).fetchone()
+    if has_history is None:
+        return {}
+
+    counts = {}
+    for table in ROLLUP_TABLES:
+        run_in_transaction(
+            cnx, _read_sql(f"refresh_{table}"), {"since_day": _since_day(cnx, table)}
+        )
+        counts[table] = cnx.execute(f"select count(*) from {table}").fetchone()[0]
+
+    # seven_day_pop reads the founding day of its villages from here
+    run_in_transaction(cnx, _read_sql("refresh_village_founded"))
+    newest_day = cnx.execute("select max(snapshot_day) from map_history").fetchone()[0]
+    for table in MATERIALIZED_TABLES:
+        held_day = _materialized_day(cnx, table)
+        shift = None if None in (held_day, newest_day) else newest_day - held_day
+        if shift in (0, 1):
+            run_in_transaction(cnx, _read_sql(f"update_{table}"), {"shift": shift})
+        else:
+            run_in_transaction(cnx, _read_sql(f"refresh_{table}"))
+        counts[table] = cnx.execute(f"select count(*) from {table}").fetchone()[0]
+    return counts
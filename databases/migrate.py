@@ -0,0 +1,168 @@
+import glob
+import os
+import re
+import sqlite3
+import time
+import traceback
+from contextlib import closing
+from typing import List, NamedTuple
+
+from ingest import run_in_transaction, split_statements
+from parallel import run_parallel
+
+# Scripts carry their own BEGIN/COMMIT for running by hand; the runner wraps
+# each one in a transaction together with its schema_version row instead
+_TRANSACTION_STATEMENT = re.compile(
+    r"^\s*(begin|commit|end|rollback)(\s+transaction)?\s*;?\s*$", re.IGNORECASE
+)
+_MIGRATION_NAME = re.compile(r"^(\d+)_\w+\.sql$")
+
+CREATE_SCHEMA_VERSION = """
+create table if not exists schema_version (
+    version integer primary key,
+    name text not null,
+    applied_at timestamp not null default current_timestamp
+);
+"""
+
+
+class Migration(NamedTuple):
+    version: int
+    name: str
+    path: str
+
+
+def load_migrations(directory: str = "migrations") -> List[Migration]:
+    """The NNN_description.sql scripts in a directory, in version order"""
+    migrations = []
+    for path in glob.glob(os.path.join(directory, "*.sql")):
+        filename = os.path.basename(path)
+        match = _MIGRATION_NAME.match(filename)
+        if match is None:
+            raise ValueError(f"Migration {filename} must be named NNN_description.sql")
+        migrations.append(Migration(int(match.group(1)), filename[:-4], path))
+
+    migrations.sort()
+    versions = [migration.version for migration in migrations]
+    if len(set(versions)) != len(versions):
+        raise ValueError(f"Duplicate migration versions in {directory}")
+    return migrations
+
+
+def applied_versions(cnx: sqlite3.Connection) -> set:
+    """The migration versions recorded in schema_version; empty for a database never migrated"""
+    exists = cnx.execute(
+        "select 1 from sqlite_master where type = 'table' and lower(name) = 'schema_version'"
+    ).fetchone()
+    if exists is None:
+        return set()
+    return {version for (version,) in cnx.execute("select version from schema_version")}
+
+
+def _script(migration: Migration) -> str:
+    with open(migration.path, "r") as sql_file:
+        statements = [
+            statement
+            for statement in split_statements(sql_file.read())
+            if not _TRANSACTION_STATEMENT.match(statement)
+        ]
+    return (
+        CREATE_SCHEMA_VERSION
+        + "\n".join(statements)
+        + "\ninsert into schema_version (version, name) values (:version, :name);"
+    )
+
+
+def _guild_id(db: str):
+    """Bot server databases are named after their guild; other databases have no guild"""
+    stem = os.path.splitext(os.path.basename(db))[0]
+    return int(stem) if stem.isdigit() else None
+
+
+def _result(db: str, error: str = None) -> dict:
+    return {"db": db, "applied": [], "pending": [], "seconds": 0.0, "error": error}
+
+
+def migrate_db(
+    db: str, migrations: List[Migration], dry_run: bool = False, baseline: int = 0
+) -> dict:
+    """Apply the pending migrations to one database in order, each in its own transaction.
+
+    With a baseline, a database that has never been migrated records every
+    version up to it as applied without running it. Failures are reported in
+    the result, not raised; the failing migration and those after it stay pending.
+    Scripts may use :guild_id, the guild a bot server database is named after.
+    """
+    result = _result(db)
+    start = time.perf_counter()
+    try:
+        with closing(sqlite3.connect(db)) as cnx:
+            applied = applied_versions(cnx)
+            baselined = []
+            if baseline and not applied:
+                baselined = [m for m in migrations if m.version <= baseline]
+                if not dry_run:
+                    cnx.executescript(CREATE_SCHEMA_VERSION)
+                    cnx.executemany(
+                        "insert into schema_version (version, name) values (?, ?)",
+                        [(m.version, m.name) for m in baselined],
+                    )
+                    cnx.commit()
+                applied = {m.version for m in baselined}
+
+            pending = [m for m in migrations if m.version not in applied]
+            result["pending"] = [m.name for m in pending]
+            if not dry_run:
+                guild_id = _guild_id(db)
+                for migration in pending:
+                    script = _script(migration)
+                    if guild_id is None and ":guild_id" in script:
+                        raise ValueError(
+                            f"{migration.name} tags rows with the guild id from the file name, "
+                            f"and {os.path.basename(db)} is not named after a guild"
+                        )
+                    run_in_transaction(
+                        cnx,
+                        script,
+                        {
+                            "version": migration.version,
+                            "name": migration.name,
+                            "guild_id": guild_id,
+                        },
+                    )
+                    result["applied"].append(migration.name)
+                    result["pending"].remove(migration.name)
+    except Exception as e:
+        traceback.print_exc()
+        result["error"] = str(e) or e.__class__.__name__
+
+    result["seconds"] = time.perf_counter() - start
+    return result
+
+
+def run(
+    dbs: List[str],
+    migrations: List[Migration],
+    workers: int = 1,
+    dry_run: bool = False,
+    baseline: int = 0,
+) -> List[dict]:
+    """Migrate every database, `workers` at a time, returning one result per database in order"""
+    jobs = [(db, migrations, dry_run, baseline) for db in dbs]
+    return run_parallel(
+        migrate_db, jobs, workers, lambda job, error: _result(job[0], error)
+    )
+
+
+def print_summary(results: List[dict], dry_run: bool = False) -> None:
+    column = "Pending" if dry_run else "Applied"
+    print(f"{'Database':<40} {'Status':<8} {column:>8} {'Time (s)':>9}")
+    for result in results:
+        status = "FAILED" if result["error"] else "OK"
+        count = len(result["pending"] if dry_run else result["applied"])
+        print(f"{result['db']:<40} {status:<8} {count:>8} {result['seconds']:>9.2f}")
+        names = result["pending"] if dry_run else result["applied"]
+        if names:
+            print(f"    {', '.join(names)}")
+        if result["error"]:
+            print(f"    {result['error']}")
@@ -0,0 +1,43 @@
+BEGIN TRANSACTION;
+
+-- Guilds initialized before raid tracking never created its table
+CREATE TABLE IF NOT EXISTS RAID_TRACKING (
+    id INTEGER PRIMARY KEY AUTOINCREMENT NOT NULL,
+    player_name TEXT NOT NULL,
+    rank INTEGER NOT NULL,
+    total_raided INTEGER NOT NULL,
+    channel_id TEXT NOT NULL,
+    recorded_at TIMESTAMP NOT NULL,
+    is_personal BOOLEAN NOT NULL DEFAULT FALSE
+);
+
+-- Tag every row with its guild so per-guild files can be folded into one
+-- database. :guild_id is bound by `manage.py migrate` from the file name.
+ALTER TABLE HAMMERS ADD COLUMN GUILD_ID INTEGER NOT NULL DEFAULT 0;
+ALTER TABLE DEFENSE_CALLS ADD COLUMN guild_id INTEGER NOT NULL DEFAULT 0;
+ALTER TABLE DEFENSE_THREADS ADD COLUMN guild_id INTEGER NOT NULL DEFAULT 0;
+ALTER TABLE SUBMITTED_DEFENSE ADD COLUMN guild_id INTEGER NOT NULL DEFAULT 0;
+ALTER TABLE RAID_TRACKING ADD COLUMN guild_id INTEGER NOT NULL DEFAULT 0;
+
+UPDATE HAMMERS SET GUILD_ID = :guild_id;
+UPDATE DEFENSE_CALLS SET guild_id = :guild_id;
+UPDATE DEFENSE_THREADS SET guild_id = :guild_id;
+UPDATE SUBMITTED_DEFENSE SET guild_id = :guild_id;
+UPDATE RAID_TRACKING SET guild_id = :guild_id;
+
+-- Replaced by the guild-leading indexes below
+DROP INDEX IF EXISTS hammers_lower_ign;
+DROP INDEX IF EXISTS defense_threads_defense_call_id;
+DROP INDEX IF EXISTS submitted_defense_defense_call_id;
+DROP INDEX IF EXISTS raid_tracking_player;
+
+CREATE INDEX IF NOT EXISTS hammers_guild_lower_ign ON HAMMERS (GUILD_ID, lower(IGN), TIMESTAMP);
+CREATE INDEX IF NOT EXISTS hammers_guild_ign_coordinates ON HAMMERS (GUILD_ID, IGN, COORDINATES);
+CREATE INDEX IF NOT EXISTS defense_calls_guild_land_time ON DEFENSE_CALLS (guild_id, land_time);
+CREATE INDEX IF NOT EXISTS defense_calls_guild_event_id ON DEFENSE_CALLS (guild_id, event_id);
+CREATE INDEX IF NOT EXISTS defense_threads_guild_defense_call_id ON DEFENSE_THREADS (guild_id, defense_call_id);
+CREATE INDEX IF NOT EXISTS submitted_defense_guild_defense_call_id ON SUBMITTED_DEFENSE (guild_id, defense_call_id);
+CREATE INDEX IF NOT EXISTS submitted_defense_guild_submitter ON SUBMITTED_DEFENSE (guild_id, submitted_by_id, amount_submitted);
+CREATE INDEX IF NOT EXISTS raid_tracking_guild_player ON RAID_TRACKING (guild_id, player_name, is_personal, recorded_at);
+
+COMMIT;
@@ -0,0 +1,7 @@
+BEGIN TRANSACTION;
+
+-- Parts of execution_time_ms spent on the bot's databases and on Discord's API
+ALTER TABLE ANALYTICS ADD COLUMN db_time_ms INTEGER;
+ALTER TABLE ANALYTICS ADD COLUMN discord_time_ms INTEGER;
+
+COMMIT;
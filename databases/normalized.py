@@ -0,0 +1,49 @@
+import sqlite3
+
+from history import (
+    _has_table,
+    _read_sql,
+    _snapshot_params,
+    dedupe_map_history,
+    needs_dedupe,
+    uses_delta_history,
+    uses_normalized_schema,
+)
+from indexes import GAME_SERVER_INDEXES, ensure_indexes
+from ingest import run_in_transaction
+
+
+def normalize(cnx: sqlite3.Connection) -> None:
+    """Move a full-history server into the STRICT normalized tables.
+
+    x_world and map_history become views with their old columns, so the views,
+    the site and the bot keep reading them unchanged.
+    """
+    if uses_normalized_schema(cnx):
+        return
+    if uses_delta_history(cnx):
+        raise ValueError("delta history servers can't be normalized")
+    if not _has_table(cnx, "x_world"):
+        raise ValueError("no x_world table to normalize")
+
+    if needs_dedupe(cnx):
+        dedupe_map_history(cnx)
+
+    run_in_transaction(
+        cnx,
+        _read_sql("create_map_history")
+        + "\nalter table map_history rename to map_history_old;"
+        + "\nalter table x_world rename to x_world_old;\n"
+        + _read_sql("create_normalized")
+        + _read_sql("migrate_normalized"),
+    )
+    ensure_indexes(cnx, GAME_SERVER_INDEXES)
+
+
+def record_normalized(cnx: sqlite3.Connection, snapshot_at: int = None) -> int:
+    """Record x_world_next as today's snapshot and drop it. Returns the number of rows written."""
+    before = cnx.total_changes
+    run_in_transaction(
+        cnx, _read_sql("insert_village_days"), _snapshot_params(snapshot_at)
+    )
+    return cnx.total_changes - before
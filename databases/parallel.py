@@ -0,0 +1,28 @@
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, List
+
+
+def run_parallel(
+    func: Callable[..., dict],
+    jobs: List[tuple],
+    workers: int,
+    crashed: Callable[[tuple, str], dict],
+) -> List[dict]:
+    """Run func(*job) for every job, `workers` at a time, one result per job in order.
+
+    func reports its own failures in its result. When a worker process dies
+    instead (e.g. OOM), crashed(job, error) stands in for that job's result.
+    """
+    if workers <= 1:
+        return [func(*job) for job in jobs]
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(func, *job) for job in jobs]
+
+    results = []
+    for future, job in zip(futures, jobs):
+        try:
+            results.append(future.result())
+        except Exception as e:
+            results.append(crashed(job, f"Worker crashed: {e!r}"))
+    return results
@@ -0,0 +1,127 @@
+import datetime
+import os
+import sqlite3
+from typing import List, NamedTuple, Tuple
+
+from history import EPOCH, uses_delta_history, uses_normalized_schema
+from ingest import run_in_transaction
+
+
+class RetentionPolicy(NamedTuple):
+    """Keep every day for `daily_days`, then one day per week until `weekly_days`, then one per month"""
+
+    daily_days: int = 60
+    weekly_days: int = 365
+
+    def validate(self) -> None:
+        # v_seven_day_pop and v_player_change read the newest week at daily granularity
+        if self.daily_days < 7:
+            raise ValueError(
+                "daily_days must be at least 7 to keep the seven-day views intact"
+            )
+        if self.weekly_days < self.daily_days:
+            raise ValueError("weekly_days must not be shorter than daily_days")
+
+
+def _bucket(day: int, age: int, policy: RetentionPolicy) -> tuple:
+    if age < policy.daily_days:
+        return ("day", day)
+    if age < policy.weekly_days:
+        # Day 0 was a Thursday; shifting by 3 makes weeks run Monday to Sunday
+        return ("week", (day + 3) // 7)
+    date = EPOCH + datetime.timedelta(days=day)
+    return ("month", date.year, date.month)
+
+
+def days_to_prune(days: List[int], policy: RetentionPolicy) -> List[int]:
+    """The snapshot days the policy drops, keeping the newest day of each week/month.
+
+    Ages are measured from the newest snapshot rather than the clock, so a
+    server that stopped loading isn't pruned away.
+    """
+    if not days:
+        return []
+
+    latest = max(days)
+    kept = {}
+    for day in days:
+        bucket = _bucket(day, latest - day, policy)
+        kept[bucket] = max(day, kept.get(bucket, day))
+
+    keep = set(kept.values())
+    return sorted(day for day in days if day not in keep)
+
+
+def _snapshot_days(cnx: sqlite3.Connection, delta: bool) -> List[int]:
+    if delta:
+        query = "select snapshot_day from map_snapshots"
+    else:
+        query = "select distinct snapshot_day from map_history"
+    return [day for (day,) in cnx.execute(query)]
+
+
+def apply_retention(
+    cnx: sqlite3.Connection, policy: RetentionPolicy, dry_run: bool = False
+) -> Tuple[List[int], int]:
+    """Prune map_history to the policy. Returns the days pruned and the rows deleted.
+
+    Each day is deleted in its own transaction so the write lock is only ever
+    held briefly. The player/alliance rollups keep every day.
+    """
+    policy.validate()
+    has_history = cnx.execute(
+        "select 1 from sqlite_master where name = 'map_history'"
+    ).fetchone()
+    if has_history is None:
+        return [], 0
+
+    delta = uses_delta_history(cnx)
+    normalized = uses_normalized_schema(cnx)
+    prune = days_to_prune(_snapshot_days(cnx, delta or normalized), policy)
+    if dry_run:
+        return prune, 0
+
+    before = cnx.total_changes
+    for day in prune:
+        if normalized:
+            run_in_transaction(
+                cnx,
+                "delete from village_days where snapshot_day = :day;\n"
+                "delete from map_snapshots where snapshot_day = :day;",
+                {"day": day},
+            )
+        elif delta:
+            run_in_transaction(
+                cnx,
+                "delete from map_snapshots where snapshot_day = :day;",
+                {"day": day},
+            )
+        else:
+            run_in_transaction(
+                cnx, "delete from map_history where snapshot_day = :day;", {"day": day}
+            )
+
+    if delta and prune:
+        # Versions that were only ever seen on pruned days can no longer be reconstructed
+        run_in_transaction(
+            cnx,
+            """
+            delete from map_changes
+            where valid_to is not null
+                and not exists (
+                    select 1
+                    from map_snapshots s
+                    where s.snapshot_day >= map_changes.valid_from
+                        and s.snapshot_day < map_changes.valid_to
+                );
+            """,
+        )
+
+    return prune, cnx.total_changes - before
+
+
+def vacuum_into(cnx: sqlite3.Connection, path: str) -> None:
+    """Write a compacted copy of the database. Readers and writers are not blocked meanwhile."""
+    if os.path.exists(path):
+        os.remove(path)
+    cnx.execute("vacuum into ?", (path,))
@@ -0,0 +1,87 @@
+-- Fold a full-snapshot map_history (renamed to map_history_full) into
+-- map_snapshots/map_changes. A new version starts whenever a village is new,
+-- reappears after missing a snapshot, or any tracked column differs from the
+-- previous snapshot.
+insert or replace into map_snapshots (snapshot_day, snapshot_at)
+select snapshot_day, max(inserted_at) from map_history_full group by snapshot_day;
+
+insert into map_changes
+with snapshots as (
+    select
+        snapshot_day,
+        lag(snapshot_day) over (order by snapshot_day) as previous_day,
+        lead(snapshot_day) over (order by snapshot_day) as next_day
+    from map_snapshots
+),
+ordered as (
+    select
+        h.*,
+        s.previous_day,
+        lag(h.snapshot_day) over w as village_previous_day,
+        lag(h.x_coordinate) over w as previous_x,
+        lag(h.y_coordinate) over w as previous_y,
+        lag(h.tribe_id) over w as previous_tribe_id,
+        lag(h.village_name) over w as previous_village_name,
+        lag(h.player_id) over w as previous_player_id,
+        lag(h.player_name) over w as previous_player_name,
+        lag(h.alliance_id) over w as previous_alliance_id,
+        lag(h.alliance_tag) over w as previous_alliance_tag,
+        lag(h.population) over w as previous_population,
+        lag(h.capital) over w as previous_capital
+    from map_history_full h
+    join snapshots s on s.snapshot_day = h.snapshot_day
+    window w as (partition by h.village_id order by h.snapshot_day)
+),
+marked as (
+    select
+        *,
+        case
+            when village_previous_day is not previous_day
+                or x_coordinate is not previous_x
+                or y_coordinate is not previous_y
+                or tribe_id is not previous_tribe_id
+                or village_name is not previous_village_name
+                or player_id is not previous_player_id
+                or player_name is not previous_player_name
+                or alliance_id is not previous_alliance_id
+                or alliance_tag is not previous_alliance_tag
+                or population is not previous_population
+                or capital is not previous_capital
+            then 1 else 0
+        end as is_new_version
+    from ordered
+),
+versioned as (
+    select
+        *,
+        sum(is_new_version) over (partition by village_id order by snapshot_day) as version
+    from marked
+),
+versions as (
+    select
+        village_id,
+        version,
+        min(snapshot_day) as valid_from,
+        max(snapshot_day) as last_seen_day
+    from versioned
+    group by village_id, version
+)
+select
+    v.village_id,
+    v.valid_from,
+    s.next_day as valid_to,
+    h.x_coordinate,
+    h.y_coordinate,
+    h.tribe_id,
+    h.village_name,
+    h.player_id,
+    h.player_name,
+    h.alliance_id,
+    h.alliance_tag,
+    h.population,
+    h.capital
+from versions v
+join versioned h on h.village_id = v.village_id and h.snapshot_day = v.valid_from
+join snapshots s on s.snapshot_day = v.last_seen_day;
+
+drop table map_history_full;
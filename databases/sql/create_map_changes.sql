@@ -0,0 +1,52 @@
+-- Delta history: one row per version of a village instead of one per village
+-- per day. A version is valid for every snapshot_day in [valid_from, valid_to);
+-- valid_to is null while the version is current.
+create table if not exists map_snapshots (
+    snapshot_day int primary key,
+    snapshot_at int not null
+);
+
+create table if not exists map_changes (
+    village_id int not null,
+    valid_from int not null,
+    valid_to int,
+    x_coordinate int,
+    y_coordinate int,
+    tribe_id int,
+    village_name varchar,
+    player_id int,
+    player_name varchar,
+    alliance_id int,
+    alliance_tag varchar,
+    population int,
+    capital boolean,
+    primary key (village_id, valid_from)
+) without rowid;
+
+create index if not exists map_changes_open on map_changes (village_id) where valid_to is null;
+create index if not exists map_changes_valid_from on map_changes (valid_from);
+
+-- Reconstructs the full map_history shape, so v_map_history and everything
+-- built on it read delta history without changes
+drop view if exists map_history;
+
+create view map_history as
+select
+    cast(c.x_coordinate as str)||'|'||cast(c.y_coordinate as str)||'@'||cast(s.snapshot_at as str) as id,
+    c.x_coordinate,
+    c.y_coordinate,
+    c.tribe_id,
+    c.village_id,
+    c.village_name,
+    c.player_id,
+    c.player_name,
+    c.alliance_id,
+    c.alliance_tag,
+    c.population,
+    c.capital,
+    s.snapshot_at as inserted_at,
+    s.snapshot_day
+from map_snapshots s
+join map_changes c
+    on c.valid_from <= s.snapshot_day
+    and (c.valid_to is null or c.valid_to > s.snapshot_day);
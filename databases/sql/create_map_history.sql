@@ -0,0 +1,19 @@
+-- One row per village per local calendar day. snapshot_day is days since the
+-- epoch, so reloading a day replaces its rows instead of adding a second copy.
+create table if not exists map_history (
+    id varchar,
+    x_coordinate int,
+    y_coordinate int,
+    tribe_id int,
+    village_id int,
+    village_name varchar,
+    player_id int,
+    player_name varchar,
+    alliance_id int,
+    alliance_tag varchar,
+    population int,
+    capital boolean,
+    inserted_at timestamp,
+    snapshot_day int,
+    primary key (village_id, snapshot_day)
+) without rowid;
@@ -0,0 +1,101 @@
+-- Normalized, STRICT storage for a game server. Names live once in the
+-- dimension tables, keyed by every (id, name) combination seen so history keeps
+-- the names of its day; village_days holds only integers. x_world and
+-- map_history are views over it with the exact columns of the old tables.
+create table if not exists players (
+    player_key integer primary key,
+    player_id integer not null,
+    player_name text not null,
+    unique (player_id, player_name)
+) strict;
+
+create table if not exists alliances (
+    alliance_key integer primary key,
+    alliance_id integer not null,
+    alliance_tag text not null,
+    unique (alliance_id, alliance_tag)
+) strict;
+
+create table if not exists villages (
+    village_key integer primary key,
+    village_id integer not null,
+    x_coordinate integer not null,
+    y_coordinate integer not null,
+    village_name text not null,
+    unique (village_id, x_coordinate, y_coordinate, village_name)
+) strict;
+
+create table if not exists map_snapshots (
+    snapshot_day integer primary key,
+    snapshot_at integer not null
+) strict;
+
+-- Keyed day first: loads, retention and x_world all work a day at a time.
+-- id, region, city, harbor and victory_points are only kept for x_world and
+-- are null on days loaded before normalization.
+create table if not exists village_days (
+    snapshot_day integer not null,
+    village_id integer not null,
+    village_key integer not null,
+    player_key integer not null,
+    alliance_key integer not null,
+    tribe_id integer,
+    population integer not null,
+    capital integer,
+    id integer,
+    region integer,
+    city integer,
+    harbor integer,
+    victory_points integer,
+    primary key (snapshot_day, village_id)
+) strict, without rowid;
+
+drop view if exists x_world;
+
+create view x_world as
+select
+    f.id,
+    v.x_coordinate,
+    v.y_coordinate,
+    f.tribe_id,
+    f.village_id,
+    v.village_name,
+    p.player_id,
+    p.player_name,
+    a.alliance_id,
+    a.alliance_tag,
+    f.population,
+    f.region,
+    f.capital,
+    f.city,
+    f.harbor,
+    f.victory_points
+from village_days f
+join villages v on v.village_key = f.village_key
+join players p on p.player_key = f.player_key
+join alliances a on a.alliance_key = f.alliance_key
+where f.snapshot_day = (select max(snapshot_day) from map_snapshots);
+
+drop view if exists map_history;
+
+create view map_history as
+select
+    cast(v.x_coordinate as str)||'|'||cast(v.y_coordinate as str)||'@'||cast(s.snapshot_at as str) as id,
+    v.x_coordinate,
+    v.y_coordinate,
+    f.tribe_id,
+    f.village_id,
+    v.village_name,
+    p.player_id,
+    p.player_name,
+    a.alliance_id,
+    a.alliance_tag,
+    f.population,
+    f.capital,
+    s.snapshot_at as inserted_at,
+    f.snapshot_day
+from village_days f
+join map_snapshots s on s.snapshot_day = f.snapshot_day
+join villages v on v.village_key = f.village_key
+join players p on p.player_key = f.player_key
+join alliances a on a.alliance_key = f.alliance_key;
@@ -10,5 +10,8 @@ CREATE TABLE IF NOT EXISTS ANALYTICS(
     recorded_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
     success BOOLEAN NOT NULL DEFAULT TRUE,
     error_message TEXT,
-    execution_time_ms INTEGER
+    execution_time_ms INTEGER,
+    -- Parts of execution_time_ms spent on the bot's databases and on Discord's API
+    db_time_ms INTEGER,
+    discord_time_ms INTEGER
 ); 
\ No newline at end of file
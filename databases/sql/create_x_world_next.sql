@@ -1,6 +1,6 @@
-drop table if exists x_world; 
+drop table if exists x_world_next;
 
-create table if not exists x_world (
+create table x_world_next (
     id int,
     x_coordinate int,
     y_coordinate int,
@@ -17,4 +17,4 @@ create table if not exists x_world (
     city int,
     harbor int,
     victory_points int
-);
\ No newline at end of file
+);
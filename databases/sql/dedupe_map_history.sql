@@ -0,0 +1,35 @@
+-- Copy the old x|y@timestamp keyed history (renamed to map_history_old) into the
+-- snapshot-keyed table, keeping only the last load of each local day
+insert or replace into map_history
+with loads as (
+    select
+        inserted_at,
+        snapshot_day,
+        row_number() over (partition by snapshot_day order by inserted_at desc) as load_rank
+    from (
+        select distinct
+            inserted_at,
+            cast(julianday(date(inserted_at, 'unixepoch', 'localtime')) - 2440587.5 as int) as snapshot_day
+        from map_history_old
+    )
+)
+select
+    h.id,
+    h.x_coordinate,
+    h.y_coordinate,
+    h.tribe_id,
+    h.village_id,
+    h.village_name,
+    h.player_id,
+    h.player_name,
+    h.alliance_id,
+    h.alliance_tag,
+    h.population,
+    h.capital,
+    h.inserted_at,
+    l.snapshot_day
+from map_history_old h
+join loads l on l.inserted_at = h.inserted_at and l.load_rank = 1
+where h.village_id is not null;
+
+drop table map_history_old;
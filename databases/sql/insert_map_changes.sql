@@ -0,0 +1,49 @@
+-- Undo an earlier load of the same day, so a rerun replaces it
+delete from map_changes where valid_from = :snapshot_day;
+update map_changes set valid_to = null where valid_to = :snapshot_day;
+
+insert or replace into map_snapshots (snapshot_day, snapshot_at) values (:snapshot_day, :snapshot_at);
+
+-- Close the current version of every village that changed or disappeared
+update map_changes
+set valid_to = :snapshot_day
+where valid_to is null
+    and not exists (
+        select 1
+        from x_world w
+        where w.village_id = map_changes.village_id
+            and w.x_coordinate is map_changes.x_coordinate
+            and w.y_coordinate is map_changes.y_coordinate
+            and w.tribe_id is map_changes.tribe_id
+            and w.village_name is map_changes.village_name
+            and w.player_id is map_changes.player_id
+            and w.player_name is map_changes.player_name
+            and w.alliance_id is map_changes.alliance_id
+            and w.alliance_tag is map_changes.alliance_tag
+            and w.population is map_changes.population
+            and w.capital is map_changes.capital
+    );
+
+-- Open a version for every new or changed village
+insert into map_changes
+select
+    w.village_id,
+    :snapshot_day,
+    null,
+    w.x_coordinate,
+    w.y_coordinate,
+    w.tribe_id,
+    w.village_name,
+    w.player_id,
+    w.player_name,
+    w.alliance_id,
+    w.alliance_tag,
+    w.population,
+    w.capital
+from x_world w
+where not exists (
+    select 1
+    from map_changes c
+    where c.village_id = w.village_id
+        and c.valid_to is null
+);
@@ -1,22 +1,8 @@
-create table if not exists map_history (
-    id varchar primary key not null,
-    x_coordinate int,
-    y_coordinate int,
-    tribe_id int,
-    village_id int,
-    village_name varchar,
-    player_id int,
-    player_name varchar,
-    alliance_id int,
-    alliance_tag varchar,
-    population int,
-    capital boolean,
-    inserted_at timestamp
-);
+delete from map_history where snapshot_day = :snapshot_day;
 
-insert into map_history 
+insert or replace into map_history
     select
-        cast(x_coordinate as str)||'|'||cast(y_coordinate as str)||'@'||cast(unixepoch() as str) as id,
+        cast(x_coordinate as str)||'|'||cast(y_coordinate as str)||'@'||cast(:snapshot_at as str) as id,
         x_coordinate,
         y_coordinate,
         tribe_id,
@@ -28,5 +14,6 @@ insert into map_history
         alliance_tag,
         population,
         capital,
-        unixepoch() as inserted_at 
+        :snapshot_at as inserted_at,
+        :snapshot_day as snapshot_day
     from x_world;
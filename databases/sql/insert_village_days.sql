@@ -0,0 +1,40 @@
+-- Record a freshly loaded x_world_next as the :snapshot_day snapshot,
+-- replacing an earlier load of the same day, then discard the staging table
+insert or ignore into players (player_id, player_name)
+select distinct player_id, player_name from x_world_next;
+
+insert or ignore into alliances (alliance_id, alliance_tag)
+select distinct alliance_id, alliance_tag from x_world_next;
+
+insert or ignore into villages (village_id, x_coordinate, y_coordinate, village_name)
+select distinct village_id, x_coordinate, y_coordinate, village_name from x_world_next;
+
+insert or replace into map_snapshots (snapshot_day, snapshot_at) values (:snapshot_day, :snapshot_at);
+
+delete from village_days where snapshot_day = :snapshot_day;
+
+insert or replace into village_days
+select
+    :snapshot_day,
+    w.village_id,
+    v.village_key,
+    p.player_key,
+    a.alliance_key,
+    w.tribe_id,
+    w.population,
+    w.capital,
+    w.id,
+    w.region,
+    w.city,
+    w.harbor,
+    w.victory_points
+from x_world_next w
+join villages v
+    on v.village_id = w.village_id
+    and v.x_coordinate = w.x_coordinate
+    and v.y_coordinate = w.y_coordinate
+    and v.village_name = w.village_name
+join players p on p.player_id = w.player_id and p.player_name = w.player_name
+join alliances a on a.alliance_id = w.alliance_id and a.alliance_tag = w.alliance_tag;
+
+drop table x_world_next;
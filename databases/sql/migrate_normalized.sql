@@ -0,0 +1,50 @@
+-- Move a full-history server (tables renamed to map_history_old and
+-- x_world_old) into the normalized tables. The newest day takes the columns
+-- map_history never kept from x_world.
+insert or ignore into players (player_id, player_name)
+select player_id, player_name from map_history_old
+union
+select player_id, player_name from x_world_old;
+
+insert or ignore into alliances (alliance_id, alliance_tag)
+select alliance_id, alliance_tag from map_history_old
+union
+select alliance_id, alliance_tag from x_world_old;
+
+insert or ignore into villages (village_id, x_coordinate, y_coordinate, village_name)
+select village_id, x_coordinate, y_coordinate, village_name from map_history_old
+union
+select village_id, x_coordinate, y_coordinate, village_name from x_world_old;
+
+insert or replace into map_snapshots (snapshot_day, snapshot_at)
+select snapshot_day, max(inserted_at) from map_history_old group by snapshot_day;
+
+insert or replace into village_days
+select
+    h.snapshot_day,
+    h.village_id,
+    v.village_key,
+    p.player_key,
+    a.alliance_key,
+    h.tribe_id,
+    h.population,
+    h.capital,
+    w.id,
+    w.region,
+    w.city,
+    w.harbor,
+    w.victory_points
+from map_history_old h
+join villages v
+    on v.village_id = h.village_id
+    and v.x_coordinate = h.x_coordinate
+    and v.y_coordinate = h.y_coordinate
+    and v.village_name = h.village_name
+join players p on p.player_id = h.player_id and p.player_name = h.player_name
+join alliances a on a.alliance_id = h.alliance_id and a.alliance_tag = h.alliance_tag
+left join x_world_old w
+    on w.village_id = h.village_id
+    and h.snapshot_day = (select max(snapshot_day) from map_history_old);
+
+drop table map_history_old;
+drop table x_world_old;
@@ -0,0 +1,27 @@
+-- One row per alliance per day, so history charts are a primary key range read.
+-- Days from :since_day on are recomputed; earlier days are left untouched.
+create table if not exists alliance_daily (
+    alliance_id int not null,
+    snapshot_day int not null,
+    alliance_tag text,
+    population int,
+    villages int,
+    players int,
+    primary key (alliance_id, snapshot_day)
+) without rowid;
+
+create index if not exists alliance_daily_snapshot_day on alliance_daily (snapshot_day);
+
+delete from alliance_daily where snapshot_day >= :since_day;
+
+insert into alliance_daily
+select
+    alliance_id,
+    snapshot_day,
+    max(alliance_tag),
+    sum(population),
+    count(*),
+    count(distinct player_id)
+from map_history
+where snapshot_day >= :since_day
+group by alliance_id, snapshot_day;
@@ -0,0 +1,69 @@
+-- Materialized v_player_change: each player's villages, population and
+-- alliance on the newest day against the day before. Only those two days of
+-- map_history are read, and the table is replaced in one transaction.
+-- update_player_change.sql does this from the table itself when it holds the
+-- day before.
+create table if not exists player_change (
+    player_id int,
+    player_name text,
+    current_alliance_id,
+    previous_alliance_id,
+    current_villages_count int,
+    previous_villages_count int,
+    current_population int,
+    previous_population int,
+    villages_changed int,
+    alliance_changed int,
+    population_change int,
+    created_at text
+);
+
+delete from player_change;
+
+insert into player_change
+WITH date_range AS (
+    SELECT
+        MAX(snapshot_day) AS today,
+        MAX(snapshot_day) - 1 AS yesterday
+    FROM map_history
+),
+player_data AS (
+    SELECT
+        m.player_id,
+        m.player_name,
+        m.alliance_id,
+        m.village_id,
+        m.population,
+        CASE WHEN m.snapshot_day = d.today THEN 'current' ELSE 'previous' END AS data_type
+    FROM map_history m
+    CROSS JOIN date_range d
+    -- A scalar bound rather than d's columns, so snapshot_day is range-searched
+    WHERE m.snapshot_day >= (SELECT MAX(snapshot_day) FROM map_history) - 1
+),
+aggregated_data AS (
+    SELECT
+        player_id,
+        player_name,
+        MAX(CASE WHEN data_type = 'current' THEN alliance_id END) AS current_alliance_id,
+        MAX(CASE WHEN data_type = 'previous' THEN alliance_id END) AS previous_alliance_id,
+        COUNT(DISTINCT CASE WHEN data_type = 'current' THEN village_id END) AS current_villages_count,
+        COUNT(DISTINCT CASE WHEN data_type = 'previous' THEN village_id END) AS previous_villages_count,
+        SUM(CASE WHEN data_type = 'current' THEN population ELSE 0 END) AS current_population,
+        SUM(CASE WHEN data_type = 'previous' THEN population ELSE 0 END) AS previous_population
+    FROM player_data
+    GROUP BY player_id, player_name
+)
+SELECT
+    player_id,
+    player_name,
+    COALESCE(current_alliance_id, 'Unspecified') AS current_alliance_id,
+    COALESCE(previous_alliance_id, 'Unspecified') AS previous_alliance_id,
+    current_villages_count,
+    previous_villages_count,
+    current_population,
+    previous_population,
+    (current_villages_count != previous_villages_count) AS villages_changed,
+    (COALESCE(current_alliance_id, 'Unspecified') != COALESCE(previous_alliance_id, 'Unspecified')) AS alliance_changed,
+    (current_population - previous_population) AS population_change,
+    (SELECT date(today * 86400, 'unixepoch') FROM date_range) AS created_at
+FROM aggregated_data;
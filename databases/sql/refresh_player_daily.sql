@@ -0,0 +1,29 @@
+-- One row per player per day, so history charts are a primary key range read.
+-- Days from :since_day on are recomputed; earlier days are left untouched.
+create table if not exists player_daily (
+    player_id int not null,
+    snapshot_day int not null,
+    player_name text,
+    alliance_id int,
+    alliance_tag text,
+    population int,
+    villages int,
+    primary key (player_id, snapshot_day)
+) without rowid;
+
+create index if not exists player_daily_snapshot_day on player_daily (snapshot_day);
+
+delete from player_daily where snapshot_day >= :since_day;
+
+insert into player_daily
+select
+    player_id,
+    snapshot_day,
+    max(player_name),
+    max(alliance_id),
+    max(alliance_tag),
+    sum(population),
+    count(*)
+from map_history
+where snapshot_day >= :since_day
+group by player_id, snapshot_day;
@@ -0,0 +1,59 @@
+-- Materialized v_seven_day_pop: the newest day's villages with their
+-- population on each of the six days before. Only the last week of
+-- map_history is read, and the table is replaced in one transaction.
+-- update_seven_day_pop.sql does this from the table itself when it holds
+-- the day before.
+create table if not exists seven_day_pop (
+    load_date text,
+    founded text,
+    player_id int,
+    player_name text,
+    village_id int,
+    village_name text,
+    today int,
+    yesterday int,
+    two_days_ago int,
+    three_days_ago int,
+    four_days_ago int,
+    five_days_ago int,
+    six_days_ago int
+);
+
+delete from seven_day_pop;
+
+insert into seven_day_pop
+with week as (
+    select
+        village_id,
+        max(case when snapshot_day = latest.day - 1 then population end) as yesterday,
+        max(case when snapshot_day = latest.day - 2 then population end) as two_days_ago,
+        max(case when snapshot_day = latest.day - 3 then population end) as three_days_ago,
+        max(case when snapshot_day = latest.day - 4 then population end) as four_days_ago,
+        max(case when snapshot_day = latest.day - 5 then population end) as five_days_ago,
+        max(case when snapshot_day = latest.day - 6 then population end) as six_days_ago
+    from map_history
+    -- Scalar subqueries rather than a joined CTE, so the bounds are constants
+    -- the planner can use to range-search snapshot_day
+    cross join (select max(snapshot_day) as day from map_history) latest
+    where snapshot_day between (select max(snapshot_day) from map_history) - 6
+        and (select max(snapshot_day) from map_history) - 1
+    group by village_id
+)
+select
+    date(t.snapshot_day * 86400, 'unixepoch') as load_date,
+    date(f.founded_day * 86400, 'unixepoch') as founded,
+    t.player_id,
+    t.player_name,
+    t.village_id,
+    t.village_name,
+    t.population as today,
+    coalesce(w.yesterday, 0) as yesterday,
+    coalesce(w.two_days_ago, 0) as two_days_ago,
+    coalesce(w.three_days_ago, 0) as three_days_ago,
+    coalesce(w.four_days_ago, 0) as four_days_ago,
+    coalesce(w.five_days_ago, 0) as five_days_ago,
+    coalesce(w.six_days_ago, 0) as six_days_ago
+from map_history t
+left join week w on w.village_id = t.village_id
+left join village_founded f on f.village_id = t.village_id
+where t.snapshot_day = (select max(snapshot_day) from map_history);
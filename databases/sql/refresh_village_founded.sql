@@ -0,0 +1,18 @@
+-- The day each village was first seen, kept separately so it survives
+-- retention pruning the days it was founded on
+create table if not exists village_founded (
+    village_id int primary key,
+    founded_day int not null
+) without rowid;
+
+-- Backfill from the whole history the first time only
+insert or ignore into village_founded
+select village_id, min(snapshot_day)
+from map_history
+where not exists (select 1 from village_founded)
+group by village_id;
+
+insert or ignore into village_founded
+select village_id, snapshot_day
+from map_history
+where snapshot_day = (select max(snapshot_day) from map_history);
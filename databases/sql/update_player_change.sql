@@ -0,0 +1,66 @@
+-- Incremental refresh of player_change, for when it already holds the day
+-- before the newest (:shift = 1) or the newest day itself, reloaded since
+-- (:shift = 0). The day before comes from the table's current (or, when
+-- reloaded, previous) columns, so only the newest day of map_history is read.
+create temp table player_change_next as
+with today as (
+    SELECT
+        player_id,
+        player_name,
+        MAX(alliance_id) AS alliance_id,
+        COUNT(DISTINCT village_id) AS villages_count,
+        SUM(population) AS population
+    FROM map_history
+    WHERE snapshot_day = (SELECT MAX(snapshot_day) FROM map_history)
+    GROUP BY player_id, player_name
+),
+before as (
+    SELECT
+        player_id,
+        player_name,
+        CASE WHEN :shift = 1 THEN current_alliance_id ELSE previous_alliance_id END AS alliance_id,
+        CASE WHEN :shift = 1 THEN current_villages_count ELSE previous_villages_count END AS villages_count,
+        CASE WHEN :shift = 1 THEN current_population ELSE previous_population END AS population
+    FROM player_change
+),
+players as (
+    SELECT player_id, player_name FROM today
+    UNION
+    SELECT player_id, player_name FROM before WHERE villages_count > 0
+),
+aggregated_data AS (
+    SELECT
+        p.player_id,
+        p.player_name,
+        COALESCE(t.alliance_id, 'Unspecified') AS current_alliance_id,
+        COALESCE(b.alliance_id, 'Unspecified') AS previous_alliance_id,
+        COALESCE(t.villages_count, 0) AS current_villages_count,
+        COALESCE(b.villages_count, 0) AS previous_villages_count,
+        COALESCE(t.population, 0) AS current_population,
+        COALESCE(b.population, 0) AS previous_population
+    FROM players p
+    LEFT JOIN today t ON t.player_id = p.player_id AND t.player_name IS p.player_name
+    LEFT JOIN before b
+        ON b.player_id = p.player_id AND b.player_name IS p.player_name AND b.villages_count > 0
+)
+SELECT
+    player_id,
+    player_name,
+    current_alliance_id,
+    previous_alliance_id,
+    current_villages_count,
+    previous_villages_count,
+    current_population,
+    previous_population,
+    (current_villages_count != previous_villages_count) AS villages_changed,
+    (current_alliance_id != previous_alliance_id) AS alliance_changed,
+    (current_population - previous_population) AS population_change,
+    (SELECT date(MAX(snapshot_day) * 86400, 'unixepoch') FROM map_history) AS created_at
+FROM aggregated_data;
+
+delete from player_change;
+
+insert into player_change
+select * from temp.player_change_next;
+
+drop table temp.player_change_next;
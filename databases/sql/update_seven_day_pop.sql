@@ -0,0 +1,83 @@
+-- Incremental refresh of seven_day_pop, for when it already holds the day
+-- before the newest (:shift = 1) or the newest day itself, reloaded since
+-- (:shift = 0). Each village's older days come from its row, moved back a day
+-- when :shift is 1, so only the newest day of map_history is read, plus the
+-- week of the villages seven_day_pop has no row for.
+create index if not exists seven_day_pop_village_id on seven_day_pop (village_id);
+
+create temp table seven_day_pop_next as
+with newest as (
+    select *
+    from map_history
+    where snapshot_day = (select max(snapshot_day) from map_history)
+),
+-- Villages new today or back after missing the previous load
+week as (
+    select
+        village_id,
+        max(case when snapshot_day = latest.day - 1 then population end) as yesterday,
+        max(case when snapshot_day = latest.day - 2 then population end) as two_days_ago,
+        max(case when snapshot_day = latest.day - 3 then population end) as three_days_ago,
+        max(case when snapshot_day = latest.day - 4 then population end) as four_days_ago,
+        max(case when snapshot_day = latest.day - 5 then population end) as five_days_ago,
+        max(case when snapshot_day = latest.day - 6 then population end) as six_days_ago
+    from map_history
+    cross join (select max(snapshot_day) as day from map_history) latest
+    where village_id in (
+            select village_id from newest
+            except
+            select village_id from seven_day_pop
+        )
+        and snapshot_day between (select max(snapshot_day) from map_history) - 6
+            and (select max(snapshot_day) from map_history) - 1
+    group by village_id
+)
+select
+    date(n.snapshot_day * 86400, 'unixepoch') as load_date,
+    date(f.founded_day * 86400, 'unixepoch') as founded,
+    n.player_id,
+    n.player_name,
+    n.village_id,
+    n.village_name,
+    n.population as today,
+    case
+        when o.village_id is null then coalesce(w.yesterday, 0)
+        when :shift = 1 then o.today
+        else o.yesterday
+    end as yesterday,
+    case
+        when o.village_id is null then coalesce(w.two_days_ago, 0)
+        when :shift = 1 then o.yesterday
+        else o.two_days_ago
+    end as two_days_ago,
+    case
+        when o.village_id is null then coalesce(w.three_days_ago, 0)
+        when :shift = 1 then o.two_days_ago
+        else o.three_days_ago
+    end as three_days_ago,
+    case
+        when o.village_id is null then coalesce(w.four_days_ago, 0)
+        when :shift = 1 then o.three_days_ago
+        else o.four_days_ago
+    end as four_days_ago,
+    case
+        when o.village_id is null then coalesce(w.five_days_ago, 0)
+        when :shift = 1 then o.four_days_ago
+        else o.five_days_ago
+    end as five_days_ago,
+    case
+        when o.village_id is null then coalesce(w.six_days_ago, 0)
+        when :shift = 1 then o.five_days_ago
+        else o.six_days_ago
+    end as six_days_ago
+from newest n
+left join seven_day_pop o on o.village_id = n.village_id
+left join week w on w.village_id = n.village_id
+left join village_founded f on f.village_id = n.village_id;
+
+delete from seven_day_pop;
+
+insert into seven_day_pop
+select * from temp.seven_day_pop_next;
+
+drop table temp.seven_day_pop_next;
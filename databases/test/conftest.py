@@ -0,0 +1,78 @@
+import threading
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+
+def _map_sql_lines(villages: int):
+    """Lazily generate a map.sql dump, one village per line"""
+    for village_id in range(1, villages + 1):
+        player_id = village_id // 6 + 1
+        alliance_id = player_id % 40
+        yield (
+            "INSERT INTO `x_world` VALUES "
+            f"({village_id},{village_id % 401 - 200},{village_id // 401 % 401 - 200},{player_id % 3 + 1},"
+            f"{village_id},'Village {village_id}',{player_id},'Player {player_id}',{alliance_id},"
+            f"'{f'A{alliance_id}' if alliance_id else ''}',{village_id % 900 + 2},NULL,FALSE,NULL,NULL,NULL);\n"
+        )
+
+
+class MapSqlHandler(BaseHTTPRequestHandler):
+    """Serves a generated map.sql as a gzip-encoded, chunked response"""
+
+    protocol_version = "HTTP/1.1"
+    villages = 0
+
+    def _write_chunk(self, data: bytes):
+        if data:
+            self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+
+    def do_GET(self):
+        if self.path != "/map.sql":
+            self.send_error(404)
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain")
+        self.send_header("Content-Encoding", "gzip")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        compressor = zlib.compressobj(wbits=31)
+        buffer = []
+        for line in _map_sql_lines(self.villages):
+            buffer.append(line)
+            if len(buffer) == 1000:
+                self._write_chunk(compressor.compress("".join(buffer).encode()))
+                buffer.clear()
+        self._write_chunk(compressor.compress("".join(buffer).encode()))
+        self._write_chunk(compressor.flush())
+        self.wfile.write(b"0\r\n\r\n")
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture(scope="session")
+def map_sql_lines():
+    return _map_sql_lines
+
+
+@pytest.fixture
+def map_sql_server():
+    """Start a local stand-in for a game server. Yields a function taking a village count."""
+    servers = []
+
+    def start(villages: int) -> str:
+        handler = type("Handler", (MapSqlHandler,), {"villages": villages})
+        server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return f"http://127.0.0.1:{server.server_address[1]}"
+
+    yield start
+
+    for server in servers:
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,142 @@
+import os
+import sqlite3
+import threading
+
+import pytest
+
+from backup import backup, backup_db, latest_backup, read_manifest, restore, sha256
+from connection import connect
+from generate import read_create_x_world_next
+from ingest import load_x_world
+
+
+@pytest.fixture
+def servers(tmp_path, map_sql_lines):
+    """Two generated game servers and a bot server, laid out like the databases directory"""
+    (tmp_path / "game_servers").mkdir()
+    (tmp_path / "bot_servers").mkdir()
+    dbs = []
+    for nick, villages in [("am3", 600), ("eu2", 300)]:
+        db = str(tmp_path / "game_servers" / f"{nick}.db")
+        cnx = connect(db)
+        load_x_world(cnx, map_sql_lines(villages), read_create_x_world_next())
+        cnx.close()
+        dbs.append(db)
+    db = str(tmp_path / "bot_servers" / "1234.db")
+    cnx = connect(db)
+    cnx.execute("create table hammers (ign text)")
+    cnx.execute("insert into hammers values ('kikkes')")
+    cnx.commit()
+    cnx.close()
+    return dbs + [db]
+
+
+def villages(db: str) -> int:
+    cnx = sqlite3.connect(db)
+    count = cnx.execute("select count(*) from x_world").fetchone()[0]
+    cnx.close()
+    return count
+
+
+class TestBackup:
+    @pytest.mark.parametrize("workers", [1, 2])
+    def test_backs_up_every_database_with_a_manifest(self, servers, tmp_path, workers):
+        directory = backup(servers, str(tmp_path / "backups"), workers=workers)
+
+        manifest = read_manifest(directory)
+        assert [entry["db"] for entry in manifest["databases"]] == servers
+        assert [entry["backup"] for entry in manifest["databases"]] == [
+            os.path.join("game_servers", "am3.db"),
+            os.path.join("game_servers", "eu2.db"),
+            os.path.join("bot_servers", "1234.db"),
+        ]
+        for entry in manifest["databases"]:
+            path = os.path.join(directory, entry["backup"])
+            assert entry["error"] is None
+            assert entry["sha256"] == sha256(path)
+            assert entry["bytes"] == os.path.getsize(path)
+        assert villages(os.path.join(directory, "game_servers", "am3.db")) == 600
+        assert latest_backup(str(tmp_path / "backups")) == directory
+
+    def test_missing_database_does_not_stop_the_rest(self, servers, tmp_path):
+        dbs = [servers[0], str(tmp_path / "game_servers" / "gone.db"), servers[1]]
+
+        directory = backup(dbs, str(tmp_path / "backups"), workers=2)
+
+        entries = read_manifest(directory)["databases"]
+        assert [bool(entry["error"]) for entry in entries] == [False, True, False]
+        assert not os.path.exists(os.path.join(directory, "game_servers", "gone.db"))
+
+    def test_backup_finishes_with_a_consistent_snapshot_while_written(self, tmp_path):
+        db = str(tmp_path / "live.db")
+        cnx = connect(db)
+        cnx.execute("create table ledger (amount integer, padding blob)")
+        cnx.executemany(
+            "insert into ledger values (?, randomblob(2000))", [(1,), (-1,)] * 2000
+        )
+        cnx.commit()
+        stop = threading.Event()
+
+        def write():
+            # Restarts the paged copy after nearly every step. Every
+            # transaction keeps the ledger balanced.
+            writer = connect(db)
+            while not stop.is_set():
+                with writer:
+                    writer.executemany(
+                        "insert into ledger values (?, randomblob(2000))", [(5,), (-5,)]
+                    )
+            writer.close()
+
+        thread = threading.Thread(target=write)
+        thread.start()
+        try:
+            result = backup_db(db, str(tmp_path / "copy.db"), pages=16)
+        finally:
+            stop.set()
+            thread.join()
+
+        assert result["error"] is None
+        copy = sqlite3.connect(result["backup"])
+        assert copy.execute(
+            "select sum(amount), count(*) % 2 from ledger"
+        ).fetchone() == (0, 0)
+        assert copy.execute("pragma journal_mode").fetchone()[0] == "delete"
+
+
+class TestRestore:
+    def test_restores_over_changed_databases(self, servers, tmp_path):
+        directory = backup(servers, str(tmp_path / "backups"))
+        cnx = connect(servers[0])
+        cnx.execute("delete from x_world")
+        cnx.commit()
+        # A connection open through the restore sees the restored rows afterwards
+        reader = connect(servers[0], read_only=True)
+
+        results = restore(directory, target_dir=str(tmp_path), workers=2)
+
+        assert [result["error"] for result in results] == [None] * 3
+        assert reader.execute("select count(*) from x_world").fetchone()[0] == 600
+        assert villages(servers[0]) == 600
+
+    def test_only_restores_the_databases_asked_for(self, servers, tmp_path):
+        directory = backup(servers, str(tmp_path / "backups"))
+        restore_dir = tmp_path / "restored"
+
+        results = restore(directory, dbs=[servers[1]], target_dir=str(restore_dir))
+
+        assert [result["db"] for result in results] == [servers[1]]
+        assert os.listdir(restore_dir / "game_servers") == ["eu2.db"]
+
+    def test_corrupt_backup_is_not_restored(self, servers, tmp_path):
+        directory = backup(servers, str(tmp_path / "backups"))
+        with open(os.path.join(directory, "game_servers", "am3.db"), "r+b") as copy:
+            copy.seek(8192)
+            copy.write(b"torn")
+        restore_dir = tmp_path / "restored"
+
+        results = restore(directory, target_dir=str(restore_dir))
+
+        assert "Checksum mismatch" in results[0]["error"]
+        assert not (restore_dir / "game_servers" / "am3.db").exists()
+        assert results[1]["error"] is None and results[2]["error"] is None
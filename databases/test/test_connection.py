@@ -0,0 +1,53 @@
+import os
+import sqlite3
+
+import pytest
+
+from connection import checkpoint, connect
+
+
+class TestConnect:
+    def test_applies_profile(self, tmp_path):
+        cnx = connect(str(tmp_path / "server.db"))
+
+        assert cnx.execute("pragma journal_mode").fetchone() == ("wal",)
+        assert cnx.execute("pragma synchronous").fetchone() == (1,)
+        assert cnx.execute("pragma temp_store").fetchone() == (2,)
+
+    def test_read_only_refuses_writes(self, tmp_path):
+        path = str(tmp_path / "server.db")
+        connect(path).execute("create table x_world (id int)")
+
+        reader = connect(path, read_only=True)
+
+        with pytest.raises(sqlite3.OperationalError):
+            reader.execute("insert into x_world values (1)")
+
+    def test_readers_see_last_commit_during_a_write(self, tmp_path):
+        path = str(tmp_path / "server.db")
+        writer = connect(path)
+        writer.execute("create table x_world (id int)")
+        writer.execute("insert into x_world values (1)")
+        writer.commit()
+        reader = connect(path, read_only=True)
+
+        writer.execute("begin immediate")
+        writer.execute("insert into x_world values (2)")
+
+        assert reader.execute("select count(*) from x_world").fetchone() == (1,)
+        writer.execute("commit")
+        assert reader.execute("select count(*) from x_world").fetchone() == (2,)
+
+    def test_checkpoint_truncates_wal(self, tmp_path):
+        path = str(tmp_path / "server.db")
+        cnx = connect(path)
+        cnx.execute("pragma wal_autocheckpoint = 0")
+        cnx.execute("create table x_world (id int)")
+        cnx.executemany("insert into x_world values (?)", ((i,) for i in range(10000)))
+        cnx.commit()
+        assert os.path.getsize(path + "-wal") > 0
+
+        busy, log, checkpointed = checkpoint(cnx)
+
+        assert not busy and log == checkpointed
+        assert os.path.getsize(path + "-wal") == 0
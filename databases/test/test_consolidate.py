@@ -0,0 +1,103 @@
+import sqlite3
+
+import pytest
+
+from consolidate import consolidate
+from migrate import load_migrations, migrate_db
+from test_migrate import unpartitioned_bot_db
+
+
+def guild_db(tmp_path, guild_id: int, calls: int = 2) -> str:
+    """A migrated guild database with a hammer report and defense calls with threads and submissions"""
+    db = unpartitioned_bot_db(tmp_path / f"{guild_id}.db")
+    cnx = sqlite3.connect(db)
+    cnx.execute(
+        "insert into HAMMERS (IGN, LINK, COORDINATES, TIMESTAMP) values (?, 'link', '1|1', current_timestamp)",
+        (f"player {guild_id}",),
+    )
+    for call in range(1, calls + 1):
+        cnx.execute(
+            "insert into DEFENSE_CALLS (created_by_id, event_id, created_by_name, land_time, "
+            "x_coordinate, y_coordinate, amount_requested, created_at) "
+            "values (1, ?, 'anvil', current_timestamp, 1, 1, 1000, current_timestamp)",
+            (guild_id * 100 + call,),
+        )
+        cnx.execute(
+            "insert into DEFENSE_THREADS (id, defense_call_id, name, jump_url) values (?, ?, 'cfd', 'url')",
+            (guild_id * 100 + call, call),
+        )
+        cnx.execute(
+            "insert into SUBMITTED_DEFENSE (defense_call_id, submitted_by_id, submitted_by_name, amount_submitted) "
+            "values (?, 1, 'anvil', ?)",
+            (call, call * 10),
+        )
+    cnx.commit()
+    cnx.close()
+    migrate_db(db, load_migrations())
+    return db
+
+
+class TestConsolidate:
+    def test_folds_every_guild_keeping_references(self, tmp_path):
+        dbs = [guild_db(tmp_path, guild_id) for guild_id in (1001, 1002, 1003)]
+        target = str(tmp_path / "consolidated.db")
+
+        results = consolidate(dbs, target)
+
+        assert [result["error"] for result in results] == [None] * 3
+        assert [result["rows"] for result in results] == [7] * 3
+        cnx = sqlite3.connect(target)
+        assert cnx.execute(
+            "select guild_id, count(*) from HAMMERS group by 1 order by 1"
+        ).fetchall() == [(1001, 1), (1002, 1), (1003, 1)]
+        # Every thread and submission still points at its own guild's call
+        assert cnx.execute(
+            "select dt.guild_id, dc.event_id - dt.id from DEFENSE_THREADS dt "
+            "join DEFENSE_CALLS dc on dc.id = dt.defense_call_id"
+        ).fetchall() == [
+            (guild_id, 0) for guild_id in (1001, 1001, 1002, 1002, 1003, 1003)
+        ]
+        assert (
+            cnx.execute(
+                "select count(*) from SUBMITTED_DEFENSE sd "
+                "join DEFENSE_CALLS dc on dc.id = sd.defense_call_id and dc.guild_id = sd.guild_id"
+            ).fetchone()[0]
+            == 6
+        )
+
+    def test_rerun_skips_guilds_already_folded(self, tmp_path):
+        db = guild_db(tmp_path, 1001)
+        target = str(tmp_path / "consolidated.db")
+        consolidate([db], target)
+
+        (result,) = consolidate([db], target)
+
+        assert result["skipped"] and result["rows"] == 0
+        cnx = sqlite3.connect(target)
+        assert cnx.execute("select count(*) from DEFENSE_CALLS").fetchone()[0] == 2
+
+    def test_unmigrated_guild_fails_without_stopping_the_rest(self, tmp_path):
+        unmigrated = unpartitioned_bot_db(tmp_path / "1002.db")
+        dbs = [guild_db(tmp_path, 1001), unmigrated, guild_db(tmp_path, 1003)]
+
+        results = consolidate(dbs, str(tmp_path / "consolidated.db"))
+
+        assert [bool(result["error"]) for result in results] == [False, True, False]
+        assert "manage.py migrate" in results[1]["error"]
+
+    def test_new_ids_follow_the_largest_existing_id(self, tmp_path):
+        target = str(tmp_path / "consolidated.db")
+        consolidate([guild_db(tmp_path, 1001, calls=3)], target)
+        consolidate([guild_db(tmp_path, 1002, calls=1)], target)
+
+        cnx = sqlite3.connect(target)
+        assert cnx.execute(
+            "select guild_id, id from DEFENSE_CALLS order by id"
+        ).fetchall() == [(1001, 1), (1001, 2), (1001, 3), (1002, 4)]
+
+    def test_pending_migrations_on_the_target_stop_the_fold(self, tmp_path):
+        target = tmp_path / "consolidated.db"
+        sqlite3.connect(target).close()
+
+        with pytest.raises(ValueError):
+            consolidate([guild_db(tmp_path, 1001)], str(target))
@@ -0,0 +1,181 @@
+import sqlite3
+
+from generate import (
+    SCHEMAS,
+    GuildConfig,
+    World,
+    WorldConfig,
+    analytics,
+    bot_server,
+    fill_guild,
+    game_server,
+    guild_ids,
+    read_create_x_world_next,
+)
+from ingest import load_x_world
+
+# Busier than the defaults, so a day or two shows every kind of change
+SMALL = WorldConfig(
+    villages=600,
+    settle_rate=0.02,
+    conquest_rate=0.02,
+    deletion_rate=0.02,
+    alliance_change_rate=0.05,
+)
+GUILD = GuildConfig(
+    hammers=100, players=20, defense_calls=10, raid_players=3, raid_hours=24
+)
+
+
+def villages(world: World) -> dict:
+    return {
+        village_id: tuple(village) for village_id, village in world.villages.items()
+    }
+
+
+class TestWorld:
+    def test_same_seed_same_world(self):
+        first, second = World(SMALL), World(SMALL)
+        for _ in range(3):
+            first.advance()
+            second.advance()
+
+        assert first.map_sql() == second.map_sql()
+        assert World(SMALL._replace(seed=2)).map_sql() != World(SMALL).map_sql()
+
+    def test_map_sql_loads_like_a_real_dump(self):
+        world = World(SMALL)
+        cnx = sqlite3.connect(":memory:")
+
+        records = load_x_world(cnx, world.map_sql_lines(), read_create_x_world_next())
+
+        assert records == len(world.villages) == 600
+        assert (
+            cnx.execute(
+                "select count(distinct x_coordinate || '|' || y_coordinate) from x_world"
+            ).fetchone()[0]
+            == 600
+        )
+        assert (
+            cnx.execute(
+                "select count(*) from x_world where player_name = 'Natars' and tribe_id = 5"
+            ).fetchone()[0]
+            > 0
+        )
+        assert (
+            cnx.execute(
+                "select count(*) from x_world where player_name like '%''%'"
+            ).fetchone()[0]
+            > 0
+        )
+        # Every player has exactly one capital
+        assert cnx.execute(
+            "select count(*) from (select player_id from x_world group by 1 having sum(capital) != 1)"
+        ).fetchone() == (0,)
+
+    def test_advance_grows_settles_conquers_and_deletes(self):
+        world = World(SMALL)
+        before = villages(world)
+        players = set(world.players)
+        alliances = {
+            player_id: player[1] for player_id, player in world.players.items()
+        }
+
+        world.advance()
+
+        after = villages(world)
+        assert set(after) - set(before), "no villages founded"
+        assert set(before) - set(after), "no villages deleted"
+        assert players - set(world.players), "no players deleted"
+        kept = set(before) & set(after)
+        assert any(after[v][4] != before[v][4] for v in kept), "no villages conquered"
+        assert sum(after[v][5] for v in kept) > sum(before[v][5] for v in kept)
+        assert any(world.players[p][1] != alliances[p] for p in world.players), (
+            "no alliance changes"
+        )
+
+
+class TestGameServer:
+    def test_every_schema_records_the_same_history(self):
+        histories = {}
+        for schema in SCHEMAS:
+            cnx = sqlite3.connect(":memory:")
+            game_server(cnx, SMALL, days=4, schema=schema)
+            histories[schema] = cnx.execute(
+                "select snapshot_day, count(*), sum(population), count(distinct player_id) "
+                "from map_history group by 1 order by 1"
+            ).fetchall()
+
+        assert len(histories["snapshot"]) == 4
+        assert histories["delta"] == histories["snapshot"]
+        assert histories["normalized"] == histories["snapshot"]
+
+    def test_loaded_like_load_py(self):
+        cnx = sqlite3.connect(":memory:")
+
+        world = game_server(cnx, SMALL, days=2)
+
+        assert cnx.execute("select count(*) from x_world").fetchone()[0] == len(
+            world.villages
+        )
+        assert cnx.execute("select count(*) from player_daily").fetchone()[0] > 0
+        assert cnx.execute(
+            "select count(*) from sqlite_master where name = 'x_world_coordinates'"
+        ).fetchone() == (1,)
+
+
+class TestBotServer:
+    def test_guild_rows_are_the_same_in_any_database(self):
+        guilds = guild_ids(3)
+        consolidated = sqlite3.connect(":memory:")
+        bot_server(consolidated, guilds, GUILD)
+        single = sqlite3.connect(":memory:")
+        bot_server(single, guilds[1:2], GUILD)
+
+        query = (
+            "select ign, link, timestamp from hammers where guild_id = ? order by 1, 2"
+        )
+        assert (
+            consolidated.execute(query, (guilds[1],)).fetchall()
+            == single.execute(query, (guilds[1],)).fetchall()
+        )
+        assert consolidated.execute(
+            "select count(distinct guild_id), count(*) from hammers"
+        ).fetchone() == (3, 300)
+        assert consolidated.execute(
+            "select count(*) from defense_threads"
+        ).fetchone() == (30,)
+        assert consolidated.execute(
+            "select count(*) from raid_tracking"
+        ).fetchone() == (3 * 3 * 24,)
+        # Submissions add up to what each call shows as submitted
+        assert consolidated.execute(
+            "select count(*) from defense_calls dc where amount_submitted != "
+            "(select coalesce(sum(amount_submitted), 0) from submitted_defense sd where sd.defense_call_id = dc.id)"
+        ).fetchone() == (0,)
+
+    def test_reports_name_the_players_given(self):
+        cnx = sqlite3.connect(":memory:")
+        bot_server(cnx, guild_ids(1), GUILD)
+        world = World(SMALL)
+        names = [player[0] for player in world.players.values()]
+
+        fill_guild(cnx, 1, GUILD, players=names)
+
+        reported = {
+            ign for (ign,) in cnx.execute("select ign from hammers where guild_id = 1")
+        }
+        assert reported <= set(names)
+
+    def test_analytics(self):
+        cnx = sqlite3.connect(":memory:")
+
+        analytics(cnx, 1000, guild_ids(5))
+
+        assert cnx.execute(
+            "select count(*), count(distinct discord_server_id) from analytics"
+        ).fetchone() == (1000, 5)
+
+    def test_guild_ids_are_snowflakes(self):
+        assert guild_ids(10) == guild_ids(10)
+        assert all(10**17 <= guild_id < 10**18 for guild_id in guild_ids(10))
@@ -0,0 +1,197 @@
+import glob
+import sqlite3
+
+import pytest
+
+from generate import DAY, START, load_history, read_create_x_world_next, village_line
+from history import (
+    convert_to_delta,
+    dedupe_map_history,
+    needs_dedupe,
+    record_changes,
+    record_snapshot,
+    uses_delta_history,
+)
+from history import snapshot_day
+from ingest import load_x_world
+from materialize import refresh_materialized
+
+
+def snapshots():
+    """Four days of a small world with a few changes between each"""
+    world = {village_id: village_line(village_id) for village_id in range(1, 51)}
+    yield list(world.values())
+
+    world[2] = village_line(2, population=140)
+    world[4] = village_line(4, player_id=7)
+    del world[3]
+    world[51] = village_line(51, population=2)
+    yield list(world.values())
+
+    world[3] = village_line(3)
+    world[5] = village_line(5, alliance_tag="ROME")
+    yield list(world.values())
+
+    world[52] = village_line(52, population=2)
+    yield list(world.values())
+
+
+def load_full(cnx):
+    load_history(cnx, snapshots())
+
+
+def load_delta(cnx):
+    load_history(cnx, snapshots(), "delta")
+
+
+def history(cnx):
+    return cnx.execute(
+        "select * from map_history order by inserted_at, village_id"
+    ).fetchall()
+
+
+class TestDeltaHistory:
+    def test_reconstructs_full_history(self):
+        full = sqlite3.connect(":memory:")
+        load_full(full)
+        delta = sqlite3.connect(":memory:")
+        load_delta(delta)
+
+        assert uses_delta_history(delta) and not uses_delta_history(full)
+        assert history(delta) == history(full)
+
+    def test_stores_only_changes(self):
+        cnx = sqlite3.connect(":memory:")
+        load_delta(cnx)
+
+        # 50 initial villages, then 2 changes + 1 new, then 1 reappearance + 1 change, then 1 new
+        assert cnx.execute("select count(*) from map_changes").fetchone()[0] == 56
+        first_day = snapshot_day(START)
+        assert cnx.execute(
+            "select valid_from, valid_to from map_changes where village_id = 3 order by valid_from"
+        ).fetchall() == [(first_day, first_day + 1), (first_day + 2, None)]
+
+    def test_unchanged_snapshot_writes_one_row(self):
+        cnx = sqlite3.connect(":memory:")
+        load_delta(cnx)
+        lines = list(snapshots())[-1]
+        load_x_world(cnx, lines, read_create_x_world_next())
+
+        assert record_changes(cnx, snapshot_at=START + 4 * DAY) == 1
+
+    def test_convert_existing_history(self):
+        full = sqlite3.connect(":memory:")
+        load_full(full)
+        expected = history(full)
+
+        convert_to_delta(full)
+
+        assert uses_delta_history(full)
+        assert history(full) == expected
+        assert full.execute("select count(*) from map_changes").fetchone()[0] == 56
+
+    @pytest.mark.parametrize(
+        "view",
+        ["v_map_history", "v_new_villages", "v_player_change", "v_seven_day_pop"],
+    )
+    def test_views_match_full_history(self, view):
+        results = []
+        for loader in [load_full, load_delta]:
+            cnx = sqlite3.connect(":memory:")
+            loader(cnx)
+            for view_path in sorted(glob.glob("game_servers/views/*.sql")):
+                cnx.executescript(open(view_path).read())
+            refresh_materialized(cnx)
+            results.append(
+                sorted(cnx.execute(f"select * from {view}").fetchall(), key=repr)
+            )
+
+        assert results[0] == results[1]
+        assert results[0]
+
+
+OLD_MAP_HISTORY = """
+create table map_history (
+    id varchar primary key not null,
+    x_coordinate int,
+    y_coordinate int,
+    tribe_id int,
+    village_id int,
+    village_name varchar,
+    player_id int,
+    player_name varchar,
+    alliance_id int,
+    alliance_tag varchar,
+    population int,
+    capital boolean,
+    inserted_at timestamp
+);
+"""
+
+
+def load_old_schema(cnx, loads):
+    """Reproduce the x|y@unixepoch() history written before snapshot keys"""
+    cnx.executescript(OLD_MAP_HISTORY)
+    for snapshot_at, lines in loads:
+        load_x_world(cnx, lines, read_create_x_world_next())
+        cnx.execute(
+            "insert into map_history select cast(x_coordinate as str)||'|'||cast(y_coordinate as str)||'@'||?, "
+            "x_coordinate, y_coordinate, tribe_id, village_id, village_name, player_id, player_name, "
+            "alliance_id, alliance_tag, population, capital, ? from x_world",
+            (snapshot_at, snapshot_at),
+        )
+    cnx.commit()
+
+
+class TestIdempotentHistory:
+    @pytest.mark.parametrize("loader", [load_full, load_delta])
+    def test_rerun_replaces_the_day(self, loader):
+        once = sqlite3.connect(":memory:")
+        loader(once)
+        twice = sqlite3.connect(":memory:")
+        loader(twice)
+
+        # A retry later on the last day, after a village grew again
+        lines = list(snapshots())[-1]
+        lines[0] = village_line(1, population=500)
+        load_x_world(twice, lines, read_create_x_world_next())
+        rerun_at = START + 3 * DAY + 60
+        if uses_delta_history(twice):
+            record_changes(twice, snapshot_at=rerun_at)
+        else:
+            record_snapshot(twice, snapshot_at=rerun_at)
+
+        query = "select village_id, population from map_history where snapshot_day = ?"
+        last_day = snapshot_day(START + 3 * DAY)
+        expected = dict(once.execute(query, (last_day,)).fetchall())
+        expected[1] = 500
+        assert dict(twice.execute(query, (last_day,)).fetchall()) == expected
+        assert len(history(twice)) == len(history(once))
+
+    def test_dedupe_keeps_last_load_of_each_day(self):
+        days = list(snapshots())
+        cnx = sqlite3.connect(":memory:")
+        load_old_schema(
+            cnx, [(START, days[0]), (START + 60, days[1]), (START + DAY, days[2])]
+        )
+
+        assert needs_dedupe(cnx)
+        before, after = dedupe_map_history(cnx)
+
+        assert not needs_dedupe(cnx)
+        assert (before, after) == (50 + 50 + 51, 50 + 51)
+        assert cnx.execute(
+            "select distinct inserted_at from map_history order by 1"
+        ).fetchall() == [(START + 60,), (START + DAY,)]
+
+    def test_record_snapshot_migrates_old_schema(self):
+        days = list(snapshots())
+        cnx = sqlite3.connect(":memory:")
+        load_old_schema(cnx, [(START, days[0]), (START + 60, days[0])])
+
+        load_x_world(cnx, days[1], read_create_x_world_next())
+        record_snapshot(cnx, snapshot_at=START + DAY)
+
+        assert cnx.execute(
+            "select snapshot_day, count(*) from map_history group by 1 order by 1"
+        ).fetchall() == [(snapshot_day(START), 50), (snapshot_day(START) + 1, 50)]
@@ -0,0 +1,96 @@
+import glob
+import sqlite3
+
+from generate import read_create_x_world_next
+from history import record_snapshot
+from indexes import (
+    BOT_SERVER_INDEXES,
+    BOT_SERVER_QUERIES,
+    GAME_SERVER_INDEXES,
+    GAME_SERVER_QUERIES,
+    NORMALIZED_INDEXES,
+    X_WORLD_INDEXES,
+    Index,
+    ensure_indexes,
+    query_plan,
+)
+from ingest import load_x_world
+from materialize import refresh_materialized
+
+
+def game_server(map_sql_lines):
+    cnx = sqlite3.connect(":memory:")
+    load_x_world(cnx, map_sql_lines(600), read_create_x_world_next())
+    record_snapshot(cnx, snapshot_at=1_700_000_000)
+    for view_path in glob.glob("game_servers/views/*.sql"):
+        cnx.executescript(open(view_path).read())
+    refresh_materialized(cnx)
+    return cnx
+
+
+def bot_server():
+    cnx = sqlite3.connect(":memory:")
+    for sql_path in sorted(glob.glob("../bot/sql/create_table_*.sql")):
+        cnx.executescript(open(sql_path).read())
+    return cnx
+
+
+class TestEnsureIndexes:
+    def test_game_server_queries_use_indexes(self, map_sql_lines):
+        cnx = game_server(map_sql_lines)
+        # Drop the x_world indexes built during the swap, as on an older database
+        for index in X_WORLD_INDEXES:
+            cnx.execute(f"drop index {index.name}")
+
+        created, plans = ensure_indexes(cnx, GAME_SERVER_INDEXES, GAME_SERVER_QUERIES)
+
+        assert created == [
+            index.name
+            for index in GAME_SERVER_INDEXES
+            if index not in NORMALIZED_INDEXES
+        ]
+        for label, (before, after) in plans.items():
+            assert before != after, label
+            assert "INDEX" in after, label
+
+    def test_bot_server_queries_use_indexes(self):
+        cnx = bot_server()
+
+        created, plans = ensure_indexes(cnx, BOT_SERVER_INDEXES, BOT_SERVER_QUERIES)
+
+        assert created == [index.name for index in BOT_SERVER_INDEXES]
+        assert "hammers_guild_lower_ign" in plans["hammer lookup"][1]
+        assert "defense_calls_guild_land_time" in plans["open defense calls"][1]
+        assert "submitted_defense_guild_submitter" in plans["defense leaderboard"][1]
+        assert "raid_tracking_guild_player" in plans["raid history"][1]
+
+    def test_new_bot_servers_get_the_bot_server_indexes(self):
+        cnx = bot_server()
+        cnx.executescript(open("../bot/sql/create_guild_indexes.sql").read())
+
+        created, _ = ensure_indexes(cnx, BOT_SERVER_INDEXES)
+
+        assert created == []
+
+    def test_idempotent(self, map_sql_lines):
+        cnx = game_server(map_sql_lines)
+        ensure_indexes(cnx, GAME_SERVER_INDEXES)
+
+        created, _ = ensure_indexes(cnx, GAME_SERVER_INDEXES)
+
+        assert created == []
+
+    def test_skips_missing_tables(self):
+        cnx = sqlite3.connect(":memory:")
+        # Delta-history servers have a map_history view instead of a table
+        cnx.execute("create view map_history as select 1 as player_id")
+
+        created, plans = ensure_indexes(
+            cnx,
+            [Index("map_history_player", "map_history", "player_id")],
+            {"q": "select * from nowhere"},
+        )
+
+        assert created == []
+        assert plans == {"q": ("", "")}
+        assert query_plan(cnx, "select * from map_history") != ""
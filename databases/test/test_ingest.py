@@ -0,0 +1,176 @@
+import sqlite3
+import tracemalloc
+
+import pytest
+
+from generate import read_create_x_world_next
+from indexes import X_WORLD_INDEXES
+from ingest import (
+    X_WORLD_COLUMNS,
+    fetch_map_sql,
+    insert_lines,
+    load_x_world,
+    parse_insert,
+    stream_lines,
+)
+
+LINE = (
+    "INSERT INTO `x_world` VALUES "
+    "(82,-120,200,3,29186,'Ferda',4436,'Kikkes',44,'SPQR',221,NULL,FALSE,NULL,NULL,NULL);"
+)
+ESCAPED_LINE = (
+    "INSERT INTO `x_world` VALUES "
+    "(83,-121,199,1,29187,'O\\'Brien\\'s',4437,'Mc''Duff',0,'',15,NULL,TRUE,NULL,NULL,NULL);"
+)
+
+
+class TestParseInsert:
+    def test_typed_values(self):
+        rows = parse_insert(LINE)
+
+        assert rows == [
+            (82, -120, 200, 3, 29186, "Ferda", 4436, "Kikkes", 44, "SPQR", 221)
+            + (None, 0, None, None, None)
+        ]
+
+    def test_escaped_quotes(self):
+        row = parse_insert(ESCAPED_LINE)[0]
+
+        assert row[5] == "O'Brien's"
+        assert row[7] == "Mc'Duff"
+        assert row[12] == 1
+
+    def test_multiple_tuples(self):
+        line = (
+            LINE.rstrip(";")
+            + ", (84,0,0,1,1,'A',1,'B',0,'',2,NULL,FALSE,NULL,NULL,NULL);"
+        )
+
+        assert len(parse_insert(line)) == 2
+
+    @pytest.mark.parametrize(
+        "line",
+        [
+            "DELETE FROM x_world;",
+            "INSERT INTO `x_world` VALUES (1,2,'unterminated);",
+            "INSERT INTO `x_world` VALUES (1,2,3);",
+        ],
+    )
+    def test_malformed(self, line):
+        with pytest.raises(ValueError):
+            parse_insert(line)
+
+
+class TestLoad:
+    def test_insert_lines_mixed_paths(self):
+        cnx = sqlite3.connect(":memory:")
+        cnx.executescript(read_create_x_world_next())
+
+        records = insert_lines(cnx, [LINE, "", ESCAPED_LINE], table="x_world_next")
+
+        assert records == 2
+        rows = cnx.execute(
+            "select village_name, player_name, capital from x_world_next order by id"
+        ).fetchall()
+        assert rows == [("Ferda", "Kikkes", 0), ("O'Brien's", "Mc'Duff", 1)]
+
+    def test_load_matches_direct_execution(self):
+        direct = sqlite3.connect(":memory:")
+        direct.executescript(
+            read_create_x_world_next().replace("x_world_next", "x_world")
+        )
+        direct.execute(LINE)
+
+        loaded = sqlite3.connect(":memory:")
+        load_x_world(loaded, [LINE], read_create_x_world_next())
+
+        query = f"select {', '.join(X_WORLD_COLUMNS)} from x_world"
+        assert loaded.execute(query).fetchall() == direct.execute(query).fetchall()
+
+    def test_failed_load_keeps_previous_x_world(self):
+        cnx = sqlite3.connect(":memory:")
+        load_x_world(cnx, [LINE, ESCAPED_LINE], read_create_x_world_next())
+
+        with pytest.raises(ValueError, match="line 2"):
+            load_x_world(cnx, [LINE, "garbage"], read_create_x_world_next())
+
+        assert cnx.execute("select count(*) from x_world").fetchone()[0] == 2
+        assert not cnx.execute(
+            "select 1 from sqlite_master where name = 'x_world_next'"
+        ).fetchall()
+
+
+class TestSwap:
+    def test_readers_never_see_a_partial_x_world(self, tmp_path):
+        path = tmp_path / "server.db"
+        writer = sqlite3.connect(path)
+        load_x_world(writer, [LINE], read_create_x_world_next())
+        # A view over x_world, like the ones refresh-views installs
+        writer.execute("create view v_tags as select alliance_tag from x_world")
+
+        reader = sqlite3.connect(path, timeout=0)
+        counts = []
+
+        def lines():
+            for village in range(1, 2001):
+                counts.append(
+                    reader.execute("select count(*) from x_world").fetchone()[0]
+                )
+                yield LINE.replace("(82,", f"({village},")
+
+        records = load_x_world(writer, lines(), read_create_x_world_next())
+
+        assert records == 2000
+        assert set(counts) == {1}
+        assert reader.execute("select count(*) from v_tags").fetchone()[0] == 2000
+
+    def test_indexes_survive_repeated_swaps(self):
+        cnx = sqlite3.connect(":memory:")
+        for _ in range(3):
+            load_x_world(cnx, [LINE], read_create_x_world_next())
+
+        indexes = cnx.execute(
+            "select name from sqlite_master where type = 'index' and tbl_name = 'x_world' order by 1"
+        ).fetchall()
+        assert [name for (name,) in indexes] == sorted(
+            index.name for index in X_WORLD_INDEXES
+        )
+        plan = cnx.execute(
+            "explain query plan select * from x_world where player_id = 4436"
+        ).fetchall()
+        assert "x_world_player_id" in plan[0][-1]
+
+
+class TestStreaming:
+    def test_stream_lines_splits_across_chunks(self):
+        class Response:
+            headers = {"content-type": "text/plain"}
+            encoding = "ISO-8859-1"
+
+            def iter_content(self, chunk_size):
+                # A multi-byte character split across two chunks
+                yield "first\nsec".encode() + "é".encode()[:1]
+                yield "é".encode()[1:] + b"ond\nthird"
+
+        assert list(stream_lines(Response())) == ["first", "secéond", "third"]
+
+    def test_streamed_load_has_flat_memory(self, map_sql_server, map_sql_lines):
+        villages = 100_000
+        dump_size = sum(len(line) for line in map_sql_lines(villages))
+        server_link = map_sql_server(villages)
+        cnx = sqlite3.connect(":memory:")
+
+        tracemalloc.start()
+        try:
+            with fetch_map_sql(server_link) as response:
+                records = load_x_world(
+                    cnx, stream_lines(response), read_create_x_world_next()
+                )
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+        assert records == villages
+        assert cnx.execute("select count(*) from x_world").fetchone()[0] == villages
+        # The decoded dump is ~13 MB; streaming should only ever hold a few batches
+        assert peak < dump_size / 4
@@ -0,0 +1,69 @@
+import sqlite3
+from unittest.mock import patch
+
+import pytest
+
+import load
+from load import load_server, run
+
+
+class TestParallelLoad:
+    def test_workers_isolate_failures(self, map_sql_server, tmp_path):
+        servers = [
+            (map_sql_server(300), "first"),
+            ("http://127.0.0.1:9", "unreachable"),
+            (map_sql_server(200), "second"),
+        ]
+
+        results = run(servers, workers=2, db_dir=str(tmp_path))
+
+        assert [result["server"] for result in results] == [
+            "first",
+            "unreachable",
+            "second",
+        ]
+        assert [result["records"] for result in results] == [300, 0, 200]
+        assert results[0]["error"] is None and results[2]["error"] is None
+        assert results[1]["error"]
+
+        for nick, villages in [("first", 300), ("second", 200)]:
+            cnx = sqlite3.connect(tmp_path / f"{nick}.db")
+            assert (
+                cnx.execute("select count(*) from map_history").fetchone()[0]
+                == villages
+            )
+            # Maintained after the load, so the planner has statistics
+            assert cnx.execute("select count(*) from sqlite_stat1").fetchone()[0] > 0
+            assert cnx.execute("select actions from maintenance_log").fetchone() == (
+                "analyze",
+            )
+
+    def test_serial_matches_parallel(self, map_sql_server, tmp_path):
+        servers = [(map_sql_server(100), "a"), (map_sql_server(150), "b")]
+        (tmp_path / "serial").mkdir()
+        (tmp_path / "parallel").mkdir()
+
+        serial = run(servers, workers=1, db_dir=str(tmp_path / "serial"))
+        parallel = run(servers, workers=2, db_dir=str(tmp_path / "parallel"))
+
+        assert (
+            [r["records"] for r in serial]
+            == [r["records"] for r in parallel]
+            == [100, 150]
+        )
+
+    def test_failed_load_closes_its_connection(self, tmp_path):
+        opened = []
+
+        def connect(path):
+            cnx = sqlite3.connect(path)
+            opened.append(cnx)
+            return cnx
+
+        with patch.object(load, "connect", connect):
+            result = load_server("http://127.0.0.1:9", "unreachable", str(tmp_path))
+
+        assert result["error"]
+        assert len(opened) == 1
+        with pytest.raises(sqlite3.ProgrammingError, match="closed"):
+            opened[0].execute("select 1")
@@ -0,0 +1,107 @@
+import sqlite3
+
+import pytest
+
+import maintenance
+from connection import connect
+from generate import read_create_x_world_next
+from ingest import load_x_world
+from maintenance import file_size, maintain, run
+
+
+@pytest.fixture
+def server(tmp_path, map_sql_lines):
+    db = str(tmp_path / "am3.db")
+    cnx = connect(db)
+    load_x_world(cnx, map_sql_lines(2000), read_create_x_world_next())
+    cnx.close()
+    return db
+
+
+def log(db: str) -> list:
+    cnx = sqlite3.connect(db)
+    rows = cnx.execute("select actions from maintenance_log order by rowid").fetchall()
+    cnx.close()
+    return [actions for (actions,) in rows]
+
+
+class TestMaintain:
+    def test_analyzes_once_then_optimizes(self, server):
+        cnx = connect(server)
+
+        first = maintain(cnx, server)
+        second = maintain(cnx, server)
+
+        assert first["error"] is None
+        assert first["actions"] == ["analyze"]
+        assert second["actions"] == ["optimize"]
+        assert cnx.execute("select count(*) from sqlite_stat1").fetchone()[0] > 0
+        assert log(server) == ["analyze", "optimize"]
+
+    def test_reanalyzes_after_growth(self, server):
+        cnx = connect(server)
+        maintain(cnx, server)
+        cnx.execute("create table padding (data blob)")
+        pages = cnx.execute("pragma page_count").fetchone()[0]
+        cnx.executemany("insert into padding values (randomblob(4000))", [()] * pages)
+        cnx.commit()
+
+        assert maintain(cnx, server)["actions"][0] == "analyze"
+
+    def test_vacuums_after_mass_deletes(self, server, monkeypatch):
+        monkeypatch.setattr(maintenance, "VACUUM_MIN_PAGES", 10)
+        cnx = connect(server)
+        cnx.execute("delete from x_world")
+        cnx.commit()
+
+        first = maintain(cnx, server)
+
+        assert first["actions"] == ["analyze", "vacuum", "checkpoint"]
+        assert first["size_after"] < first["size_before"]
+        assert cnx.execute("pragma auto_vacuum").fetchone()[0] == 2
+        assert cnx.execute("pragma freelist_count").fetchone()[0] == 0
+
+        # Once auto_vacuum is incremental, later deletes only need an incremental vacuum
+        load_cnx = connect(server)
+        load_cnx.execute("create table padding (data blob)")
+        load_cnx.executemany(
+            "insert into padding values (randomblob(4000))", [()] * 200
+        )
+        load_cnx.commit()
+        maintain(load_cnx, server)
+        load_cnx.execute("delete from padding")
+        load_cnx.commit()
+
+        assert "incremental vacuum" in maintain(load_cnx, server)["actions"]
+        assert load_cnx.execute("pragma freelist_count").fetchone()[0] == 0
+
+    def test_checkpoints_a_large_wal(self, server, monkeypatch):
+        monkeypatch.setattr(maintenance, "CHECKPOINT_WAL_BYTES", 1)
+        cnx = connect(server)
+        cnx.execute("pragma wal_autocheckpoint = 0")
+        cnx.execute("update x_world set population = population + 1")
+        cnx.commit()
+
+        result = maintain(cnx, server)
+
+        assert "checkpoint" in result["actions"]
+        assert file_size(server + "-wal") == 0
+
+    def test_dry_run_changes_nothing(self, server):
+        size = file_size(server)
+
+        [result] = run([server], dry_run=True)
+
+        assert result["actions"] == ["analyze"]
+        cnx = sqlite3.connect(server)
+        tables = {name for (name,) in cnx.execute("select name from sqlite_master")}
+        assert "sqlite_stat1" not in tables and "maintenance_log" not in tables
+        assert file_size(server) == size
+
+
+class TestRun:
+    def test_maintains_every_database_and_reports_missing_ones(self, server, tmp_path):
+        results = run([server, str(tmp_path / "gone.db")], workers=2)
+
+        assert results[0]["error"] is None and results[0]["actions"] == ["analyze"]
+        assert "does not exist" in results[1]["error"]
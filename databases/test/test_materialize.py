@@ -0,0 +1,319 @@
+import glob
+import sqlite3
+from unittest.mock import patch
+
+import pytest
+
+import generate
+from generate import DAY, START, load_history, read_create_x_world_next
+from history import convert_to_delta, record_changes, record_snapshot
+from ingest import load_x_world
+import materialize
+from materialize import refresh_materialized
+
+# The views as they were before materialization, kept to check the tables
+# return exactly what callers used to get
+ORIGINAL_VIEWS = """
+DROP VIEW IF EXISTS original_seven_day_pop;
+
+create view original_seven_day_pop as
+with lags as(
+    select 
+        date,
+        player_id,
+        player_name, 
+        village_id,
+        village_name,
+        first_value(date) over(partition by village_id order by date) as founded,
+        population as today, 
+        coalesce(lag(population, 1) over(partition by village_id order by date),0) as yesterday,
+        coalesce(lag(population, 2) over(partition by village_id order by date),0) as two_days_ago,
+        coalesce(lag(population, 3) over(partition by village_id order by date),0) as three_days_ago,
+        coalesce(lag(population, 4) over(partition by village_id order by date),0) as four_days_ago,
+        coalesce(lag(population, 5) over(partition by village_id order by date),0) as five_days_ago,
+        coalesce(lag(population, 6) over(partition by village_id order by date),0) as six_days_ago
+    from v_map_history 
+    group by 1, 2, 3, 4, 5
+)
+select
+    date as load_date,
+    founded,
+    player_id,
+    player_name,
+    village_id,
+    village_name,
+    today,
+    yesterday,
+    two_days_ago,
+    three_days_ago,
+    four_days_ago,
+    five_days_ago,
+    six_days_ago
+from lags 
+where date = (select max(date) from lags)
+;
+
+DROP VIEW IF EXISTS original_player_change;
+CREATE VIEW original_player_change AS
+WITH date_range AS (
+    SELECT
+        MAX(date) AS today_timestamp,
+        DATE(MAX(date), '-1 day') AS yesterday_timestamp
+    FROM v_map_history
+),
+player_data AS (
+    SELECT
+        m.player_id,
+        m.player_name,
+        m.alliance_id,
+        m.village_id,
+        m.population,
+        CASE WHEN m.date = d.today_timestamp THEN 'current' ELSE 'previous' END AS data_type
+    FROM v_map_history m
+    CROSS JOIN date_range d
+    WHERE m.date IN (d.today_timestamp, d.yesterday_timestamp)
+),
+aggregated_data AS (
+    SELECT
+        player_id,
+        player_name,
+        MAX(CASE WHEN data_type = 'current' THEN alliance_id END) AS current_alliance_id,
+        MAX(CASE WHEN data_type = 'previous' THEN alliance_id END) AS previous_alliance_id,
+        COUNT(DISTINCT CASE WHEN data_type = 'current' THEN village_id END) AS current_villages_count,
+        COUNT(DISTINCT CASE WHEN data_type = 'previous' THEN village_id END) AS previous_villages_count,
+        SUM(CASE WHEN data_type = 'current' THEN population ELSE 0 END) AS current_population,
+        SUM(CASE WHEN data_type = 'previous' THEN population ELSE 0 END) AS previous_population
+    FROM player_data
+    GROUP BY player_id, player_name
+)
+SELECT
+    player_id,
+    player_name,
+    COALESCE(current_alliance_id, 'Unspecified') AS current_alliance_id,
+    COALESCE(previous_alliance_id, 'Unspecified') AS previous_alliance_id,
+    current_villages_count,
+    previous_villages_count,
+    current_population,
+    previous_population,
+    (current_villages_count != previous_villages_count) AS villages_changed,
+    (COALESCE(current_alliance_id, 'Unspecified') != COALESCE(previous_alliance_id, 'Unspecified')) AS alliance_changed,
+    (current_population - previous_population) AS population_change,
+    (SELECT today_timestamp FROM date_range) AS created_at
+FROM aggregated_data;
+
+"""
+
+
+def village_line(village_id, day, population=None):
+    player_id = village_id // 4 + 1
+    # Players drift between two alliances and new villages are founded daily
+    alliance_id = 1 + (player_id + day // 3) % 2
+    return generate.village_line(
+        village_id,
+        population or village_id * 3 + day * (village_id % 5),
+        player_id,
+        alliance_id,
+        f"A{alliance_id}",
+    )
+
+
+def load_days(cnx, days, delta=False):
+    load_history(
+        cnx,
+        (
+            [village_line(village_id, day) for village_id in range(1, 80 + day * 3)]
+            for day in range(days)
+        ),
+        "delta" if delta else "snapshot",
+    )
+    for view_path in glob.glob("game_servers/views/*.sql"):
+        cnx.executescript(open(view_path).read())
+    cnx.executescript(ORIGINAL_VIEWS)
+
+
+def rows(cnx, relation):
+    return sorted(cnx.execute(f"select * from {relation}").fetchall(), key=repr)
+
+
+class TestMaterialize:
+    @pytest.mark.parametrize("days", [1, 2, 9])
+    @pytest.mark.parametrize("delta", [False, True])
+    def test_matches_original_views(self, days, delta):
+        cnx = sqlite3.connect(":memory:")
+        load_days(cnx, days, delta)
+
+        counts = refresh_materialized(cnx)
+
+        assert counts["seven_day_pop"] > 0 and counts["player_change"] > 0
+        assert rows(cnx, "v_seven_day_pop") == rows(cnx, "original_seven_day_pop")
+        assert rows(cnx, "v_player_change") == rows(cnx, "original_player_change")
+
+    @pytest.mark.parametrize("delta", [False, True])
+    def test_refreshed_after_every_load_matches_a_rebuild(self, delta):
+        cnx = sqlite3.connect(":memory:")
+        if delta:
+            convert_to_delta(cnx)
+        record = record_changes if delta else record_snapshot
+        # Village 5 misses day 3, player 1 (villages 1-3) misses days 4 and 5,
+        # day 6 is never loaded and day 8 is loaded twice
+        missing = {(5, 3)} | {
+            (village_id, day) for village_id in (1, 2, 3) for day in (4, 5)
+        }
+        loads = [(day, START + day * DAY) for day in [0, 1, 2, 3, 4, 5, 7, 8]]
+        loads += [(9, START + 8 * DAY + 60), (9, START + 9 * DAY)]
+
+        with patch.object(
+            materialize, "_read_sql", wraps=materialize._read_sql
+        ) as read_sql:
+            for day, snapshot_at in loads:
+                lines = [
+                    village_line(village_id, day)
+                    for village_id in range(1, 80 + day * 3)
+                    if (village_id, day) not in missing
+                ]
+                load_x_world(cnx, lines, read_create_x_world_next())
+                record(cnx, snapshot_at=snapshot_at)
+                refresh_materialized(cnx)
+
+                rebuilt = sqlite3.connect(":memory:")
+                cnx.backup(rebuilt)
+                rebuilt.executescript(
+                    "drop table seven_day_pop; drop table player_change;"
+                )
+                refresh_materialized(rebuilt)
+                for table in materialize.MATERIALIZED_TABLES:
+                    assert rows(cnx, table) == rows(rebuilt, table), (
+                        table,
+                        snapshot_at,
+                    )
+
+        scripts = [call.args[0] for call in read_sql.call_args_list]
+        assert scripts.count("update_seven_day_pop") == len(loads) - 2
+
+    def test_refresh_replaces_previous_day(self):
+        cnx = sqlite3.connect(":memory:")
+        load_days(cnx, 3)
+        refresh_materialized(cnx)
+
+        refresh_materialized(cnx)
+
+        assert rows(cnx, "v_seven_day_pop") == rows(cnx, "original_seven_day_pop")
+        assert (
+            cnx.execute(
+                "select count(distinct load_date) from seven_day_pop"
+            ).fetchone()[0]
+            == 1
+        )
+
+    def test_days_missing_from_history_are_zero(self):
+        # The original lag() view counted rows rather than days, so a village
+        # missing from one load had its older populations shifted a column
+        cnx = sqlite3.connect(":memory:")
+        convert_to_delta(cnx)
+        for day, population in [(0, 10), (1, None), (2, 30)]:
+            lines = (
+                [village_line(1, day, population)]
+                if population
+                else [village_line(2, day)]
+            )
+            load_x_world(cnx, lines, read_create_x_world_next())
+            record_changes(cnx, snapshot_at=START + day * DAY)
+
+        refresh_materialized(cnx)
+
+        assert cnx.execute(
+            "select today, yesterday, two_days_ago from seven_day_pop where village_id = 1"
+        ).fetchone() == (30, 0, 10)
+
+    @pytest.mark.parametrize("table", ["seven_day_pop", "player_change"])
+    @pytest.mark.parametrize("script", ["refresh", "update"])
+    def test_refresh_reads_only_the_newest_days(self, table, script):
+        cnx = sqlite3.connect(":memory:")
+        load_days(cnx, 2)
+        refresh_materialized(cnx)
+        cnx.execute(
+            "create index map_history_snapshot_day on map_history (snapshot_day)"
+        )
+
+        with open(f"sql/{script}_{table}.sql", "r") as sql_file:
+            text = sql_file.read()
+        if script == "refresh":
+            query = text.split(f"insert into {table}")[1]
+        else:
+            query = text.split(f"create temp table {table}_next as")[1]
+            query = query.split(f"delete from {table};")[0].rstrip().rstrip(";")
+        plan = [
+            step[-1]
+            for step in cnx.execute("explain query plan " + query, {"shift": 1})
+        ]
+
+        assert "SEARCH" in " ".join(plan)
+        assert not {"SCAN map_history", "SCAN m", "SCAN t"} & set(plan)
+
+    def test_no_history_yet(self):
+        assert refresh_materialized(sqlite3.connect(":memory:")) == {}
+
+
+PLAYER_DAILY = """
+    select player_id, snapshot_day, sum(population), count(*)
+    from map_history group by 1, 2
+"""
+ALLIANCE_DAILY = """
+    select alliance_id, snapshot_day, sum(population), count(*), count(distinct player_id)
+    from map_history group by 1, 2
+"""
+
+
+class TestRollups:
+    @pytest.mark.parametrize("delta", [False, True])
+    def test_match_full_aggregation(self, delta):
+        cnx = sqlite3.connect(":memory:")
+        load_days(cnx, 5, delta)
+
+        refresh_materialized(cnx)
+
+        player_daily = (
+            "(select player_id, snapshot_day, population, villages from player_daily)"
+        )
+        alliance_daily = "(select alliance_id, snapshot_day, population, villages, players from alliance_daily)"
+        assert rows(cnx, player_daily) == rows(cnx, f"({PLAYER_DAILY})")
+        assert rows(cnx, alliance_daily) == rows(cnx, f"({ALLIANCE_DAILY})")
+
+    def test_refresh_only_recomputes_new_days(self):
+        cnx = sqlite3.connect(":memory:")
+        load_days(cnx, 3)
+        refresh_materialized(cnx)
+        # Mark an old day; a full rebuild would overwrite it
+        cnx.execute(
+            "update player_daily set population = -1 "
+            "where snapshot_day = (select min(snapshot_day) from player_daily)"
+        )
+        cnx.commit()
+
+        load_x_world(cnx, [village_line(1, 3)], read_create_x_world_next())
+        record_snapshot(cnx, snapshot_at=START + 3 * DAY)
+        refresh_materialized(cnx)
+
+        days = cnx.execute(
+            "select snapshot_day, min(population), count(*) from player_daily group by 1 order by 1"
+        ).fetchall()
+        assert days[0][1] == -1
+        assert days[-1][2] == 1
+        assert [day for day, *_ in days] == [days[0][0] + offset for offset in range(4)]
+
+    def test_rerun_of_latest_day_is_replaced(self):
+        cnx = sqlite3.connect(":memory:")
+        load_days(cnx, 2)
+        refresh_materialized(cnx)
+
+        load_x_world(
+            cnx, [village_line(1, 1, population=999)], read_create_x_world_next()
+        )
+        record_snapshot(cnx, snapshot_at=START + DAY + 60)
+        refresh_materialized(cnx)
+
+        latest = cnx.execute(
+            "select player_id, population from player_daily "
+            "where snapshot_day = (select max(snapshot_day) from player_daily)"
+        ).fetchall()
+        assert latest == [(1, 999)]
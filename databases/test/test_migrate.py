@@ -0,0 +1,247 @@
+import shutil
+import sqlite3
+from pathlib import Path
+from unittest.mock import patch
+
+import pytest
+
+import migrate
+from migrate import applied_versions, load_migrations, migrate_db, run
+
+DATABASES_DIR = Path(__file__).resolve().parents[1]
+BOT_SQL_DIR = DATABASES_DIR.parent / "bot" / "sql"
+
+
+def _old_bot_db(path) -> str:
+    """A bot server database from before NOTES was added to HAMMERS"""
+    cnx = sqlite3.connect(path)
+    cnx.execute(
+        "create table HAMMERS (ID integer primary key, IGN text, LINK text, COORDINATES text, TIMESTAMP timestamp)"
+    )
+    cnx.commit()
+    cnx.close()
+    return str(path)
+
+
+def unpartitioned_bot_db(path) -> str:
+    """A bot server database from before 002_partition_by_guild_id, stamped at version 1"""
+    cnx = sqlite3.connect(path)
+    for script in sorted(BOT_SQL_DIR.glob("create_table_*.sql")):
+        lines = script.read_text().splitlines()
+        cnx.executescript(
+            "\n".join(line for line in lines if "guild_id" not in line.lower())
+        )
+    cnx.execute(
+        "insert into SCHEMA_VERSION (version, name) values (1, '001_add_notes_to_hammers')"
+    )
+    cnx.commit()
+    cnx.close()
+    return str(path)
+
+
+def old_analytics_db(path) -> str:
+    """An analytics database from before db_time_ms and discord_time_ms"""
+    lines = (DATABASES_DIR / "sql" / "create_table_analytics.sql").read_text()
+    cnx = sqlite3.connect(path)
+    cnx.executescript(
+        "\n".join(
+            line
+            for line in lines.splitlines()
+            if "_time_ms" not in line or "execution_time_ms" in line
+        ).replace("execution_time_ms INTEGER,", "execution_time_ms INTEGER")
+    )
+    cnx.commit()
+    cnx.close()
+    return str(path)
+
+
+def _columns(db: str, table: str) -> list:
+    cnx = sqlite3.connect(db)
+    columns = [row[1] for row in cnx.execute(f"pragma table_info({table})")]
+    cnx.close()
+    return columns
+
+
+def _versions(db: str) -> set:
+    cnx = sqlite3.connect(db)
+    versions = applied_versions(cnx)
+    cnx.close()
+    return versions
+
+
+@pytest.fixture
+def migrations(tmp_path):
+    directory = tmp_path / "migrations"
+    directory.mkdir()
+    shutil.copy(
+        DATABASES_DIR / "migrations" / "001_add_notes_to_hammers.sql", directory
+    )
+    (directory / "002_index_hammers_ign.sql").write_text(
+        "BEGIN TRANSACTION;\nCREATE INDEX HAMMERS_IGN ON HAMMERS (IGN);\nCOMMIT;\n"
+    )
+    return load_migrations(str(directory))
+
+
+class TestMigrate:
+    def test_load_migrations_in_version_order(self, migrations):
+        assert [(m.version, m.name) for m in migrations] == [
+            (1, "001_add_notes_to_hammers"),
+            (2, "002_index_hammers_ign"),
+        ]
+
+    def test_load_migrations_rejects_bad_names(self, tmp_path):
+        (tmp_path / "add_column.sql").write_text("select 1;")
+        with pytest.raises(ValueError):
+            load_migrations(str(tmp_path))
+
+    def test_applies_pending_in_order_once(self, migrations, tmp_path):
+        db = _old_bot_db(tmp_path / "1.db")
+
+        result = migrate_db(db, migrations)
+        assert result["error"] is None
+        assert result["applied"] == [
+            "001_add_notes_to_hammers",
+            "002_index_hammers_ign",
+        ]
+        assert "NOTES" in _columns(db, "HAMMERS")
+        assert _versions(db) == {1, 2}
+
+        rerun = migrate_db(db, migrations)
+        assert rerun["error"] is None
+        assert rerun["applied"] == [] and rerun["pending"] == []
+
+    def test_dry_run_changes_nothing(self, migrations, tmp_path):
+        db = _old_bot_db(tmp_path / "1.db")
+
+        result = migrate_db(db, migrations, dry_run=True)
+
+        assert result["pending"] == [
+            "001_add_notes_to_hammers",
+            "002_index_hammers_ign",
+        ]
+        assert result["applied"] == []
+        assert "NOTES" not in _columns(db, "HAMMERS")
+        assert _versions(db) == set()
+
+    def test_baseline_skips_versions_already_in_place(self, migrations, tmp_path):
+        db = _old_bot_db(tmp_path / "1.db")
+        cnx = sqlite3.connect(db)
+        cnx.execute("alter table HAMMERS add column NOTES text")
+        cnx.commit()
+        cnx.close()
+
+        result = migrate_db(db, migrations, baseline=1)
+
+        assert result["error"] is None
+        assert result["applied"] == ["002_index_hammers_ign"]
+        assert _versions(db) == {1, 2}
+
+    def test_failure_rolls_back_and_stays_pending(self, migrations, tmp_path):
+        db = str(tmp_path / "empty.db")
+        sqlite3.connect(db).close()
+
+        result = migrate_db(db, migrations)
+
+        assert result["error"]
+        assert result["applied"] == []
+        assert result["pending"] == [
+            "001_add_notes_to_hammers",
+            "002_index_hammers_ign",
+        ]
+        assert _versions(db) == set()
+
+    def test_failed_migration_closes_its_connection(self, migrations, tmp_path):
+        db = str(tmp_path / "empty.db")
+        sqlite3.connect(db).close()
+        opened = []
+        sqlite_connect = sqlite3.connect
+
+        def connect(path):
+            cnx = sqlite_connect(path)
+            opened.append(cnx)
+            return cnx
+
+        with patch.object(migrate.sqlite3, "connect", connect):
+            result = migrate_db(db, migrations)
+
+        assert result["error"]
+        assert len(opened) == 1
+        with pytest.raises(sqlite3.ProgrammingError, match="closed"):
+            opened[0].execute("select 1")
+
+    @pytest.mark.parametrize("workers", [1, 2])
+    def test_one_broken_database_does_not_stop_the_rest(
+        self, migrations, tmp_path, workers
+    ):
+        broken = str(tmp_path / "broken.db")
+        sqlite3.connect(broken).close()
+        dbs = [_old_bot_db(tmp_path / "1.db"), broken, _old_bot_db(tmp_path / "2.db")]
+
+        results = run(dbs, migrations, workers=workers)
+
+        assert [result["db"] for result in results] == dbs
+        assert [bool(result["error"]) for result in results] == [False, True, False]
+        assert _versions(dbs[0]) == _versions(dbs[2]) == {1, 2}
+
+    def test_new_bot_databases_start_up_to_date(self, tmp_path):
+        db = str(tmp_path / "new.db")
+        cnx = sqlite3.connect(db)
+        for script in sorted(BOT_SQL_DIR.glob("create_table_*.sql")):
+            cnx.executescript(script.read_text())
+        cnx.executescript((BOT_SQL_DIR / "insert_schema_version.sql").read_text())
+        cnx.commit()
+        cnx.close()
+
+        result = migrate_db(db, load_migrations(str(DATABASES_DIR / "migrations")))
+
+        assert result["error"] is None
+        assert result["pending"] == [] and result["applied"] == []
+
+    def test_partition_by_guild_id_tags_rows_with_their_guild(self, tmp_path):
+        db = unpartitioned_bot_db(tmp_path / "1234.db")
+        cnx = sqlite3.connect(db)
+        cnx.execute(
+            "insert into HAMMERS (IGN, LINK, COORDINATES, TIMESTAMP) values ('kikkes', 'link', '1|1', current_timestamp)"
+        )
+        cnx.commit()
+        cnx.close()
+
+        result = migrate_db(db, load_migrations(str(DATABASES_DIR / "migrations")))
+
+        assert result["applied"] == ["002_partition_by_guild_id"]
+        cnx = sqlite3.connect(db)
+        assert cnx.execute("select GUILD_ID from HAMMERS").fetchall() == [(1234,)]
+        plan = cnx.execute(
+            "explain query plan select * from HAMMERS where GUILD_ID = 1234 and lower(IGN) = 'kikkes'"
+        ).fetchall()
+        assert "hammers_guild_lower_ign" in plan[0][-1]
+
+    def test_partition_by_guild_id_needs_a_guild_file_name(self, tmp_path):
+        db = unpartitioned_bot_db(tmp_path / "old_guild.db")
+        cnx = sqlite3.connect(db)
+        cnx.execute(
+            "insert into HAMMERS (IGN, LINK, COORDINATES, TIMESTAMP) values ('kikkes', 'link', '1|1', current_timestamp)"
+        )
+        cnx.commit()
+        cnx.close()
+
+        result = migrate_db(db, load_migrations(str(DATABASES_DIR / "migrations")))
+
+        assert "not named after a guild" in result["error"]
+        assert result["pending"] == ["002_partition_by_guild_id"]
+        assert "GUILD_ID" not in _columns(db, "HAMMERS")
+
+    def test_analytics_migrations_add_the_timing_columns(self, tmp_path):
+        db = old_analytics_db(tmp_path / "analytics.db")
+        migrations = load_migrations(str(DATABASES_DIR / "migrations" / "analytics"))
+
+        result = migrate_db(db, migrations)
+
+        assert result["error"] is None
+        assert result["applied"] == ["001_add_timing_columns"]
+        assert _columns(db, "ANALYTICS")[-2:] == ["db_time_ms", "discord_time_ms"]
+
+    def test_analytics_migrations_stay_out_of_the_bot_servers(self):
+        names = [m.name for m in load_migrations(str(DATABASES_DIR / "migrations"))]
+
+        assert "001_add_timing_columns" not in names
@@ -0,0 +1,155 @@
+import glob
+import sqlite3
+
+import pytest
+
+from generate import DAY, START, read_create_x_world_next, village_line
+from history import (
+    convert_to_delta,
+    record_snapshot,
+    snapshot_day,
+    uses_normalized_schema,
+)
+from indexes import GAME_SERVER_INDEXES, GAME_SERVER_QUERIES, ensure_indexes, query_plan
+from ingest import load_x_world, load_x_world_next
+from materialize import refresh_materialized
+from normalized import normalize, record_normalized
+from retention import RetentionPolicy, apply_retention
+from test_history import load_full, snapshots
+
+VIEWS = ["v_map_history", "v_new_villages", "v_player_change", "v_seven_day_pop"]
+
+
+def contents(cnx):
+    for view_path in sorted(glob.glob("game_servers/views/*.sql")):
+        cnx.executescript(open(view_path).read())
+    refresh_materialized(cnx)
+    tables = ["x_world", "map_history"] + VIEWS
+    return {
+        table: sorted(cnx.execute(f"select * from {table}").fetchall(), key=repr)
+        for table in tables
+    }
+
+
+def load_normalized(cnx, loads):
+    for snapshot_at, lines in loads:
+        load_x_world_next(cnx, lines, read_create_x_world_next())
+        record_normalized(cnx, snapshot_at=snapshot_at)
+
+
+class TestNormalize:
+    def test_compatibility_views_match_full_history(self):
+        full = sqlite3.connect(":memory:")
+        load_full(full)
+        expected = contents(full)
+
+        normalize(full)
+
+        assert uses_normalized_schema(full)
+        assert contents(full) == expected
+        assert all(expected.values())
+
+    def test_loads_after_normalizing(self):
+        full = sqlite3.connect(":memory:")
+        load_full(full)
+        days = list(snapshots())
+        cnx = sqlite3.connect(":memory:")
+        for day, lines in enumerate(days[:2]):
+            load_x_world(cnx, lines, read_create_x_world_next())
+            record_snapshot(cnx, snapshot_at=START + day * DAY)
+        normalize(cnx)
+
+        load_normalized(cnx, [(START + day * DAY, days[day]) for day in (2, 3)])
+
+        assert contents(cnx) == contents(full)
+
+    def test_rerun_replaces_the_day(self):
+        cnx = sqlite3.connect(":memory:")
+        load_full(cnx)
+        normalize(cnx)
+        rows = cnx.execute("select count(*) from village_days").fetchone()[0]
+
+        lines = list(snapshots())[-1]
+        lines[0] = village_line(1, population=500, alliance_tag="ROME")
+        load_normalized(cnx, [(START + 3 * DAY + 60, lines)])
+
+        assert cnx.execute("select count(*) from village_days").fetchone()[0] == rows
+        assert cnx.execute(
+            "select population, alliance_tag from map_history where village_id = 1 and snapshot_day = ?",
+            (snapshot_day(START + 3 * DAY),),
+        ).fetchone() == (500, "ROME")
+        assert cnx.execute(
+            "select population from x_world where village_id = 1"
+        ).fetchone() == (500,)
+
+    def test_strict_tables_reject_wrong_types(self):
+        cnx = sqlite3.connect(":memory:")
+        load_full(cnx)
+        normalize(cnx)
+
+        with pytest.raises(sqlite3.IntegrityError):
+            cnx.execute(
+                "update village_days set population = 'many' where village_id = 1"
+            )
+
+    def test_smaller_than_full_history(self, tmp_path):
+        sizes = []
+        for normalized in [False, True]:
+            path = str(tmp_path / f"{normalized}.db")
+            cnx = sqlite3.connect(path)
+            for day in range(30):
+                lines = [
+                    "INSERT INTO `x_world` VALUES "
+                    f"({village},{village % 400},{village // 400},1,{village},'Village of player {village // 5}',"
+                    f"{village // 5},'Player number {village // 5}',{village // 100},'Alliance {village // 100}',"
+                    f"{100 + day + village % 7},NULL,FALSE,NULL,NULL,NULL);"
+                    for village in range(1, 2001)
+                ]
+                load_x_world(cnx, lines, read_create_x_world_next())
+                record_snapshot(cnx, snapshot_at=START + day * DAY)
+            ensure_indexes(cnx, GAME_SERVER_INDEXES)
+            if normalized:
+                normalize(cnx)
+            cnx.execute("vacuum")
+            sizes.append(cnx.execute("pragma page_count").fetchone()[0])
+            cnx.close()
+
+        assert sizes[1] * 2 < sizes[0]
+
+    def test_queries_use_indexes(self):
+        cnx = sqlite3.connect(":memory:")
+        load_full(cnx)
+        normalize(cnx)
+        contents(cnx)
+        ensure_indexes(cnx, GAME_SERVER_INDEXES)
+
+        for label, query in GAME_SERVER_QUERIES.items():
+            assert "SCAN" not in query_plan(cnx, query), label
+
+    def test_retention_prunes_fact_rows(self):
+        cnx = sqlite3.connect(":memory:")
+        loads = [(START + day * DAY, list(snapshots())[day % 4]) for day in range(90)]
+        load_x_world(cnx, loads[0][1], read_create_x_world_next())
+        record_snapshot(cnx, snapshot_at=loads[0][0])
+        normalize(cnx)
+        load_normalized(cnx, loads[1:])
+
+        pruned, rows = apply_retention(
+            cnx, RetentionPolicy(daily_days=60, weekly_days=365)
+        )
+
+        assert pruned and rows > 0
+        assert cnx.execute("select count(*) from map_snapshots").fetchone()[
+            0
+        ] == 90 - len(pruned)
+        assert cnx.execute(
+            "select count(distinct snapshot_day) from village_days"
+        ).fetchone()[0] == 90 - len(pruned)
+
+    def test_delta_history_is_rejected(self):
+        cnx = sqlite3.connect(":memory:")
+        load_full(cnx)
+        convert_to_delta(cnx)
+
+        with pytest.raises(ValueError):
+            normalize(cnx)
@@ -0,0 +1,30 @@
+import os
+
+import pytest
+
+from parallel import run_parallel
+
+
+def _square(n: int) -> dict:
+    if n < 0:
+        # Dies like a worker killed by the OOM killer, without reporting anything
+        os._exit(1)
+    return {"n": n, "square": n * n, "error": None}
+
+
+def _crashed(job: tuple, error: str) -> dict:
+    return {"n": job[0], "square": None, "error": error}
+
+
+class TestRunParallel:
+    @pytest.mark.parametrize("workers", [1, 3])
+    def test_results_in_job_order(self, workers):
+        results = run_parallel(_square, [(n,) for n in range(6)], workers, _crashed)
+
+        assert [result["square"] for result in results] == [0, 1, 4, 9, 16, 25]
+
+    def test_crashed_worker_gets_a_result(self):
+        results = run_parallel(_square, [(2,), (-1,)], 2, _crashed)
+
+        assert results[1]["n"] == -1
+        assert results[1]["error"].startswith("Worker crashed")
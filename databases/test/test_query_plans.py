@@ -0,0 +1,637 @@
+import glob
+import os
+import re
+import sqlite3
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Dict, NamedTuple, Tuple
+
+import pytest
+
+import generate
+from generate import GuildConfig, WorldConfig, guild_ids
+from indexes import query_plan
+
+# Roughly a busy server a week after launch, and the bot's databases after a
+# season with every guild in one file
+VILLAGES = 20_000
+DAYS = 7
+GUILDS = 100
+COMMANDS = 100_000
+GUILD_IDS = guild_ids(GUILDS)
+GUILD = GUILD_IDS[41]
+# The players the generated hammer reports are about; the first ten are raiders
+PLAYERS = [f"Player {player}" for player in range(50)]
+# Open defense calls and recent raids are relative to now
+NOW = int(time.time())
+WEEK_START = datetime.fromtimestamp(NOW - 7 * 24 * 3600, timezone.utc).strftime(
+    "%Y-%m-%d %H:%M:%S"
+)
+LAST_RAID_UPDATE = (
+    datetime.fromtimestamp(NOW, timezone.utc).replace(minute=30, second=0)
+    - timedelta(hours=2)
+).strftime("%Y-%m-%d %H:%M:%S")
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Tables big enough that a full scan is a regression unless a query is listed as reading it whole
+LARGE_TABLES = {
+    "x_world",
+    "map_history",
+    "player_daily",
+    "alliance_daily",
+    "seven_day_pop",
+    "player_change",
+    "hammers",
+    "defense_calls",
+    "defense_threads",
+    "submitted_defense",
+    "raid_tracking",
+    "analytics",
+}
+SQL_KEYWORDS = {
+    "where",
+    "join",
+    "left",
+    "inner",
+    "cross",
+    "on",
+    "using",
+    "group",
+    "order",
+    "limit",
+}
+
+
+class Query(NamedTuple):
+    """A query as written in the module its label names, so TestSources can find it there"""
+
+    sql: str
+    params: tuple = ()
+    # Values for the {fields} the module formats into the query
+    fields: Dict[str, str] = {}
+    # Large tables the query reads whole on purpose
+    scans: Tuple[str, ...] = ()
+    budget_ms: float = 20
+
+    @property
+    def executable(self) -> str:
+        return self.sql.format(**self.fields) if self.fields else self.sql
+
+
+# Whole-view reads, for every file in game_servers/views. A new view without an
+# entry here may not scan a large table.
+VIEW_SCANS = {
+    "test_view": ("map_history",),
+    "v_map_history": ("map_history",),
+    "v_alliance_lookup": ("x_world",),
+    "v_player_change": ("player_change",),
+    "v_seven_day_pop": ("seven_day_pop",),
+}
+
+# The game server queries of the bot (bot/) and site (site/), with their parameters
+GAME_QUERIES = {
+    "boink_app._find_player exact": Query(
+        "select * from x_world where lower(player_name) = '{ign}'",
+        fields={"ign": "player 42"},
+    ),
+    # Only run when the exact match finds nothing; LIKE can't use the expression index
+    "boink_app._find_player partial": Query(
+        "select * from x_world where lower(player_name) like '{ign}%'",
+        fields={"ign": "player 42"},
+        scans=("x_world",),
+        budget_ms=50,
+    ),
+    "funcs.get_alliance_tag_from_id": Query(
+        "select alliance_name from v_alliance_lookup where alliance_id = ?", (3,)
+    ),
+    "funcs.get_player_population_change": Query(
+        """
+        select population
+        from player_daily
+        where player_id = ?
+        and snapshot_day >= (select max(snapshot_day) from player_daily where player_id = ?) - ?
+        order by snapshot_day
+        """,
+        (42, 42, 7),
+    ),
+    # The alert jobs read every changed player once an hour
+    "notification_service alliance changes": Query(
+        "select * from v_player_change where alliance_changed=1 and current_population>0",
+        scans=("player_change",),
+    ),
+    "notification_service deleted players": Query(
+        "select * from v_player_change where current_population=0",
+        scans=("player_change",),
+    ),
+    "notification_service new villages": Query(
+        """
+        SELECT
+            player_name,
+            x_coordinate,
+            y_coordinate,
+            population,
+            alliance_tag
+        FROM v_new_villages
+        WHERE alliance_tag = ?
+        AND {quad_condition}
+        """,
+        ("A3",),
+        fields={"quad_condition": "x_coordinate < 0 AND y_coordinate > 0"},
+        budget_ms=100,
+    ),
+    "site app last update": Query(
+        "select date(max(snapshot_day) * 86400, 'unixepoch') as updated_at from map_history;"
+    ),
+    "site alliance_detail history": Query(
+        "select date(snapshot_day * 86400, 'unixepoch') as date, alliance_id, population "
+        "from alliance_daily where alliance_id = ? order by snapshot_day;",
+        (3,),
+    ),
+    "site alliance_detail alliance": Query(
+        "select alliance_tag, sum(population) as population from x_world where alliance_id = ? group by 1",
+        (3,),
+    ),
+    "site alliance_detail map": Query(
+        """
+    SELECT
+        x_coordinate as 'X Coordinate',
+        y_coordinate as 'Y Coordinate',
+        alliance_tag as 'Alliance Name',
+        player_name as 'Player Name',
+        village_name as 'Village Name',
+        case
+            when tribe_id = 1 then 'Roman'
+            when tribe_id = 2 then 'Teuton'
+            when tribe_id = 3 then 'Gaul'
+        end as 'Tribe',
+        population as 'Population',
+        capital as 'Capital?'
+    FROM x_world where alliance_id = ?
+    {capital_filter}
+    order by player_name;""",
+        (3,),
+        fields={"capital_filter": "and capital"},
+    ),
+    # The rankings pages rank every alliance and player
+    "site alliances rankings": Query(
+        """select
+            '['||alliance_tag||']('||'alliances/'||alliance_id||')' as alliance_tag,
+            sum(population) as population,
+            count(distinct player_id) as player_count,
+            sum(population)/count(distinct player_id) as avg_player_size,
+            row_number() over(order by sum(population) desc) as rank
+        from x_world
+        where alliance_tag <> ''
+        group by 1""",
+        scans=("x_world",),
+        budget_ms=150,
+    ),
+    "site players rankings": Query(
+        """select
+            '['||player_name||']('||'players/'||player_id||')' as player_name,
+            alliance_tag,
+            sum(population) as population,
+            count(*) as village_count,
+            sum(population)/count(*) as avg_village_size,
+            row_number() over(order by sum(population) desc) as rank
+        from x_world
+        where player_name <> 'Natars'
+        group by 1, 2""",
+        scans=("x_world",),
+        budget_ms=300,
+    ),
+    "site player_detail villages": Query(
+        "select * from v_seven_day_pop where player_id = ?;", (42,)
+    ),
+    "site player_detail history": Query(
+        "select date(snapshot_day * 86400, 'unixepoch') as date, player_id, population "
+        "from player_daily where player_id = ? order by snapshot_day;",
+        (42,),
+    ),
+    "site player_detail player": Query(
+        "select player_name, sum(population) as population from x_world where player_id = ? group by 1",
+        (42,),
+    ),
+    "site player_detail map": Query(
+        """
+    SELECT
+        x_coordinate as 'X Coordinate',
+        y_coordinate as 'Y Coordinate',
+        alliance_tag as 'Alliance Name',
+        player_name as 'Player Name',
+        village_name as 'Village Name',
+        case
+            when tribe_id = 1 then 'Roman'
+            when tribe_id = 2 then 'Teuton'
+            when tribe_id = 3 then 'Gaul'
+        end as 'Tribe',
+        population as 'Population',
+        capital as 'Capital?'
+    FROM x_world where player_id = ?
+    order by player_name;""",
+        (42,),
+    ),
+    "site world_map top alliances": Query(
+        """
+        select alliance_tag, sum(population) as total_pop from x_world
+        where alliance_tag <> ''
+        group by alliance_tag
+        order by total_pop desc limit 20
+        ;""",
+        scans=("x_world",),
+        budget_ms=50,
+    ),
+    "site world_map alliances": Query(
+        """
+    SELECT
+        x_coordinate as 'X Coordinate',
+        y_coordinate as 'Y Coordinate',
+        alliance_tag as 'Alliance Name',
+        player_name as 'Player Name',
+        village_name as 'Village Name',
+        case
+            when tribe_id = 1 then 'Roman'
+            when tribe_id = 2 then 'Teuton'
+            when tribe_id = 3 then 'Gaul'
+        end as 'Tribe',
+        population as 'Population',
+        capital as 'Capital?'
+    FROM x_world where alliance_tag in ({alliances});""",
+        fields={"alliances": "'A1', 'A2', 'A3', 'A4'"},
+    ),
+}
+
+# The bot server queries of the bot, with their parameters
+BOT_QUERIES = {
+    "funcs.get_reports": Query(
+        """select ID, IGN, LINK, COORDINATES, datetime(TIMESTAMP), NOTES from hammers where guild_id = ? and lower(ign) = ? order by timestamp limit ?;""",
+        (GUILD, "player 7", 5),
+    ),
+    "funcs.get_one_report": Query(
+        """select ID, IGN, LINK, COORDINATES, datetime(TIMESTAMP), NOTES from hammers where guild_id = ? and lower(ign) = ? order by timestamp desc limit 1;""",
+        (GUILD, "player 7"),
+    ),
+    "funcs.delete_report": Query(
+        "delete from hammers where ID = ? and GUILD_ID = ? and IGN = ? returning *;",
+        (1, GUILD, "player 7"),
+    ),
+    "funcs.list_players": Query(
+        """select IGN, COORDINATES, datetime(max(timestamp), '-4 hours') from hammers where guild_id = ? group by 1,2 order by 1,3""",
+        (GUILD,),
+    ),
+    "funcs.cancel_cfd": Query(
+        """
+        UPDATE DEFENSE_CALLS
+        SET CANCELLED = TRUE
+        WHERE guild_id = ? AND event_id = ? RETURNING *;
+        """,
+        (GUILD, 3),
+    ),
+    "funcs.list_open_cfds": Query(
+        """
+            select
+                dc.id,
+                datetime(dc.land_time, 'localtime'),
+                dc.x_coordinate,
+                dc.y_coordinate,
+                dc.amount_requested,
+                dc.amount_submitted,
+                dt.jump_url
+            from defense_calls dc
+            join defense_threads dt
+                on dt.guild_id = dc.guild_id
+                and dc.id = dt.defense_call_id
+            where dc.guild_id = ?
+            and current_timestamp < land_time
+            and not cancelled;
+            """,
+        (GUILD,),
+    ),
+    "funcs.send_defense": Query(
+        """
+            UPDATE DEFENSE_CALLS
+            SET amount_submitted = amount_submitted + ?
+            WHERE id = ? AND guild_id = ? returning amount_requested, amount_submitted;
+            """,
+        (0, 1, GUILD),
+    ),
+    "funcs.get_leaderboard": Query(
+        """
+            select
+                submitted_by_id,
+                sum(amount_submitted)
+            from SUBMITTED_DEFENSE
+            where guild_id = ?
+            group by 1
+            order by 2 desc
+            limit 10;
+            """,
+        (GUILD,),
+    ),
+    "validators.validate_unique_url": Query(
+        "SELECT LINK FROM HAMMERS WHERE GUILD_ID = ? AND IGN = ?;", (GUILD, "Player 7")
+    ),
+    "core thread clean-up": Query(
+        """
+                        select
+                            dc.land_time
+                        from defense_threads dt
+                        join defense_calls dc
+                            on dt.defense_call_id = dc.id
+                        where dt.id = ?
+                        and dt.guild_id = ?;""",
+        (1, GUILD),
+    ),
+    "raid_tracking_service existing entry": Query(
+        """
+                    SELECT id FROM RAID_TRACKING
+                    WHERE guild_id = ?
+                    AND player_name = ?
+                    AND recorded_at = ?
+                    AND is_personal = FALSE
+                    """,
+        (GUILD, "Player 7", LAST_RAID_UPDATE),
+    ),
+    "raid_tracking_service recent records": Query(
+        """
+                SELECT total_raided, recorded_at
+                FROM RAID_TRACKING
+                WHERE guild_id = ?
+                AND player_name = ?
+                AND is_personal = FALSE
+                AND recorded_at >= ?
+                ORDER BY recorded_at DESC
+                LIMIT 2
+                """,
+        (GUILD, "Player 7", WEEK_START),
+    ),
+    "raid_tracking_service week start": Query(
+        """
+                SELECT total_raided, recorded_at
+                FROM RAID_TRACKING
+                WHERE guild_id = ?
+                AND player_name = ?
+                AND recorded_at >= ?
+                AND is_personal = FALSE
+                ORDER BY recorded_at ASC
+                LIMIT 1
+                """,
+        (GUILD, "Player 7", WEEK_START),
+    ),
+}
+
+ANALYTICS_QUERIES = {
+    "analytics_service.get_command_stats": Query(
+        """
+                SELECT
+                    app,
+                    full_command,
+                    COUNT(*) as total_uses,
+                    SUM(CASE WHEN success = 1 THEN 1 ELSE 0 END) as successful_uses,
+                    COUNT(DISTINCT discord_user_id) as unique_users,
+                    AVG(execution_time_ms) as avg_execution_time,
+                    COUNT(DISTINCT discord_server_id) as server_count
+                FROM ANALYTICS
+                WHERE recorded_at >= datetime('now', ?, 'localtime')
+                {server_filter}
+                GROUP BY app, full_command
+                ORDER BY total_uses DESC;
+            """,
+        ("-7 days",),
+        fields={"server_filter": ""},
+        budget_ms=100,
+    ),
+    "analytics_service.get_command_stats for a server": Query(
+        """
+                SELECT
+                    app,
+                    full_command,
+                    COUNT(*) as total_uses,
+                    SUM(CASE WHEN success = 1 THEN 1 ELSE 0 END) as successful_uses,
+                    COUNT(DISTINCT discord_user_id) as unique_users,
+                    AVG(execution_time_ms) as avg_execution_time,
+                    COUNT(DISTINCT discord_server_id) as server_count
+                FROM ANALYTICS
+                WHERE recorded_at >= datetime('now', ?, 'localtime')
+                {server_filter}
+                GROUP BY app, full_command
+                ORDER BY total_uses DESC;
+            """,
+        ("-7 days", GUILD),
+        fields={"server_filter": "AND discord_server_id = ?"},
+    ),
+    "analytics_service.get_user_stats": Query(
+        """
+                SELECT
+                    app,
+                    full_command,
+                    COUNT(*) as total_uses,
+                    SUM(CASE WHEN success = 1 THEN 1 ELSE 0 END) as successful_uses,
+                    AVG(execution_time_ms) as avg_execution_time,
+                    COUNT(DISTINCT discord_server_id) as server_count
+                FROM ANALYTICS
+                WHERE discord_user_id = ?
+                AND recorded_at >= datetime('now', ?, 'localtime')
+                GROUP BY app, full_command
+                ORDER BY total_uses DESC;
+            """,
+        (4242, "-7 days"),
+    ),
+    "analytics_service.get_server_stats": Query(
+        """
+                SELECT
+                    COUNT(*) as total_commands,
+                    COUNT(DISTINCT discord_user_id) as unique_users,
+                    COUNT(DISTINCT app) as unique_commands,
+                    AVG(execution_time_ms) as avg_execution_time,
+                    SUM(CASE WHEN success = 1 THEN 1 ELSE 0 END) as successful_commands
+                FROM ANALYTICS
+                WHERE discord_server_id = ?
+                AND recorded_at >= datetime('now', ?, 'localtime');
+            """,
+        (GUILD, "-7 days"),
+    ),
+}
+
+
+@pytest.fixture(scope="module")
+def game_server():
+    cnx = sqlite3.connect(":memory:")
+    generate.game_server(cnx, WorldConfig(villages=VILLAGES), days=DAYS)
+    for view_path in glob.glob("game_servers/views/*.sql"):
+        cnx.executescript(open(view_path).read())
+    cnx.execute("analyze")
+    return cnx
+
+
+@pytest.fixture(scope="module")
+def bot_server():
+    cnx = sqlite3.connect(":memory:")
+    generate.bot_server(
+        cnx,
+        GUILD_IDS,
+        GuildConfig(hammers=300, defense_calls=50),
+        now=NOW,
+        players=PLAYERS,
+    )
+    cnx.execute("analyze")
+    return cnx
+
+
+@pytest.fixture(scope="module")
+def analytics():
+    cnx = sqlite3.connect(":memory:")
+    generate.analytics(cnx, COMMANDS, GUILD_IDS)
+    cnx.execute("analyze")
+    return cnx
+
+
+def _aliases(cnx: sqlite3.Connection, sql: str) -> dict:
+    """Table aliases used by a query and by the views it might read"""
+    views = [
+        view_sql
+        for (view_sql,) in cnx.execute(
+            "select sql from sqlite_master where type = 'view'"
+        )
+    ]
+    aliases = {}
+    for text in [sql] + views:
+        for table, alias in re.findall(
+            r"\b(?:from|join)\s+(\w+)\s+(?:as\s+)?(\w+)", text, re.I
+        ):
+            if alias.lower() not in SQL_KEYWORDS:
+                aliases[alias.lower()] = table.lower()
+    return aliases
+
+
+def scanned_tables(cnx: sqlite3.Connection, sql: str, params: tuple = ()) -> set:
+    """The large tables a query reads whole, by the SCAN steps of its plan"""
+    aliases = _aliases(cnx, sql)
+    scanned = set()
+    for step in query_plan(cnx, sql, params).splitlines():
+        match = re.match(r"\s*SCAN (\w+)", step)
+        if match:
+            table = aliases.get(match.group(1).lower(), match.group(1).lower())
+            if table in LARGE_TABLES:
+                scanned.add(table)
+    return scanned
+
+
+def best_time_ms(cnx: sqlite3.Connection, sql: str, params: tuple) -> float:
+    """Fastest of three runs, so a busy machine doesn't fail the budget on its own"""
+    timings = []
+    for _ in range(3):
+        start = time.perf_counter()
+        cnx.execute(sql, params).fetchall()
+        timings.append((time.perf_counter() - start) * 1000)
+        # The updates and deletes run in a transaction that's never kept
+        cnx.rollback()
+    return min(timings)
+
+
+def source_path(label: str) -> str:
+    """The module a query label names: a site page ("site players ...") or a bot module"""
+    words = label.split()
+    if words[0] == "site":
+        page = (
+            "app.py" if words[1] == "app" else os.path.join("pages", f"{words[1]}.py")
+        )
+        return os.path.join(REPO_DIR, "site", page)
+    module = re.split(r"[. ]", label)[0]
+    (path,) = glob.glob(
+        os.path.join(REPO_DIR, "bot", "**", f"{module}.py"), recursive=True
+    )
+    return path
+
+
+def _words(text: str) -> str:
+    return " ".join(text.split())
+
+
+def check(cnx: sqlite3.Connection, label: str, query: Query) -> None:
+    sql = query.executable
+    plan = query_plan(cnx, sql, query.params)
+    assert plan, f"{label} can't be planned"
+    unexpected = scanned_tables(cnx, sql, query.params) - set(query.scans)
+    assert not unexpected, f"{label} scans {', '.join(sorted(unexpected))}:\n{plan}"
+
+    elapsed = best_time_ms(cnx, sql, query.params)
+    assert elapsed <= query.budget_ms, (
+        f"{label} took {elapsed:.1f}ms of {query.budget_ms}ms:\n{plan}"
+    )
+
+
+class TestViews:
+    @pytest.mark.parametrize(
+        "view_path", sorted(glob.glob("game_servers/views/*.sql")), ids=os.path.basename
+    )
+    def test_views_only_scan_what_they_read_whole(self, game_server, view_path):
+        view = os.path.splitext(os.path.basename(view_path))[0]
+        sql = f"select * from {view}"
+
+        plan = query_plan(game_server, sql)
+
+        assert plan, f"{view} can't be planned"
+        unexpected = scanned_tables(game_server, sql) - set(VIEW_SCANS.get(view, ()))
+        assert not unexpected, f"{view} scans {', '.join(sorted(unexpected))}:\n{plan}"
+
+
+class TestQueryPlans:
+    @pytest.mark.parametrize("label", GAME_QUERIES)
+    def test_game_server_queries(self, game_server, label):
+        check(game_server, label, GAME_QUERIES[label])
+
+    @pytest.mark.parametrize("label", BOT_QUERIES)
+    def test_bot_server_queries(self, bot_server, label):
+        check(bot_server, label, BOT_QUERIES[label])
+
+    @pytest.mark.parametrize("label", ANALYTICS_QUERIES)
+    def test_analytics_queries(self, analytics, label):
+        check(analytics, label, ANALYTICS_QUERIES[label])
+
+
+class TestSources:
+    @pytest.mark.parametrize("label", [*GAME_QUERIES, *BOT_QUERIES, *ANALYTICS_QUERIES])
+    def test_query_is_still_in_its_module(self, label):
+        query = {**GAME_QUERIES, **BOT_QUERIES, **ANALYTICS_QUERIES}[label]
+        path = source_path(label)
+        with open(path, "r") as source:
+            text = source.read()
+
+        assert _words(query.sql) in _words(text), (
+            f"{label} no longer matches {os.path.relpath(path, REPO_DIR)}; copy the query again"
+        )
+
+
+class TestScannedTables:
+    def test_sees_through_aliases(self):
+        cnx = sqlite3.connect(":memory:")
+        cnx.execute("create table map_history (x_coordinate int, y_coordinate int)")
+
+        assert scanned_tables(
+            cnx, "select * from map_history curr where curr.x_coordinate = 1"
+        ) == {"map_history"}
+        cnx.execute(
+            "create index map_history_coordinates on map_history (x_coordinate)"
+        )
+        assert (
+            scanned_tables(
+                cnx, "select * from map_history curr where curr.x_coordinate = 1"
+            )
+            == set()
+        )
+
+    def test_flags_the_old_new_villages_self_join(self, game_server):
+        # v_new_villages as it was, which read map_history once per village
+        sql = """
+            SELECT curr.village_id
+            FROM map_history curr
+            LEFT JOIN map_history prev ON
+                curr.x_coordinate = prev.x_coordinate
+                AND curr.y_coordinate = prev.y_coordinate
+                AND prev.inserted_at = 1
+            WHERE curr.inserted_at = 2 AND prev.village_id IS NULL
+        """
+
+        assert "map_history" in scanned_tables(game_server, sql)
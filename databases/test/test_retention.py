@@ -0,0 +1,140 @@
+import os
+import sqlite3
+
+import pytest
+
+from generate import DAY, START, load_history, village_line
+from history import snapshot_day
+from materialize import refresh_materialized
+from retention import (
+    RetentionPolicy,
+    apply_retention,
+    days_to_prune,
+    vacuum_into,
+)
+
+DAYS = 420
+
+
+def load_days(cnx, delta):
+    load_history(
+        cnx,
+        (
+            [
+                village_line(
+                    village,
+                    population=10 + day // (village * 3),
+                    player_id=village % 2 + 1,
+                    alliance_tag="A",
+                )
+                for village in range(1, 6)
+            ]
+            for day in range(DAYS)
+        ),
+        "delta" if delta else "snapshot",
+    )
+    refresh_materialized(cnx)
+
+
+def history_on(cnx, days):
+    return cnx.execute(
+        f"select * from map_history where snapshot_day in ({','.join('?' * len(days))}) "
+        "order by snapshot_day, village_id",
+        days,
+    ).fetchall()
+
+
+class TestDaysToPrune:
+    def test_downsamples_by_age(self):
+        days = list(range(1000, 1000 + DAYS))
+        latest = days[-1]
+
+        pruned = set(
+            days_to_prune(days, RetentionPolicy(daily_days=60, weekly_days=365))
+        )
+        kept = [day for day in days if day not in pruned]
+
+        assert all(latest - day not in pruned for day in range(60))
+        weekly = [day for day in kept if 60 <= latest - day < 365]
+        assert len({(day + 3) // 7 for day in weekly}) == len(weekly)
+        assert 40 <= len(weekly) <= 45
+        monthly = [day for day in kept if latest - day >= 365]
+        assert 2 <= len(monthly) <= 3
+
+    def test_keeps_everything_within_daily_window(self):
+        days = list(range(50))
+
+        assert days_to_prune(days, RetentionPolicy()) == []
+        assert days_to_prune([], RetentionPolicy()) == []
+
+    @pytest.mark.parametrize("daily_days, weekly_days", [(6, 365), (60, 30)])
+    def test_rejects_policies_that_break_views(self, daily_days, weekly_days):
+        with pytest.raises(ValueError):
+            RetentionPolicy(daily_days, weekly_days).validate()
+
+
+class TestApplyRetention:
+    @pytest.mark.parametrize("delta", [False, True])
+    def test_kept_days_and_derived_tables_unchanged(self, delta):
+        cnx = sqlite3.connect(":memory:")
+        load_days(cnx, delta)
+        all_days = [snapshot_day(START + day * DAY) for day in range(DAYS)]
+        kept = sorted(set(all_days) - set(days_to_prune(all_days, RetentionPolicy())))
+        before = {
+            "history": history_on(cnx, kept),
+            "seven_day_pop": cnx.execute(
+                "select * from seven_day_pop order by 5"
+            ).fetchall(),
+            "player_daily": cnx.execute("select * from player_daily").fetchall(),
+        }
+
+        pruned, rows = apply_retention(cnx, RetentionPolicy())
+        refresh_materialized(cnx)
+
+        assert len(pruned) == DAYS - len(kept) and rows > 0
+        days_left = cnx.execute("select count(distinct snapshot_day) from map_history")
+        assert days_left.fetchone()[0] == len(kept)
+        assert history_on(cnx, kept) == before["history"]
+        seven_day_pop = cnx.execute("select * from seven_day_pop order by 5").fetchall()
+        assert seven_day_pop == before["seven_day_pop"]
+        assert (
+            cnx.execute("select * from player_daily").fetchall()
+            == before["player_daily"]
+        )
+
+    def test_delta_drops_versions_only_seen_on_pruned_days(self):
+        cnx = sqlite3.connect(":memory:")
+        load_days(cnx, delta=True)
+        versions = cnx.execute("select count(*) from map_changes").fetchone()[0]
+
+        apply_retention(cnx, RetentionPolicy())
+
+        assert cnx.execute("select count(*) from map_changes").fetchone()[0] < versions
+
+    def test_dry_run_changes_nothing(self):
+        cnx = sqlite3.connect(":memory:")
+        load_days(cnx, delta=False)
+
+        pruned, rows = apply_retention(cnx, RetentionPolicy(), dry_run=True)
+
+        assert pruned and rows == 0
+        assert cnx.execute("select count(*) from map_history").fetchone()[0] == DAYS * 5
+
+
+class TestVacuumInto:
+    def test_compacted_copy_keeps_the_data(self, tmp_path):
+        db = str(tmp_path / "server.db")
+        compacted = str(tmp_path / "compacted.db")
+        cnx = sqlite3.connect(db)
+        load_days(cnx, delta=False)
+        apply_retention(cnx, RetentionPolicy(daily_days=7, weekly_days=7))
+        expected = cnx.execute("select * from map_history").fetchall()
+
+        vacuum_into(cnx, compacted)
+        cnx.close()
+
+        assert os.path.getsize(compacted) < os.path.getsize(db)
+        copy = sqlite3.connect(compacted)
+        assert copy.execute("pragma quick_check").fetchone()[0] == "ok"
+        assert copy.execute("select * from map_history").fetchall() == expected
+        copy.close()
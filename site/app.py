@@ -1,10 +1,10 @@
-import sqlite3
-
 import dash
 import dash_bootstrap_components as dbc
 import pandas as pd
 from dash import Dash, dcc, html, Input, Output
 
+from db import connect
+
 app = Dash(
     __name__,
     use_pages=True,
@@ -17,9 +17,9 @@ server = app.server
 
 
 def get_last_updated(server):
-    cnx = sqlite3.connect(f"../databases/game_servers/{server}.db")
+    cnx = connect(server)
     updated_at = pd.read_sql_query(
-        "select max(strftime('%Y-%m-%d', datetime(inserted_at, 'unixepoch', 'localtime'))) as updated_at from map_history;",
+        "select date(max(snapshot_day) * 86400, 'unixepoch') as updated_at from map_history;",
         cnx,
     )
     return updated_at["updated_at"].iat[0]
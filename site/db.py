@@ -0,0 +1,27 @@
+import sqlite3
+
+GAME_SERVERS_PATH = "../databases/game_servers"
+
+# The site only reads; the loader rewrites these files in WAL mode meanwhile,
+# so pages keep serving the last committed load instead of waiting on it
+PRAGMAS = {
+    "mmap_size": 256 * 1024 * 1024,
+    "cache_size": -32 * 1024,
+    "temp_store": "memory",
+    "query_only": "on",
+}
+
+
+def connect(server: str) -> sqlite3.Connection:
+    cnx = sqlite3.connect(f"{GAME_SERVERS_PATH}/{server}.db")
+    for pragma, value in PRAGMAS.items():
+        cnx.execute(f"pragma {pragma} = {value}")
+    return cnx
+
+
+def has_table(cnx: sqlite3.Connection, table: str) -> bool:
+    """Servers the loader hasn't reached since a table was added don't have it yet"""
+    row = cnx.execute(
+        "select 1 from sqlite_master where type = 'table' and name = ?", (table,)
+    ).fetchone()
+    return row is not None
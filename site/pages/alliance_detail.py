@@ -1,5 +1,3 @@
-import sqlite3
-
 import dash
 import pandas as pd
 import plotly.express as px
@@ -7,6 +5,8 @@ import plotly.graph_objects as go
 from dash import dcc, html, callback, Input, Output
 import dash_daq as daq
 
+from db import connect, has_table
+
 
 dash.register_page(__name__, path_template="/alliances/<alliance_id>")
 
@@ -39,7 +39,7 @@ def get_children(server_id, alliance_id):
     Input("capital-toggle", "value"),
 )
 def create_map(alliance_id, data, filter_capitals):
-    cnx = sqlite3.connect(f"../databases/game_servers/{data['server_code']}.db")
+    cnx = connect(data["server_code"])
     print(f"Creating map for alliance {alliance_id}")
     print(f"Filter capitals: {filter_capitals}")
     capital_filter = "and capital" if filter_capitals else ""
@@ -57,11 +57,11 @@ def create_map(alliance_id, data, filter_capitals):
         end as 'Tribe',
         population as 'Population',
         capital as 'Capital?'
-    FROM x_world where alliance_id = {alliance_id}
+    FROM x_world where alliance_id = ?
     {capital_filter}
     order by player_name;"""
 
-    data = pd.read_sql_query(query, cnx)
+    data = pd.read_sql_query(query, cnx, params=(alliance_id,))
     map = px.scatter(
         data_frame=data,
         x="X Coordinate",
@@ -97,12 +97,14 @@ def create_map(alliance_id, data, filter_capitals):
 
 
 def create_pop_chart(server_id, alliance_id):
-    cnx = sqlite3.connect(f"../databases/game_servers/{server_id}.db")
-    # TODO: Pass alliance_id as a param instead of f-string. This is insecure.
-    query = f"select strftime('%Y-%m-%d', datetime(inserted_at, 'unixepoch', 'localtime')) as date, alliance_id, sum(population) as population from map_history where alliance_id = {alliance_id} group by 1,2 order by 1;"
-    history = pd.read_sql_query(query, cnx)
-    query = f"select alliance_tag, sum(population) as population from x_world where alliance_id = {alliance_id} group by 1"
-    alliance = pd.read_sql_query(query, cnx)
+    cnx = connect(server_id)
+    if has_table(cnx, "alliance_daily"):
+        query = "select date(snapshot_day * 86400, 'unixepoch') as date, alliance_id, population from alliance_daily where alliance_id = ? order by snapshot_day;"
+    else:
+        query = "select date(snapshot_day * 86400, 'unixepoch') as date, alliance_id, sum(population) as population from map_history where alliance_id = ? group by 1,2 order by 1;"
+    history = pd.read_sql_query(query, cnx, params=(alliance_id,))
+    query = "select alliance_tag, sum(population) as population from x_world where alliance_id = ? group by 1"
+    alliance = pd.read_sql_query(query, cnx, params=(alliance_id,))
 
     if history.empty:
         return go.Figure()
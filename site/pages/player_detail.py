@@ -1,5 +1,3 @@
-import sqlite3
-
 import dash
 import dash_bootstrap_components as dbc
 import pandas as pd
@@ -8,14 +6,16 @@ import plotly.graph_objects as go
 from dash import dcc, html, dash_table, Input, Output, callback
 from datetime import datetime, timedelta
 
+from db import connect, has_table
+
 dash.register_page(__name__, path_template="/players/<player_id>")
 
 
 def pop_table(player_id, cnx):
-    village_pop_query = f"select * from v_seven_day_pop where player_id = {player_id};"
+    village_pop_query = "select * from v_seven_day_pop where player_id = ?;"
     print(village_pop_query)
 
-    df = pd.read_sql_query(village_pop_query, cnx)
+    df = pd.read_sql_query(village_pop_query, cnx, params=(player_id,))
     working_date = datetime.strptime(df["load_date"][0], "%Y-%m-%d")
 
     add_pop_diff_markdown(df)
@@ -104,11 +104,14 @@ def layout(server_id="am2", player_id=1):
 
 
 def get_children(server_id, player_id):
-    cnx = sqlite3.connect(f"../databases/game_servers/{server_id}.db")
-    query = f"select strftime('%Y-%m-%d', datetime(inserted_at, 'unixepoch', 'localtime')) as date, player_id, sum(population) as population from map_history where player_id = {player_id} group by 1,2 order by 1;"
-    history = pd.read_sql_query(query, cnx)
-    query = f"select player_name, sum(population) as population from x_world where player_id = {player_id} group by 1"
-    player = pd.read_sql_query(query, cnx)
+    cnx = connect(server_id)
+    if has_table(cnx, "player_daily"):
+        query = "select date(snapshot_day * 86400, 'unixepoch') as date, player_id, population from player_daily where player_id = ? order by snapshot_day;"
+    else:
+        query = "select date(snapshot_day * 86400, 'unixepoch') as date, player_id, sum(population) as population from map_history where player_id = ? group by 1,2 order by 1;"
+    history = pd.read_sql_query(query, cnx, params=(player_id,))
+    query = "select player_name, sum(population) as population from x_world where player_id = ? group by 1"
+    player = pd.read_sql_query(query, cnx, params=(player_id,))
 
     ref = max(0, len(history) - 8)
     fig = go.Figure(
@@ -127,7 +130,7 @@ def get_children(server_id, player_id):
         go.Scatter(y=history["population"], x=history["date"], name="Population")
     )
 
-    query = f"""
+    query = """
     SELECT
         x_coordinate as 'X Coordinate',
         y_coordinate as 'Y Coordinate',
@@ -141,10 +144,10 @@ def get_children(server_id, player_id):
         end as 'Tribe',
         population as 'Population',
         capital as 'Capital?'
-    FROM x_world where player_id = {player_id}
+    FROM x_world where player_id = ?
     order by player_name;"""
 
-    data = pd.read_sql_query(query, cnx)
+    data = pd.read_sql_query(query, cnx, params=(player_id,))
     map = px.scatter(
         data_frame=data,
         x="X Coordinate",
@@ -4,9 +4,11 @@ import dash
 import pandas as pd
 from dash import dash_table, html, callback, Input, Output
 
+from db import connect
+
 dash.register_page(__name__)
 
-cnx = sqlite3.connect("../databases/game_servers/am2.db")
+cnx = connect("am2")
 
 
 def data_table(cnx: sqlite3.Connection):
@@ -87,5 +89,5 @@ layout = html.Div([html.Div(id="players-table", children=data_table(cnx))])
 
 @callback(Output("players-table", "children"), Input("stored-server", "data"))
 def update_table(data):
-    cnx = sqlite3.connect(f"../databases/game_servers/{data['server_code']}.db")
+    cnx = connect(data["server_code"])
     return data_table(cnx)
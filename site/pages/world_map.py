@@ -1,13 +1,13 @@
-import sqlite3
-
 import dash
 import pandas as pd
 import plotly.express as px
 from dash import Input, Output, callback, dcc, html
 
+from db import connect
+
 dash.register_page(__name__)
 
-cnx = sqlite3.connect("../databases/game_servers/am2.db")
+cnx = connect("am2")
 query = f"""
 select alliance_tag, sum(population) as total_pop from x_world 
 where alliance_tag <> ''
@@ -40,7 +40,7 @@ layout = html.Div(
 )
 def map(alliances, data):
     alliances = ", ".join(f"'{alliance}'" for alliance in alliances)
-    cnx = sqlite3.connect(f"../databases/game_servers/{data['server_code']}.db")
+    cnx = connect(data["server_code"])
     query = f"""
     SELECT
         x_coordinate as 'X Coordinate',
@@ -100,7 +100,7 @@ def map(alliances, data):
 )
 def update_dropdown_options_and_value(data):
     # Connect to the database
-    cnx = sqlite3.connect(f"../databases/game_servers/{data['server_code']}.db")
+    cnx = connect(data["server_code"])
 
     # Query to fetch data
     query = """